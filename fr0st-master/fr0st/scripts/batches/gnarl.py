@@ -1,12 +1,17 @@
 # Gnarl Batch by ParrotDolphin
 from fr0stlib.pyflam3.variations import *
 
-from utils import batch
+from utils import parallel_batch
 
 # Customization for awesomeness
 # randsides controls the number of sides; set to 0 to choose randomly
 # between 3 and 10
 randsides = 0
+# nflames is the size of the batch; seed makes it repeatable (None picks
+# one and prints it). Flames are generated in parallel outside the gui only,
+# see parallel_batch.
+nflames = 20
+seed = None
 # End customization
 
 def gnarl():
@@ -92,7 +97,7 @@ def gnarl():
     return f
 
 if __name__ == "__main__":
-    lst = batch(gnarl, 20)
+    lst = [flame for flame, _ in parallel_batch(gnarl, nflames, seed=seed)]
     save_flames("parameters/gnarl.flame", *lst)
 
 
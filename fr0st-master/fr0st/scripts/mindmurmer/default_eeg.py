@@ -4,14 +4,16 @@ import numpy
 import wx
 
 from fr0stlib import Flame
-from fr0stlib.render import save_image
-from fr0stlib.pyflam3 import Genome, byref, flam3_interpolate
+from fr0stlib.render import save_image, resolve_renderer, to_string as flame_to_string
+from fr0stlib.gui.config import config
+from fr0stlib.pyflam3 import Genome, Transition
 
 from utils import get_scriptpath, easing_cubic, easing_sine
 from eegsources import *
 from rabbit_controller import RabbitController
 from sound_controller import MindMurmurSoundScapeController
 from input_controller import InputController
+from frame_sinks import PipeSink, ImageFileSink, SharedMemoryRingSink
 
 
 # For running the script as stand alone and not through the fractal app
@@ -31,7 +33,7 @@ if 'large_preview' not in locals() and 'preview' not in globals():
 
 
 class MMEngine:
-    def __init__(self, eeg_source, gui, audio_folder):
+    def __init__(self, eeg_source, gui, audio_folder, sinks=()):
         print("[>] _INIT")
         self.eeg_source = eeg_source
         self.frame_index = 0
@@ -43,9 +45,12 @@ class MMEngine:
         self.states_flames = [ ]
         self.meditation_state = 1
         self.user_connected = False
+        # eeg history is sampled once per frame
+        self.eeg_source.set_smoothing(self.eeg_source.smoothing_seconds, rate=self.maxfps)
 
-        # init rabbitMQ connection
-        self.rabbit = RabbitController('localhost', 5672, 'guest', 'guest', '/')
+        # init rabbitMQ publisher. messages are sent from a background
+        # thread over a single connection, so the render loop never waits.
+        self.rabbit = RabbitController('localhost', 5672, 'guest', 'guest', '/', threaded=True)
 
         # self.audio_controller = MindMurmurSoundScapeController(audio_folder)
         self.input_controller = InputController(self)
@@ -59,8 +64,21 @@ class MMEngine:
         self.transition_pct = None
         self.transition_from = None
         self.transition_to = None
+        # parsed endpoints of the running transition, created by load_flame
+        self.transition = None
+        # set by animate when the transition target needs to be re-parsed
+        self.transition_to_changed = False
+        # interpolated genome rendered instead of self.flame during transitions
+        self.genome = None
         # sets the frame at which the user disconnected
         self.disconnected_at = None
+        # frame sinks receiving every rendered frame (recording, streaming)
+        self.sinks = list(sinks)
+        # while idling on a static flame with the numpy renderer, the preview
+        # quality doubles on every render, from the first to the second value.
+        self.idle_quality_range = (25, 400)
+        self.idle_quality = None
+        self.idle_fingerprint = None
 
     def gui_start(self):
         print("[>] GUI START")
@@ -199,6 +217,16 @@ class MMEngine:
     def stop(self):
         print("[>] STOP")
         self.keeprendering = False
+
+        # flush and close frame sinks
+        for sink in self.sinks:
+            sink.close()
+            print("[ ] %s: %s frames written, %s dropped"
+                  %(sink.__class__.__name__, sink.frames, sink.dropped))
+        self.sinks = []
+
+        # send pending messages and close the rabbitMQ connection
+        self.rabbit.close()
            
         # hide GUI preview Window
         self.gui.Show()
@@ -229,13 +257,16 @@ class MMEngine:
         print("[ ] ENTERING STATE %s" %(newstate))
         if(transtition):
             print("[ ] TRANSITION TO FLAME %s" %(self.states_flames[flame_index].name))
-            # start transition
+            # start transition, from the interpolated genome if a transition
+            # was already running
             self.transition_pct = 0.0
-            self.transition_from = self.flame
+            self.transition_from = self.genome if self.genome is not None else self.flame
             self.transition_to = self.states_flames[flame_index]
+            self.transition = None
         else:
             print("[ ] LOADING FLAME %s" %(self.states_flames[flame_index].name))
             self.flame = self.load_flame(self.states_flames[flame_index])
+            self.genome = None
 
 
 
@@ -311,12 +342,16 @@ class MMEngine:
                     # apply interpolation transition
             lerp_pct = easing_cubic(self.transition_pct)
             newflame = self.load_flame(self.transition_from, self.transition_to, lerp_pct)
-            if(newflame is not None):
+            if(isinstance(newflame, Genome)):
+                self.genome = newflame
+            elif(newflame is not None):
                 self.flame = newflame
+                self.genome = None
 
             if(self.transition_pct >= 1):
                 # end of transition
                 self.transition_pct = None
+                self.transition = None
             else:
                 # add 1 / nth to the transition
                 self.transition_pct += 1 / float(duration_sec * self.maxfps)
@@ -326,6 +361,7 @@ class MMEngine:
 
 
     # lerp is interpolation percentage [0 - 1] between origin and target
+    # interpolated frames are returned as a Genome, ready to be rendered.
     def load_flame(self, flame_origin, flame_target = None, lerp = 0.0):
         loaded_flame = self.flame
         try:
@@ -335,15 +371,15 @@ class MMEngine:
                 loaded_flame = flame_target
             else:        
                 # interpolation:
-                from fr0stlib.render import to_string as flame_to_string
-                flame_origin.time = 0
-                flame_target.time = 1
-                flames_lerp = [flame_origin, flame_target]
-                flames_str = "<flames>%s</flames>" % "".join(map(flame_to_string, flames_lerp))
-                genomes, ngenomes = Genome.from_string(flames_str)           
-                targetflame = Genome()
-                flam3_interpolate(genomes, ngenomes, lerp, 0, byref(targetflame))
-                loaded_flame = Flame(targetflame.to_string())
+                # both endpoints are parsed once per transition. the target
+                # is only parsed again when animate changed it.
+                if(self.transition is None):
+                    origin = flame_origin if isinstance(flame_origin, Genome) else flame_to_string(flame_origin)
+                    self.transition = Transition(origin, flame_to_string(flame_target))
+                elif(self.transition_to_changed):
+                    self.transition.set_target(flame_to_string(flame_target))
+                self.transition_to_changed = False
+                loaded_flame = self.transition.interpolate(lerp)
             
         except Exception as ex:
             import traceback
@@ -381,6 +417,8 @@ class MMEngine:
                 scale_delta = eegdata.delta * np.sin(self.frame_index * (np.pi * 2.0) / (self.sinelength * 5.0))
                 form.scale(1 + (scale_delta * 0.01 * self.speed))
 
+                if(self.transition is not None):
+                    self.transition_to_changed = True
 
                 # # ZOOM
                 # # calculate zoom amount from data elements
@@ -403,7 +441,37 @@ class MMEngine:
         # animate preview window if renderer is ok and Idling
         if(self.gui.previewframe.rendering == False):
             # run pyflam4 rendering
-            self.gui.previewframe.RenderPreview(self.flame)
+            # during transitions the interpolated genome is rendered as is
+            self.gui.previewframe.RenderPreview(self.genome if self.genome is not None else self.flame,
+                                                buffer_func=self.push_frame if self.sinks else None,
+                                                quality=self.get_idle_quality())
+
+    # quality for the next render of a static flame while idling, None to use
+    # the preview settings. only done with the numpy renderer and progressive
+    # previews: those keep the samples of the previous render in a
+    # RenderSession, so each step only adds the missing ones. flam3 can't
+    # resume a render, every step would start over at a higher quality.
+    # numpy images have no density estimation, same as its regular previews.
+    def get_idle_quality(self):
+        if(self.user_connected or self.genome is not None
+           or self.transition_pct is not None or self.sinks
+           or not config["Progressive-Preview"]
+           or resolve_renderer(config["renderer"]) != 'numpy'):
+            self.idle_quality = None
+            return None
+        fingerprint = self.flame.fingerprint()
+        if(self.idle_quality is None or fingerprint != self.idle_fingerprint):
+            self.idle_fingerprint = fingerprint
+            self.idle_quality = self.idle_quality_range[0]
+        else:
+            self.idle_quality = min(self.idle_quality * 2, self.idle_quality_range[1])
+        return self.idle_quality
+
+    # called on the render thread with the raw image of each frame.
+    # sinks never block: a slow sink drops frames instead.
+    def push_frame(self, output_buffer, size, channels):
+        for sink in self.sinks:
+            sink.push(output_buffer, size, channels)
 
     
 
@@ -415,14 +483,22 @@ audio_folder = get_scriptpath() + "/mindmurmer/sounds_controllers/sound_controll
 eeg = EEGFromRabbitMQ('localhost', 5672, 'guest', 'guest', '/')
 # audio = get_audio_source(get_scriptpath() + '/mindmurmur/audio/midnightstar_crop.wav')
 # eeg = EEGFromAudio(audio)
-# 2 - DATA from json file
-# eeg = EEGFromJSONFile(get_scriptpath() + '/mindmurmur/data/Muse-B1C1_2018-06-11--07-48-41_1528717729867.json') # extra small
-# eeg = EEGFromJSONFile(get_scriptpath() + '/mindmurmer/data/Muse-B1C1_2018-06-10--18-35-09_1528670624296.json') # medium
-# eeg = EEGFromJSONFile(get_scriptpath() + '/mindmurmer/data/Muse-B1C1_2018-07-16--07-24-35_1531745297756.json') # large (16 july)
-#eeg = EEGFromJSONFile(get_scriptpath() + '/mindmurmer/data/Muse-B1C1_2018-07-17--07-00-11_1531868655676.json') # large (17 july)
+# 2 - DATA from a Muse recording. JSON files are converted to a memory-mapped
+# .npy file on first use (or ahead of time with muse_recordings.py)
+# eeg = EEGFromRecording(get_scriptpath() + '/mindmurmur/data/Muse-B1C1_2018-06-11--07-48-41_1528717729867.json') # extra small
+# eeg = EEGFromRecording(get_scriptpath() + '/mindmurmer/data/Muse-B1C1_2018-06-10--18-35-09_1528670624296.json') # medium
+# eeg = EEGFromRecording(get_scriptpath() + '/mindmurmer/data/Muse-B1C1_2018-07-16--07-24-35_1531745297756.json') # large (16 july)
+#eeg = EEGFromRecording(get_scriptpath() + '/mindmurmer/data/Muse-B1C1_2018-07-17--07-00-11_1531868655676.json') # large (17 july)
+
+# FRAME SINKS (optional) - record or stream the rendered frames
+sinks = []
+# sinks.append(PipeSink("ffmpeg -y -f rawvideo -pix_fmt %(pix_fmt)s -s %(width)dx%(height)d -r %(fps)s -i - "
+#                       "-c:v libx264 -preset ultrafast -pix_fmt yuv420p mindmurmur.mp4"))
+# sinks.append(ImageFileSink(get_scriptpath() + '/mindmurmer/frames/%06d.png'))
+# sinks.append(SharedMemoryRingSink('/dev/shm/mindmurmer_frames'))
 
 #_self is some hidden hack from fr0st that refers to the gui MainWindow
-engine = MMEngine(eeg, _self, audio_folder)
+engine = MMEngine(eeg, _self, audio_folder, sinks)
 
 engine.gui_start()
 engine.run()
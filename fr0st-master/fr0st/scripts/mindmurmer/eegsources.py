@@ -2,25 +2,31 @@ import random
 import numpy as np
 import json
 import threading
+import time
+
+from muse_recordings import load_recording
+from rabbit_controller import RabbitController, EEGDataCommand
+
+# default smoothing of EEGSource.read_data: average over the last half
+# second, at the rate read_data is called (the MMEngine frame rate).
+SMOOTHING_SECONDS = 0.5
+SAMPLE_RATE = 20
 
-from rabbit_controller import RabbitController
 
 class EEGData():
-    # inline values
+    # inline values. values can be a list or a numpy row, which is used
+    # as is (not copied).
     def __init__(self, values):
         
         if(values is None):
             values = [0,0,0,0,0,0,0]
-        self.values = values
+        self.values = values = np.asarray(values, dtype=np.float64)
         # 5 waves * n channels + blink + med_state
-        self.channels = (len(values)-2) / 5
-        # each waves is average of 4 channels
-        self.alpha = np.mean(values[self.channels * 0 : self.channels * 1])
-        self.beta  = np.mean(values[self.channels * 1 : self.channels * 2])
-        self.gamma = np.mean(values[self.channels * 2 : self.channels * 3])
-        self.delta = np.mean(values[self.channels * 3 : self.channels * 4])
-        self.theta = np.mean(values[self.channels * 4 : self.channels * 5])
+        self.channels = (len(values)-2) // 5
+        # each waves is average of the channels
         self.raw_waves = values[0 : self.channels * 5]
+        waves = self.raw_waves.reshape(5, self.channels).mean(axis=1)
+        self.alpha, self.beta, self.gamma, self.delta, self.theta = waves.tolist()
         
         # blink is 0 or 1
         self.blink = values[-2]
@@ -31,11 +37,7 @@ class EEGData():
         self.waves = [self.alpha, self.beta, self.gamma, self.delta, self.theta]
 
     def is_empty(self):
-        any_value = False
-        for freq in self.waves:
-            if(freq != 0.0):
-                any_value = True
-                break
+        any_value = any(freq != 0.0 for freq in self.waves)
         # print("[?] EEG %s EMPTY: %s" %("NOT" if any_value else "IS", self.console_string()))
         return not any_value
 
@@ -44,25 +46,67 @@ class EEGData():
     
 
 class EEGSource(object):
-    def __init__(self):
+    def __init__(self, smoothing_seconds=SMOOTHING_SECONDS, rate=SAMPLE_RATE, ema=False):
         self.channels = 4
         # raw data:
         # 4 channels x 5 waves
         # + blink = 21
         self.raw_data = [0.0] * 21
-        self.data_history = []
+        # history of values, one row per sample, allocated on the first
+        # sample since its width depends on the source.
+        self.data_history = None
+        self.history_index = 0
+        self.history_length = 0
+        self.history_sum = None
+        self.set_smoothing(smoothing_seconds, rate, ema)
+
+    # smoothing is either a moving average over the last n seconds, or an
+    # exponential moving average with a time constant of n seconds.
+    def set_smoothing(self, seconds, rate=None, ema=None):
+        if rate is not None:
+            self.rate = rate
+        if ema is not None:
+            self.ema = ema
+        self.smoothing_seconds = seconds
+        self.window = max(1, int(round(seconds * self.rate)))
+        self.ema_alpha = 1.0 / self.window
+        self.data_history = None
         
     def read_data(self):
         # add new EEGdata to history
         data = self.read_new_data()
         if (data is not None):
-            # append data to history
-            self.data_history.append(data)
-        # pop data to save memory
-        if(len(self.data_history) > 10):
-            self.data_history.pop(0)
+            self.add_to_history(data.values)
         # and return it
         return self.get_smooth_data()
+
+    def add_to_history(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        if self.data_history is None or self.data_history.shape[1] != len(values):
+            self.data_history = np.zeros((self.window, len(values)))
+            self.history_sum = np.zeros(len(values))
+            self.history_index = 0
+            self.history_length = 0
+
+        row = self.data_history[self.history_index]
+        if self.ema:
+            if self.history_length == 0:
+                self.history_sum[:] = values
+            else:
+                self.history_sum += self.ema_alpha * (values - self.history_sum)
+        elif self.history_length == self.window:
+            # running sum: replace the oldest row
+            self.history_sum += values - row
+        else:
+            self.history_sum += values
+        row[:] = values
+
+        self.history_index = (self.history_index + 1) % self.window
+        self.history_length = min(self.history_length + 1, self.window)
+        if self.history_index == 0 and not self.ema:
+            # recompute once per cycle so rounding errors (or a nan) don't
+            # stick around forever
+            self.history_sum = self.data_history.sum(axis=0)
     
     # read_new_data is an abstract method to implement
     # in child classes. It returns a new EEGData to be added to the source
@@ -70,26 +114,20 @@ class EEGSource(object):
     def read_new_data(self):
         return EEGData(self.raw_data)
     
-    # returns the latest data from source history
+    # returns the latest data from source history. it's a view on the
+    # history, only valid until the row is overwritten.
     def get_data(self):
-        if(self.data_history is None or len(self.data_history) == 0):
+        if(self.data_history is None or self.history_length == 0):
             return None
-        return self.data_history[-1]
+        return EEGData(self.data_history[self.history_index - 1])
 
-    # returns an average data from 10 last bitd in history
+    # returns an average of the history over the smoothing window
     def get_smooth_data(self):
-        if(self.data_history is None or len(self.data_history) == 0):
+        if(self.data_history is None or self.history_length == 0):
             return None
-        last_elements = len(self.data_history)
-        if last_elements > 10 : last_elements = 10
-        lastvalues = []
-
-        for data in self.data_history[-last_elements:]:
-            lastvalues.append(data.values)
-        avgvalues = []
-        for i in range(len(lastvalues[0])):
-            avgvalues.append(sum(values[i] for values in lastvalues) / len(lastvalues))
-        return EEGData(avgvalues)
+        if self.ema:
+            return EEGData(self.history_sum.copy())
+        return EEGData(self.history_sum / self.history_length)
     
 
 
@@ -162,6 +200,50 @@ class EEGFromJSONFile(EEGSource):
 
         return sample_data
 
+class EEGFromRecording(EEGSource):
+    # replays a recording converted by muse_recordings.py (Muse JSON files
+    # are converted on first use). the file is memory-mapped, so starting
+    # is instant and memory use doesn't depend on the recording length.
+    def __init__(self, filepath, realtime=True, loop=True):
+        super(EEGFromRecording, self).__init__()
+        print('EEGFromRecording Started: ' + filepath)
+        self.recording = load_recording(filepath)
+        self.timestamps = self.recording['t']
+        self.sample_length = len(self.recording)
+        self.realtime = realtime
+        self.loop = loop
+        self.sample_index = 0
+        self.start_time = None
+        print(str(self.sample_length) + ' samples found')
+
+    # returns the sample recorded at the same time since the start of the
+    # replay, or simply the next one when not in realtime
+    def read_new_data(self):
+        if(self.sample_length == 0):
+            return None
+        if(self.realtime):
+            now = time.time()
+            if(self.start_time is None):
+                self.start_time = now
+            position = self.timestamps[0] + now - self.start_time
+            if(position > self.timestamps[-1]):
+                if(not self.loop):
+                    return None
+                print("SAMPLE recording is over. Restart")
+                self.start_time = now
+                position = self.timestamps[0]
+            index = max(0, int(np.searchsorted(self.timestamps, position, 'right')) - 1)
+        else:
+            if(self.sample_index >= self.sample_length):
+                if(not self.loop):
+                    return None
+                print("SAMPLE recording is over. Restart")
+                self.sample_index = 0
+            index = self.sample_index
+            self.sample_index += 1
+
+        return EEGData(self.recording['values'][index])
+
 class EEGFromRabbitMQ(EEGSource):
     def __init__(self, host, port, user, password, virtualhost):
         super(EEGFromRabbitMQ, self).__init__()
@@ -171,6 +253,9 @@ class EEGFromRabbitMQ(EEGSource):
         # Access the CLODUAMQP_URL environment variable and parse it (fallback to localhost)
         self.rabbit = RabbitController(host, port, user, password, virtualhost)
         self.latest_data = None
+        # sequence numbers are only sent with the binary format
+        self.last_sequence = None
+        self.lost_messages = 0
         self.listening_task = threading.Thread(name="eeg_data", 
                                                target=self.listen)
         self.listening_task.start()
@@ -182,9 +267,15 @@ class EEGFromRabbitMQ(EEGSource):
     def rabbitcallback(self, ch, method, properties, body):
         if(body is None or body == ''):
             return
-        command = json.loads(body)
-        self.latest_data = EEGData(command['Values'])
-        # print("received latest EEG Data: %s" %(repr(command['Values'])))
+        # JSON or binary, depending on the message's content_type
+        command = EEGDataCommand.from_message(properties, body)
+        if(command.sequence is not None):
+            if(self.last_sequence is not None and command.sequence > self.last_sequence + 1):
+                self.lost_messages += command.sequence - self.last_sequence - 1
+                print("[!] lost %s EEG data messages" %(command.sequence - self.last_sequence - 1))
+            self.last_sequence = command.sequence
+        self.latest_data = EEGData(command.Values)
+        # print("received latest EEG Data: %s" %(repr(command.Values)))
     # iterate samples
     def read_new_data(self):
         return self.latest_data
@@ -0,0 +1,201 @@
+import mmap
+import struct
+import subprocess
+import threading
+import Queue
+from ctypes import c_char, addressof, memmove
+
+from fr0stlib.render import save_buffer
+
+
+class FrameSink(object):
+    """Consumes rendered frames on its own thread.
+
+    push() is called from the render thread with the raw output_buffer
+    returned by the renderer (rows of 8 bit RGB or RGBA pixels, top to
+    bottom). Frames wait in a bounded queue; when the sink falls behind, new
+    frames are dropped instead of stalling the render loop."""
+
+    def __init__(self, maxqueue=4):
+        self.queue = Queue.Queue(maxqueue)
+        self.frames = 0
+        self.dropped = 0
+        self.thread = threading.Thread(target=self._loop,
+                                       name=self.__class__.__name__)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def push(self, output_buffer, size, channels):
+        try:
+            self.queue.put_nowait((output_buffer, size, channels))
+        except Queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        """Stops the sink once all queued frames are written."""
+        self.queue.put(None)
+        self.thread.join()
+
+    def _loop(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            try:
+                self.write(*item)
+                self.frames += 1
+            except Exception as ex:
+                import traceback
+                print('[!] error in %s: %s' %(self.__class__.__name__, ex))
+                traceback.print_exc()
+        try:
+            self.finish()
+        except Exception as ex:
+            print('[!] error closing %s: %s' %(self.__class__.__name__, ex))
+
+    def write(self, output_buffer, size, channels):
+        raise NotImplementedError
+
+    def finish(self):
+        pass
+
+
+class PipeSink(FrameSink):
+    """Pipes raw frames into the stdin of an external program, typically a
+    video encoder. The command is started on the first frame, after
+    substituting %(width)d, %(height)d, %(fps)s and %(pix_fmt)s, e.g.:
+
+    ffmpeg -f rawvideo -pix_fmt %(pix_fmt)s -s %(width)dx%(height)d
+           -r %(fps)s -i - -c:v libx264 -pix_fmt yuv420p out.mp4
+
+    All frames must have the same size."""
+
+    def __init__(self, command, fps=20, maxqueue=4):
+        self.command = command
+        self.fps = fps
+        self.process = None
+        self.size = None
+        FrameSink.__init__(self, maxqueue)
+
+    def write(self, output_buffer, size, channels):
+        if self.process is None:
+            w, h = self.size = size
+            args = dict(width=w, height=h, fps=self.fps,
+                        pix_fmt="rgb24" if channels == 3 else "rgba")
+            if isinstance(self.command, basestring):
+                command = (self.command % args).split()
+            else:
+                command = [i % args for i in self.command]
+            self.process = subprocess.Popen(command, stdin=subprocess.PIPE)
+        elif size != self.size:
+            raise ValueError("frame size changed from %s to %s"
+                             %(self.size, size))
+        self.process.stdin.write(buffer(output_buffer))
+
+    def finish(self):
+        if self.process is not None:
+            self.process.stdin.close()
+            self.process.wait()
+
+
+class ImageFileSink(FrameSink):
+    """Saves every frame as a numbered image. The template is formatted with
+    the frame number, e.g. 'frames/%05d.png'. Png needs no extra libraries,
+    jpg needs PIL (see fr0stlib.render.save_buffer)."""
+
+    def __init__(self, template, start=0, jpg_quality=95, maxqueue=8):
+        self.template = template
+        self.index = start
+        self.jpg_quality = jpg_quality
+        FrameSink.__init__(self, maxqueue)
+
+    def write(self, output_buffer, size, channels):
+        save_buffer(self.template % self.index, output_buffer, size,
+                    channels, self.jpg_quality)
+        self.index += 1
+
+
+# Ring buffer layout: a header followed by nslots frames of slotsize bytes.
+# The counter is the number of frames written so far; frame n lives in slot
+# n % nslots. It's written last, so a reader never sees a half-written
+# latest frame (unless it falls nslots frames behind).
+RING_MAGIC = "MMRING01"
+RING_HEADER = struct.Struct("<8s6Q")
+
+
+class SharedMemoryRingSink(FrameSink):
+    """Writes frames into a memory mapped ring buffer, so other processes
+    (e.g. a projector host or a streaming server) can pick up the latest
+    frame without any copying through pipes. On linux, pass a path in
+    /dev/shm to keep it in memory. The file is created on the first frame,
+    sized after it."""
+
+    def __init__(self, path, nslots=4, maxqueue=2):
+        self.path = path
+        self.nslots = nslots
+        self.shape = None
+        self.map = None
+        self.counter = 0
+        FrameSink.__init__(self, maxqueue)
+
+    def _open(self, (w, h), channels):
+        self.shape = w, h, channels
+        self.slotsize = w * h * channels
+        length = RING_HEADER.size + self.nslots * self.slotsize
+        with open(self.path, "wb") as f:
+            f.truncate(length)
+        self.file = open(self.path, "r+b")
+        self.map = mmap.mmap(self.file.fileno(), length)
+        # frames are copied straight from the render buffer into the map.
+        self.address = addressof((c_char * length).from_buffer(self.map))
+        self._write_header()
+
+    def _write_header(self):
+        w, h, c = self.shape
+        self.map[:RING_HEADER.size] = RING_HEADER.pack(
+            RING_MAGIC, w, h, c, self.nslots, self.slotsize, self.counter)
+
+    def write(self, output_buffer, size, channels):
+        if self.map is None:
+            self._open(size, channels)
+        elif tuple(size) + (channels,) != self.shape:
+            raise ValueError("frame shape %s doesn't match ring buffer %s"
+                             %(tuple(size) + (channels,), self.shape))
+        start = RING_HEADER.size + (self.counter % self.nslots) * self.slotsize
+        memmove(self.address + start, output_buffer, self.slotsize)
+        self.counter += 1
+        self._write_header()
+
+    def finish(self):
+        if self.map is not None:
+            self.map.close()
+            self.file.close()
+
+
+class SharedMemoryRingReader(object):
+    """Reads frames written by a SharedMemoryRingSink."""
+
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, w, h, c, self.nslots, self.slotsize, _ = self.read_header()
+        if magic != RING_MAGIC:
+            raise ValueError("%s is not a frame ring buffer" % path)
+        self.size = w, h
+        self.channels = c
+
+    def read_header(self):
+        return RING_HEADER.unpack(self.map[:RING_HEADER.size])
+
+    def latest(self):
+        """Returns (frame number, raw frame string) of the most recently
+        written frame, or (0, None) if nothing was written yet."""
+        counter = self.read_header()[-1]
+        if counter == 0:
+            return 0, None
+        start = RING_HEADER.size + ((counter - 1) % self.nslots) * self.slotsize
+        return counter, self.map[start:start + self.slotsize]
+
+    def close(self):
+        self.map.close()
+        self.file.close()
@@ -0,0 +1,97 @@
+"""
+Converts Muse JSON recordings into a compact binary file that can be
+memory-mapped for replay (see EEGFromRecording in eegsources.py).
+
+The file is a plain .npy structured array with one record per sample:
+    t       float64, unix timestamp of the sample
+    values  float32[channels * 5 + 2], the layout used by EEGData:
+            alpha, beta, gamma, delta, theta (absolute band powers, one
+            value per channel each), blink and meditation state (always 0,
+            recordings don't have one).
+
+usage: python muse_recordings.py recording.json [more.json ...]
+"""
+import os
+import sys
+import json
+import numpy as np
+
+BANDS = ('alpha_absolute', 'beta_absolute', 'gamma_absolute',
+         'delta_absolute', 'theta_absolute')
+
+
+def recording_dtype(width):
+    return np.dtype([('t', '<f8'), ('values', '<f4', (width,))])
+
+
+def converted_path(json_path):
+    return os.path.splitext(json_path)[0] + '.npy'
+
+
+def align_series(series, timestamps, width):
+    """Values of a Muse series at the given timestamps, as a
+    (len(timestamps), width) array holding the sample nearest in time to
+    each timestamp. Series of the same packet are timestamped a few
+    microseconds apart; series sampled at another rate or with gaps are
+    lined up the same way. An empty series is all zeros."""
+    samples = np.asarray(series['samples'], dtype=np.float32).reshape(-1, width)
+    times = np.asarray(series['timestamps'], dtype=np.float64)
+    count = min(len(samples), len(times))
+    if not count:
+        return np.zeros((len(timestamps), width), dtype=np.float32)
+    times = times[:count]
+    after = np.clip(np.searchsorted(times, timestamps), 0, count - 1)
+    before = np.clip(after - 1, 0, count - 1)
+    nearer = np.abs(times[before] - timestamps) <= np.abs(times[after] - timestamps)
+    return samples[np.where(nearer, before, after)]
+
+
+def convert_muse_json(json_path, npy_path=None):
+    """Converts a Muse JSON recording and returns the path of the new file.
+    Only needs to be done once per recording."""
+    if npy_path is None:
+        npy_path = converted_path(json_path)
+    with open(json_path) as f:
+        timeseries = json.load(f)['timeseries']
+
+    # every series is lined up on the timestamps of the first band
+    reference = timeseries[BANDS[0]]
+    timestamps = np.asarray(reference['timestamps'], dtype=np.float64)
+    count = len(timestamps)
+    channels = len(reference['samples'][0]) if reference['samples'] else 0
+
+    records = np.zeros(count, dtype=recording_dtype(channels * 5 + 2))
+    records['t'] = timestamps
+    values = records['values']
+    for i, band in enumerate(BANDS):
+        values[:, i * channels:(i + 1) * channels] = align_series(
+            timeseries[band], timestamps, channels)
+    if 'blink' in timeseries:
+        values[:, -2] = align_series(timeseries['blink'], timestamps, 1)[:, 0]
+
+    # written under a temporary name so a crash never leaves a partial file
+    tmp_path = npy_path + '.part'
+    with open(tmp_path, 'wb') as f:
+        np.save(f, records)
+    if os.path.exists(npy_path):
+        os.remove(npy_path)
+    os.rename(tmp_path, npy_path)
+    return npy_path
+
+
+def load_recording(path):
+    """Memory-maps a converted recording. Muse JSON files are converted
+    first, unless an up to date .npy file already exists next to them."""
+    if path.endswith('.json'):
+        npy_path = converted_path(path)
+        if (not os.path.exists(npy_path)
+                or os.path.getmtime(npy_path) < os.path.getmtime(path)):
+            print('[ ] converting %s' % path)
+            convert_muse_json(path, npy_path)
+        path = npy_path
+    return np.load(path, mmap_mode='r')
+
+
+if __name__ == '__main__':
+    for json_path in sys.argv[1:]:
+        print(convert_muse_json(json_path))
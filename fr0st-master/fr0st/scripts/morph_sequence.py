@@ -1,20 +1,36 @@
-from fr0stlib.render import to_string
-from fr0stlib.pyflam3 import Genome, byref, flam3_interpolate
+import itertools, threading
+
+from fr0stlib.timeline import Timeline, EASINGS
 
 from utils import animation_preview
 
 
-def interpolate(flames):
-    s = "<flames>%s</flames>" % "".join(map(to_string, flames))
-    genomes, ngenomes = Genome.from_string(s)
-    
-    target = Genome()
-    for i in range(int(flames[0].time), int(flames[-1].time + 1)):
-        flam3_interpolate(genomes, ngenomes, i, 0, byref(target))
-        flame = Flame(target.to_string())
-        flame.name = "morphed_%04d" % i
-        yield flame
-        
+def frame_times(timeline):
+    return range(int(timeline.start), int(timeline.end + 1))
+
+
+def interpolate(timeline):
+    for i in frame_times(timeline):
+        yield timeline.flame(i, name="morphed_%04d" % i)
+
+
+def genome_preview(timeline, previewframe):
+    """Loops the morph in the large preview. Genomes are rendered directly,
+    without parsing each frame into a Flame, and the LRU holds the whole
+    loop so only the first pass interpolates. Each frame waits for the
+    previous one to be rendered instead of superseding it."""
+    times = frame_times(timeline)
+    timeline.cache_size = max(timeline.cache_size, len(times))
+    for i in itertools.cycle(times):
+        if not previewframe.IsShown():
+            return
+        done = threading.Event()
+        previewframe.RenderPreview(timeline.genome(i),
+                                   buffer_func=lambda *a: done.set())
+        show_status("previewing morphed_%04d" % i)
+        # A render that is cancelled never calls back.
+        done.wait(1)
+
 
 def getinput():
     flames = get_flames()
@@ -25,17 +41,18 @@ def getinput():
                  ("Last flame", flames, len(flames) - 1),
                  ("keyframe interval", int, 0),
                  ("wrap around", bool),
+                 ("easing", sorted(EASINGS)),
                  ("preview only", bool, True))
-    first, last, interval, wrap, preview = res
+    first, last, interval, wrap, easing, preview = res
     flames = flames[flames.index(first):flames.index(last)+1]
     if len(flames) < 2:
         raise ValueError("Need to select at least 2 flames")
-    return flames, interval, wrap, preview
+    return flames, interval, wrap, easing, preview
 
 
 update_flame = False
 
-flames, interval, wrap, preview_only = getinput()
+flames, interval, wrap, easing, preview_only = getinput()
 
 
 if wrap:
@@ -53,9 +70,14 @@ else:
 if len(set(f.time for f in flames)) != len(flames):
     raise ValueError("2 or more flames have the same time value.")
 
-flame_gen = interpolate(flames)
+timeline = Timeline(flames, easing)
 if preview_only:
-    animation_preview(flame_gen)
+    if _self.previewframe.IsShown():
+        genome_preview(timeline, _self.previewframe)
+    else:
+        # The large preview ignores requests while it's hidden, so use the
+        # small one, which needs Flames to update the editor.
+        animation_preview(interpolate(timeline))
 else:
-    save_flames("parameters/morph_sequence.flame", *tuple(flame_gen),
-                confirm=False)
+    save_flames("parameters/morph_sequence.flame",
+                *tuple(interpolate(timeline)), confirm=False)
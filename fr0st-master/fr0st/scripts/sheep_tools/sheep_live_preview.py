@@ -33,9 +33,7 @@ def ScriptHack(func):
 
 
 def rotate_sheep(f, rot):
-    for x in f.xform:
-        if x.animate:
-            x.rotate(rot)    
+    f.transform_xforms(f.xform_mask(animate=True), rotate=rot)
 
 def main():
     """This is the actual script."""
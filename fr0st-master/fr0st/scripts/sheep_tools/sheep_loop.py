@@ -2,10 +2,9 @@
 def sheep_loop(flame, nframes):
     name = flame.name + " %03d"
     lst = []
+    mask = flame.xform_mask(animate=True)
     for i in range(nframes):
-        for x in flame.xform:
-            if x.animate:
-                x.rotate(-360./nframes)
+        flame.transform_xforms(mask, rotate=-360./nframes)
         flame.name = name % i
         lst.append(flame.copy())
     return lst
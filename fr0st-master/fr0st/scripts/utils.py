@@ -3,8 +3,9 @@ This file contains several utility functions that can be imported
 from other scripts, through the standard python import mechanism.
 """
 
-import itertools, fr0stlib
-import math
+import itertools, functools, fr0stlib
+import math, os, random, multiprocessing
+import numpy
 
 def calculate_colors(xforms):
     """Distribute color values evenly among xforms. You can pass the entire
@@ -35,6 +36,93 @@ def batch(func, nflames, *a, **k):
     return lst
 
 
+# Job of a pool worker, set by _init_worker. Workers are forked, so the job
+# is inherited instead of pickled, and functions defined in scripts don't
+# need to be picklable.
+_worker_job = None
+
+def _init_worker(job):
+    global _worker_job
+    _worker_job = job
+
+
+def _seeded_call(seed, func, a, k):
+    random.seed(seed)
+    numpy.random.seed(seed % 2**32)
+    return func(*a, **k)
+
+
+def _run_job(job, i):
+    func, a, k, seed, thumbnail = job
+    flame = _seeded_call(seed + i, func, a, k)
+    string = flame.to_string()
+    image = None
+    if thumbnail is not None:
+        from fr0stlib.render import render_funcs, preview_renderer
+        size, kwds = thumbnail
+        image = str(buffer(render_funcs[preview_renderer](string, size, **kwds)))
+    return string, image
+
+
+def _parallel_worker(i):
+    return _run_job(_worker_job, i)
+
+
+def parallel_batch(func, nflames, args=(), kwds=None, processes=None, seed=None,
+                   thumbnail_size=None, thumbnail_quality=10):
+    """Like batch, but calls the generating function in a pool of processes.
+
+    Flame i is generated after seeding the random module (and numpy's) with
+    seed + i, so the same seed gives the same batch whatever the number of
+    processes. Without a seed, one is picked and printed.
+
+    Yields (flame, thumbnail) in order as soon as they're ready. With a
+    thumbnail_size, each flame is also rendered inside its worker, and
+    thumbnail is the raw 8 bit RGB buffer (see fr0stlib.render.save_buffer).
+    Otherwise it's None.
+
+    Needs os.fork to run in parallel, otherwise runs in this process. So does
+    the gui: forking its process copies locks held by the gui and render
+    threads, which the workers could then wait on forever."""
+    if seed is None:
+        seed = random.randrange(2**31)
+        print "batch seed: %s" % seed
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    thumbnail = None
+    if thumbnail_size is not None:
+        thumbnail = (thumbnail_size, dict(quality=thumbnail_quality, estimator=1,
+                                          filter_radius=0, nthreads=1,
+                                          fixed_seed=True))
+    name = func.__name__ + "%03d"
+
+    job = func, args, kwds or {}, seed, thumbnail
+    pool = None
+    state = random.getstate(), numpy.random.get_state()
+    try:
+        if (processes > 1 and nflames > 1 and hasattr(os, "fork")
+            and not fr0stlib.GUI):
+            pool = multiprocessing.Pool(min(processes, nflames),
+                                        _init_worker, (job,))
+            results = pool.imap(_parallel_worker, range(nflames))
+        else:
+            results = itertools.imap(functools.partial(_run_job, job),
+                                     range(nflames))
+        for i, (string, image) in enumerate(results):
+            flame = fr0stlib.Flame(string)
+            flame.name = name % i
+            yield flame, image
+        if pool is not None:
+            pool.close()
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+        # the serial fallback seeds this process' generators.
+        random.setstate(state[0])
+        numpy.random.set_state(state[1])
+
+
 def animation_preview(flames, repeat=True):
     """ animate flames in an infinite loop."""
     assert fr0stlib.GUI # guard against command line scripts.
@@ -20,7 +20,7 @@
 #  Boston, MA 02111-1307, USA.
 ##############################################################################
 import os, sys, shutil, random, itertools, ctypes, collections, re, numpy, \
-       colorsys
+       colorsys, struct, hashlib
 import xml.etree.cElementTree as etree
 from math import *
 from functools import partial
@@ -29,6 +29,7 @@ from fr0stlib.pyflam3 import Genome, RandomContext, flam3_nvariations, \
   variable_list, variation_list, variations, variables, flam3_estimate_bounding_box
 from fr0stlib.compatibility import compatibilize
 from fr0stlib.property_array import property_array
+from fr0stlib.xformarrays import XformArrays
 
 
 VERSION = "Fr0st 1.5"
@@ -41,9 +42,12 @@ class ParsingError(Exception):
 
 class Flame(object):
     _never_write = set(("final", "gradient", "xform", "name", "scale",
-                        "width", "height", "x_offset", "y_offset"))
+                        "width", "height", "x_offset", "y_offset",
+                        "_xform_arrays"))
     
     def __init__(self, string=""):
+        # Coefs and variation weights of all xforms live in these arrays.
+        self._xform_arrays = XformArrays()
         # Set minimum required attributes.
         self.name = "Untitled"
         self.xform = []
@@ -111,9 +115,10 @@ class Flame(object):
         return self
 
 
-    def to_string(self, omit_details=False):
+    def to_string(self, omit_details=False, hex_palette=False):
         """Extracts parameters from a Flame object and converts them into
-        string format."""
+        string format. With hex_palette, the gradient is written as a
+        compact block of hex values instead of 256 color elements."""
 
         # Make the flame header
         lst =  ['<flame ']
@@ -137,7 +142,7 @@ class Flame(object):
         
         # Make the gradient
         if not omit_details:
-            lst.append(self.gradient.to_string())
+            lst.append(self.gradient.to_string(hex_palette))
 
         lst.append('</flame>')
 
@@ -146,7 +151,35 @@ class Flame(object):
 
     def __repr__(self):
         return '<flame "%s">' % self.name
-    
+
+
+    def fingerprint(self, include_name=False):
+        """Returns a digest of everything that affects how the flame renders:
+        header, xforms (coefs, variations, chaos) and palette. It's computed
+        from the attributes without generating XML, and numbers are compared
+        at the precision they're saved with, so a flame and its reloaded
+        string have the same fingerprint. The name is left out unless
+        include_name is set."""
+        keys, values = [], []
+        _fingerprint_attributes(self._iter_attributes(), keys, values,
+                                None if include_name else "name")
+        for xform in self.iter_xforms():
+            keys.append("<final>" if xform.isfinal() else "<xform>")
+            _fingerprint_attributes(xform._iter_attributes(), keys, values)
+            post = xform.post
+            values.extend((xform.a, xform.b, xform.c, xform.d, xform.e,
+                           xform.f, post.a, post.b, post.c, post.d, post.e,
+                           post.f))
+            chaos = list(xform.chaos)
+            keys.append("chaos*%d" % len(chaos))
+            values.extend(chaos)
+        # Adding 0.0 turns -0.0 into 0.0.
+        values = (numpy.array(values, dtype=numpy.float64) + 0.0).tolist()
+        h = hashlib.sha1("\0".join(keys))
+        h.update("%.12g," * len(values) % tuple(values))
+        h.update(numpy.asarray(self.gradient.data, numpy.uint8).tostring())
+        return h.hexdigest()
+
 
     def add_final(self, **kwds):
         if self.final:
@@ -265,6 +298,53 @@ class Flame(object):
         self.y_offset += h        
 
 
+    def xform_mask(self, animate=False, final=False):
+        """Returns a boolean array with one entry per item of iter_xforms(),
+        for use with transform_xforms. By default it selects all xforms but
+        the final one. With animate, only xforms with the animate flag set
+        are selected, which never includes the final xform."""
+        mask = [not (animate and not x.animate) and (final or not x.isfinal())
+                for x in self.iter_xforms()]
+        return numpy.array(mask, dtype=bool)
+
+
+    def transform_xforms(self, mask=None, rotate=0.0, scale=1.0,
+                         translate=None, pivot=None, post=False):
+        """Rotates (in degrees) and scales the x and y vectors of the
+        xforms selected by mask, then moves their origins by translate. If
+        a pivot is given, the origins are also orbited around it by the same
+        angle. With post, the post transforms of the selected xforms are
+        changed instead.
+
+        This gives the same result (up to rounding) as calling rotate(rotate,
+        pivot), scale(scale) and move_pos(translate) on each xform, but all
+        xforms are done with one matrix multiply on the coefficient arrays.
+        mask is a sequence of booleans aligned with iter_xforms(), as
+        returned by xform_mask (which is also the default)."""
+        if mask is None:
+            mask = self.xform_mask()
+        selected = [x for x, m in zip(self.iter_xforms(), mask) if m]
+        if not selected:
+            return
+        plane = 1 if post else 0
+        theta = radians(rotate)
+        rot = numpy.array(((cos(theta), -sin(theta)),
+                           (sin(theta), cos(theta))))
+        # Xforms taken from another flame use that flame's arrays.
+        groups = collections.defaultdict(list)
+        for x in selected:
+            groups[x._arrays].append(x._row)
+        for arrays, rows in groups.iteritems():
+            # Each row is (a, d, b, e, c, f), i.e. the x, y and o vectors.
+            block = arrays.coefs[rows, plane].reshape(-1, 3, 2)
+            block[:, :2] = numpy.dot(block[:, :2], rot.T * scale)
+            if pivot is not None and rotate:
+                block[:, 2] = numpy.dot(block[:, 2] - pivot, rot.T) + pivot
+            if translate is not None:
+                block[:, 2] += translate
+            arrays.coefs[rows, plane] = block.reshape(-1, 6)
+
+
     def _iter_attributes(self):
         return itertools.chain((("name", self.name),
                                 ("size", self.size),
@@ -292,9 +372,13 @@ class Flame(object):
 
 class Palette(object):
     _template = "%c%c%c" * 256
+    _color_template = "".join('   <color index="%s" rgb="%%d %%d %%d"/>\n' % i
+                              for i in xrange(256))
     
     def __init__(self, element=None):
         self.data = numpy.zeros((256, 3), dtype=numpy.uint8)
+        # (raw data, hex, string) of the last call to to_string
+        self._string_cache = None
         if element is not None:
             self.from_flame_element(element)
 
@@ -311,12 +395,22 @@ class Palette(object):
         return iter(self.data)
 
 
-    def to_string(self):
-        return ''.join(['   <color index="%s" rgb="%s %s %s"/>\n' %
-                        (idx,
-                         int(self.data[idx, 0]),
-                         int(self.data[idx, 1]),
-                         int(self.data[idx, 2])) for idx in xrange(256)])
+    def to_string(self, hex=False):
+        """Returns the palette as flam3 color elements, or as an Apo-style
+        hex block. The result is reused until the palette data changes."""
+        raw = numpy.asarray(self.data, dtype=numpy.uint8).tostring()
+        cache = self._string_cache
+        if cache is not None and cache[0] == raw and cache[1] == hex:
+            return cache[2]
+        if hex:
+            digits = raw.encode("hex").upper()
+            string = ('   <palette count="256" format="RGB">\n%s   </palette>\n'
+                      % "".join("      %s\n" % digits[i:i+48]
+                                for i in xrange(0, len(digits), 48)))
+        else:
+            string = self._color_template % tuple(bytearray(raw))
+        self._string_cache = raw, hex, string
+        return string
 
 
     def to_buffer(self):
@@ -352,33 +446,24 @@ class Palette(object):
 
 
     def rotate(self, index):
-        self.data = numpy.array(list(self.data[-index:]) +
-                                list(self.data[:-index]), dtype=numpy.uint8)
+        self.data = numpy.concatenate((self.data[-index:], self.data[:-index]))
 
 
     def hue(self, value):
-        value = value/360.0
-        for i in xrange(256):
-            h,l,s = rgb2hls(self.data[i])
-            h = (h + value) % 1
-            rgb = hls2rgb((h,l,s))
-            self.data[i] = hls2rgb((h,l,s))
+        h,l,s = rgb2hls_array(self.data)
+        self.data[:] = hls2rgb_array((h + value/360.0) % 1, l, s)
 
             
     def saturation(self, value):
-        value = value/100.0
-        for i in xrange(256):
-            h,l,s = rgb2hls(self.data[i])
-            s = max(0, min(1, s + value))
-            self.data[i] = hls2rgb((h,l,s))
+        h,l,s = rgb2hls_array(self.data)
+        s = numpy.clip(s + value/100.0, 0, 1)
+        self.data[:] = hls2rgb_array(h, l, s)
 
             
     def brightness(self, value):
-        value = value/100.0
-        for i in xrange(256):
-            h,l,s = rgb2hls(self.data[i])
-            l = max(0, min(1, l + value))
-            self.data[i] = hls2rgb((h,l,s))
+        h,l,s = rgb2hls_array(self.data)
+        l = numpy.clip(l + value/100.0, 0, 1)
+        self.data[:] = hls2rgb_array(h, l, s)
 
             
     def invert(self):
@@ -386,17 +471,40 @@ class Palette(object):
 
 
     def from_seeds(self, seeds, curve='cos'):
+        """Builds a gradient through the given hsv seeds, the same as calling
+        pblend_color between each pair of consecutive seeds (the last one
+        wrapping around to the first), but for the whole palette at once."""
         ns = len(seeds)
-        d = 256/ns
-        r = 256%ns
-        gen = []
-        for i in xrange(ns):
-            ds = d + (i < r)
-            start, end = seeds[i-1], seeds[i]
-            for j in xrange(ds):
-                hsv = pblend_color(start, end, j/float(ds), curve)
-                gen.append(hsv2rgb(hsv))
-        self.data = numpy.array(gen, dtype=numpy.uint8)
+        # Entries per segment; the first 256 % ns segments get one more.
+        sizes = 256/ns + (numpy.arange(ns) < 256%ns)
+        segment = numpy.repeat(numpy.arange(ns), sizes)
+        first = numpy.cumsum(sizes) - sizes
+        j = numpy.arange(256) - first[segment]
+        n = j / sizes[segment].astype(numpy.float64)
+
+        end = numpy.array(seeds, dtype=numpy.float64).reshape(ns, 3)
+        start = numpy.roll(end, 1, axis=0)
+        h1, h2 = start[:,0], end[:,0]
+        wrap1 = h1 < h2 - .5
+        wrap2 = ~wrap1 & (h2 < h1 - .5)
+        h1 += wrap1
+        h2 += wrap2
+        same = (start == end).all(axis=1)
+
+        if curve == 'linear':
+            t = n
+        elif curve == 'cos':
+            t = 0.5 * (numpy.cos((n+1)*pi)+1)
+        elif curve == 'cubic':
+            t = 3*n*n - 2*n*n*n
+        else:
+            raise ValueError('invalid curve')
+
+        s, e = start[segment], end[segment]
+        hsv = s + ((e-s) * t[:,None])
+        fixed = (j == 0) | same[segment]
+        hsv[fixed] = s[fixed]
+        self.data = numpy.array(hsv2rgb_array(*hsv.T), dtype=numpy.uint8)
 
 
     def random(self, hue=(0,1), saturation=(0,1), value=(0,1),  nodes=(5,5),
@@ -411,7 +519,12 @@ class Palette(object):
 
 
 class Xform(object):
-    """Container for transform parameters."""
+    """Container for transform parameters.
+
+    The affine coefficients and variation weights are views into the
+    XformArrays of the parent flame, everything else is a plain attribute."""
+    __slots__ = ("_parent", "_arrays", "_row", "_coefs", "_weights",
+                 "_present", "chaos", "post", "__dict__", "__weakref__")
 
     # Control behavoir of certain attributes:
     # _always_write: is written to disk even if set at 0
@@ -427,6 +540,10 @@ class Xform(object):
 
     def __init__(self, parent, chaos=(), post=(1.,0.,0.,1.,0.,0.), **kwds):
         self._parent = parent
+        if isinstance(self, PostXform):
+            self._bind(parent._arrays, parent._row)
+        else:
+            parent._xform_arrays.allocate(self)
            
         if not isinstance(self, PostXform):
             self.opacity = 1.0
@@ -526,7 +643,7 @@ class Xform(object):
     def to_string(self):
         lst = ['   <%sxform '%("final" if self.isfinal() else "")]
         lst.extend('%s="%s" ' %i for i in self._iter_attributes())
-        lst.append('coefs="%s %s %s %s %s %s" ' % tuple(self.screen_coefs))
+        lst.append('coefs="%s %s %s %s %s %s" ' % self._screen_coefs_tuple())
         lst.append(self.post.to_string())
         lst.append(self.chaos.to_string())
         lst.append('/>\n')
@@ -552,6 +669,17 @@ class Xform(object):
         raise AttributeError(v)
 
 
+    def _bind(self, arrays, row):
+        self._arrays = arrays
+        self._row = row
+        self._coefs = arrays.coefs[row, 0]
+        self._weights = arrays.weights[row]
+        self._present = arrays.present[row]
+        post = getattr(self, "post", None)
+        if post is not None:
+            post._bind(arrays, row)
+
+
     @property
     def index(self):
         if self.isfinal():
@@ -564,107 +692,107 @@ class Xform(object):
         
     @property_array
     def coefs(self):
-        return self.a,self.d,self.b,self.e,self.c,self.f
+        return self._coefs.copy()
     @coefs.setter
     def coefs(self,v):
-        self.a,self.d,self.b,self.e,self.c,self.f = v
+        self._coefs[:] = tuple(v)
 
        
     @property_array
     def screen_coefs(self):
-        return self.a,-self.d,-self.b,self.e,self.c,-self.f
+        return self._coefs * _screen_signs
     @screen_coefs.setter
     def screen_coefs(self, v):
-        self.coefs = v
-        self.d = -self.d
-        self.b = -self.b
-        self.f = -self.f
+        self._coefs[:] = tuple(v)
+        self._coefs *= _screen_signs
+
+
+    def _screen_coefs_tuple(self):
+        # Same values as screen_coefs, without the property_array overhead.
+        return tuple(self._coefs * _screen_signs)
 
 
     def list_variations(self):
-        return [i for i in variation_list if i in self.__dict__]
+        return [variation_list[i] for i in self._present.nonzero()[0]]
 
 
     def _iter_attributes(self):
-        return ((k,v) for (k,v) in self.__dict__.iteritems()
-                if k not in self._never_write and v or k in self._always_write)
+        present = self._present
+        return itertools.chain(
+            ((k,v) for (k,v) in self.__dict__.iteritems()
+             if k not in self._never_write and v or k in self._always_write),
+            ((variation_list[i], v) for i, v in
+             zip(present.nonzero()[0], self._weights[present].tolist()) if v))
 
 #----------------------------------------------------------------------
 
+    # The methods below work on slices of the coefs row, which is laid out
+    # as (a, d, b, e, c, f): [0:2] is x, [2:4] is y and [4:6] is o.
+
     @property_array
     def pos(self):
-        return self.c, self.f
+        return self._coefs[4:].copy()
     @pos.setter
     def pos(self, v1, v2=None):
         if v2 is None: v1, v2 = v1
-        self.c = v1
-        self.f = v2
+        self._coefs[4:] = v1, v2
 
     def move_pos(self,v1,v2=None):
         if v2 is None: v1, v2 = v1       
-        self.c += v1
-        self.f += v2
+        self._coefs[4:] += v1, v2
 
 #----------------------------------------------------------------------
        
     @property_array
     def x(self):
-        return self.a + self.c, self.d + self.f
+        return self._coefs[:2] + self._coefs[4:]
     @x.setter
     def x(self,v1,v2=None):
         if v2 is None: v1, v2 = v1
-        self.a  = v1 - self.c
-        self.d  = v2 - self.f
+        self._coefs[:2] = (v1, v2) - self._coefs[4:]
 
     def move_x(self,v1,v2=None):     
         if v2 is None: v1, v2 = v1  
-        self.a += v1
-        self.d += v2
+        self._coefs[:2] += v1, v2
 
        
     @property_array
     def y(self):
-        return self.b + self.c, self.e + self.f
+        return self._coefs[2:4] + self._coefs[4:]
     @y.setter
     def y(self, v1, v2=None):
         if v2 is None: v1, v2 = v1
-        self.b  = v1 - self.c
-        self.e  = v2 - self.f
+        self._coefs[2:4] = (v1, v2) - self._coefs[4:]
 
     def move_y(self, v1, v2=None):     
         if v2 is None: v1, v2 = v1 
-        self.b += v1
-        self.e += v2
+        self._coefs[2:4] += v1, v2
 
        
     @property_array
     def o(self):
-        return self.c, self.f
+        return self._coefs[4:].copy()
     @o.setter
     def o(self, v1, v2=None):
         if v2 is None: v1, v2 = v1
-        self.a += self.c - v1
-        self.d += self.f - v2
-        self.b += self.c - v1
-        self.e += self.f - v2
-        self.c  = v1
-        self.f  = v2
+        coefs = self._coefs
+        delta = coefs[4:] - (v1, v2)
+        coefs[:2] += delta
+        coefs[2:4] += delta
+        coefs[4:] = v1, v2
 
 
     def move_o(self,v1,v2=None):
         if v2 is None: v1, v2 = v1
-        self.a -= v1
-        self.d -= v2
-        self.b -= v1
-        self.e -= v2
-        self.c += v1
-        self.f += v2
+        coefs = self._coefs
+        coefs[:4] -= v1, v2, v1, v2
+        coefs[4:] += v1, v2
 
     @property_array
     def points(self):
-        return ((self.a + self.c, self.d + self.f),
-                (self.b + self.c, self.e + self.f),
-                (self.c, self.f))
+        points = self._coefs.reshape(3, 2).copy()
+        points[:2] += points[2]
+        return points
     @points.setter
     def points(self, v):
         # no need to optimize the setter as much as the getter, so we keep
@@ -675,31 +803,31 @@ class Xform(object):
        
     @property_array
     def xp(self):
-        return polar((self.a, self.d))
+        return polar(self._coefs[:2].tolist())
     @xp.setter
     def xp(self, coord):
-        self.a, self.d = rect(coord)
+        self._coefs[:2] = rect(coord)
 
        
     @property_array
     def yp(self):
-        return polar((self.b, self.e))
+        return polar(self._coefs[2:4].tolist())
     @yp.setter
     def yp(self, coord):
-        self.b, self.e = rect(coord)
+        self._coefs[2:4] = rect(coord)
 
        
     @property_array
     def op(self):
-        return polar((self.c, self.f))
+        return polar(self._coefs[4:].tolist())
     @op.setter
     def op(self, coord):
-        self.c, self.f = rect(coord)
+        self._coefs[4:] = rect(coord)
 
        
     @property_array
     def polars(self):
-        return self.xp, self.yp, self.op
+        return map(polar, self._coefs.reshape(3, 2).tolist())
     @polars.setter
     def polars(self, coord):
         self.xp, self.yp, self.op = coord
@@ -707,25 +835,25 @@ class Xform(object):
 #----------------------------------------------------------------------
 
     def scale_x(self, v):
-        self.a *= v
-        self.d *= v
+        self._coefs[:2] *= v
 
     def scale_y(self, v):
-        self.b *= v
-        self.e *= v
+        self._coefs[2:4] *= v
         
     def scale(self,v):
-        self.a *= v
-        self.d *= v
-        self.b *= v
-        self.e *= v
+        self._coefs[:4] *= v
 
+
+    def _rotate_slice(self, start, deg):
+        # Same as adding deg to the angle of xp, yp or op.
+        l, theta = polar(self._coefs[start:start+2].tolist())
+        self._coefs[start:start+2] = rect((l, theta + deg))
         
     def rotate_x(self, deg):
-        self.xp += (0, deg)
+        self._rotate_slice(0, deg)
         
     def rotate_y(self, deg):
-        self.yp += (0, deg)
+        self._rotate_slice(2, deg)
 
     def rotate(self, deg, pivot=None):
         self.rotate_x(deg)
@@ -736,18 +864,18 @@ class Xform(object):
         
     # TODO: this function looks useless and unused
     def move(self, v):
-        self.op = (self.op[0] + v, self.op[1])
-        #self.op += (v, 0)
+        l, theta = polar(self._coefs[4:].tolist())
+        self._coefs[4:] = rect((l + v, theta))
 
 
     def orbit(self, deg, pivot=(0, 0)):
         """Orbits the transform around a fixed point without rotating it."""
         if pivot == (0, 0):
-            self.op += (0, deg)
+            self._rotate_slice(4, deg)
         else:
-            self.pos -= pivot
-            self.op += (0, deg)
-            self.pos += pivot
+            self._coefs[4:] -= pivot
+            self._rotate_slice(4, deg)
+            self._coefs[4:] += pivot
 
 #----------------------------------------------------------------------
 
@@ -777,6 +905,7 @@ class Xform(object):
 
 class PostXform(Xform):
     _allowed = set(('coefs', 'points', 'polars', 'screen_coefs', '_parent',
+                '_arrays', '_row', '_coefs', '_weights', '_present',
                 'a','b','c','d','e','f',
                 'x','y','o','pos',
                 'xp','yp','op'))
@@ -797,19 +926,63 @@ class PostXform(Xform):
     def delete(self):
         raise TypeError, "Can't delete a post transform"
 
+    def _bind(self, arrays, row):
+        self._arrays = arrays
+        self._row = row
+        self._coefs = arrays.coefs[row, 1]
+        # Post xforms have no variations.
+        self._weights = _no_weights
+        self._present = _no_variations
+
     def isactive(self):
-        return self.coefs != (1,0,0,1,0,0)
+        return tuple(self._coefs.tolist()) != (1,0,0,1,0,0)
 
     def isfinal(self):
         return False
 
     def to_string(self):
         if self.isactive():
-            return 'post="%s %s %s %s %s %s" ' % tuple(self.screen_coefs)
+            return 'post="%s %s %s %s %s %s" ' % self._screen_coefs_tuple()
         return ""
 
 
 
+# Xform attributes that are stored in the XformArrays of the flame.
+_screen_signs = numpy.array((1., -1., -1., 1., 1., -1.))
+_no_weights = numpy.zeros(flam3_nvariations)
+_no_variations = numpy.zeros(flam3_nvariations, dtype=bool)
+_no_weights.flags.writeable = _no_variations.flags.writeable = False
+
+
+def _coef_property(i):
+    def fget(self):
+        return float(self._coefs[i])
+    def fset(self, v):
+        self._coefs[i] = v
+    return property(fget, fset)
+
+for _i, _name in enumerate("adbecf"):
+    setattr(Xform, _name, _coef_property(_i))
+
+
+def _variation_property(i):
+    def fget(self):
+        return float(self._weights[i])
+    def fset(self, v):
+        self._weights[i] = v
+        self._present[i] = True
+    def fdel(self):
+        if not self._present[i]:
+            raise AttributeError(variation_list[i])
+        self._weights[i] = 0.0
+        self._present[i] = False
+    return property(fget, fset, fdel)
+
+for _i, _name in enumerate(variation_list):
+    setattr(Xform, _name, _variation_property(_i))
+
+
+
 class Chaos(object):
     """Handles the chaos values between xforms (as a directed graph).
 
@@ -869,6 +1042,21 @@ class Chaos(object):
 
 
 
+def _fingerprint_attributes(items, keys, values, skip=None):
+    for name, val in sorted(items):
+        if name == skip:
+            continue
+        if isinstance(val, basestring):
+            keys.append("%s=%s" %(name, val))
+        elif hasattr(val, "__iter__"):
+            val = list(val)
+            keys.append("%s*%d" %(name, len(val)))
+            values.extend(val)
+        else:
+            keys.append(name)
+            values.append(val)
+
+
 def save_flames(path, *flames):
     lst = [f.to_string() if isinstance(f, Flame) else f for f in flames]
     head, ext = os.path.splitext(path)
@@ -887,15 +1075,109 @@ def split_flamestrings(string):
     return re.findall(r'<flame .*?</flame>', string, re.DOTALL)
 
 
+def iter_flamestrings(filename, chunksize=1<<20):
+    """Reads a flame file a chunk at a time and yields (offset, flamestring)
+    for each flame, offset being its position in bytes in the file."""
+    with open(filename, "rb") as f:
+        data = ""
+        base = 0 # file offset of data[0]
+        pos = 0
+        while True:
+            start = data.find("<flame ", pos)
+            end = data.find("</flame>", start) if start != -1 else -1
+            if end != -1:
+                end += len("</flame>")
+                yield base + start, data[start:end]
+                pos = end
+                continue
+            chunk = f.read(chunksize)
+            if not chunk:
+                break
+            # Drop everything that was already scanned.
+            keep = start if start != -1 else max(pos, len(data) - 6)
+            base += keep
+            data = data[keep:] + chunk
+            pos = 0
+
+
+def iter_flames(filename):
+    """Parses a flame file incrementally, yielding flame objects as they are
+    read. Parsed elements are discarded, so memory use doesn't grow with the
+    size of the file."""
+    root = None
+    for event, element in etree.iterparse(filename, events=("start", "end")):
+        if event == "start":
+            if root is None:
+                root = element
+        elif element.tag == "flame":
+            yield Flame().from_element(element)
+            root.clear()
+
+
 def load_flamestrings(filename):
     """Reads a flame file and returns a list of flame strings."""
-    return split_flamestrings(open(filename).read())
+    return [s for _, s in iter_flamestrings(filename)]
 
 
 def load_flames(filename):
     """Reads a flame file and returns a list of flame objects."""
-    tree = etree.parse(open(filename))
-    return [Flame().from_element(e) for e in tree.findall('flame')]
+    return list(iter_flames(filename))
+
+
+# Sidecar index of flame files: the size and mtime of the indexed file,
+# the number of flames, then an (offset, length) pair per flame.
+_INDEX_MAGIC = "FR0STIDX"
+_index_header = struct.Struct("<8sqdq")
+
+def flame_index_path(filename):
+    return filename + ".idx"
+
+
+def load_flame_index(filename, write=False):
+    """Returns an array of (offset, length) pairs locating each flame of the
+    file. The index is read from a sidecar file when it's up to date,
+    otherwise the flame file is scanned. The sidecar is only written next to
+    the flame file if write is set (and the directory is writable).
+
+    Only the headless renderer uses the index so far. The gui still reads
+    every flame string of a file when it's opened (see FlameTree.SetFlames),
+    and skips thumbnails above 1000 flames."""
+    st = os.stat(filename)
+    path = flame_index_path(filename)
+    try:
+        with open(path, "rb") as f:
+            magic, size, mtime, count = _index_header.unpack(
+                f.read(_index_header.size))
+            if (magic, size, mtime) == (_INDEX_MAGIC, st.st_size, st.st_mtime):
+                index = numpy.fromfile(f, dtype="<i8", count=count*2)
+                if len(index) == count*2:
+                    return index.reshape(count, 2)
+    except (IOError, OSError, struct.error):
+        pass
+
+    index = numpy.array([(offset, len(s)) for offset, s
+                         in iter_flamestrings(filename)],
+                        dtype="<i8").reshape(-1, 2)
+    if write:
+        try:
+            with open(path, "wb") as f:
+                f.write(_index_header.pack(_INDEX_MAGIC, st.st_size,
+                                           st.st_mtime, len(index)))
+                index.tofile(f)
+        except (IOError, OSError):
+            pass
+    return index
+
+
+def load_flamestring(filename, n, index=None):
+    """Returns the string of the nth flame of a file, seeking straight to it
+    through the offset index."""
+    if index is None:
+        index = load_flame_index(filename)
+    offset, length = index[n]
+    with open(filename, "rb") as f:
+        f.seek(offset)
+        return f.read(length)
 
 
 def show_status(s):
@@ -943,6 +1225,68 @@ def hsv2rgb((h, s, v)):
     return tuple(int(x*255) for x in colorsys.hsv_to_rgb(h,s,v))
 
 
+def rgb2hls_array(data):
+    """Array version of rgb2hls. Takes an (n, 3) array of rgb values (0-255)
+    and returns the h, l and s arrays."""
+    r, g, b = numpy.asarray(data, dtype=numpy.float64).T / 255.
+    maxc = numpy.maximum(numpy.maximum(r, g), b)
+    minc = numpy.minimum(numpy.minimum(r, g), b)
+    l = (minc+maxc)/2.0
+    grey = minc == maxc
+    delta = numpy.where(grey, 1.0, maxc-minc)
+    s = numpy.where(l <= 0.5, delta / numpy.where(grey, 1.0, maxc+minc),
+                    delta / numpy.where(grey, 1.0, 2.0-maxc-minc))
+    rc = (maxc-r) / delta
+    gc = (maxc-g) / delta
+    bc = (maxc-b) / delta
+    h = numpy.where(r == maxc, bc-gc,
+                    numpy.where(g == maxc, 2.0+rc-bc, 4.0+gc-rc))
+    h = (h/6.0) % 1.0
+    h[grey] = 0.0
+    s[grey] = 0.0
+    return h, l, s
+
+
+def _hls_channel(m1, m2, hue):
+    hue = hue % 1.0
+    return numpy.where(hue < 1/6.0, m1 + (m2-m1)*hue*6.0,
+           numpy.where(hue < 0.5, m2,
+           numpy.where(hue < 2/3.0, m1 + (m2-m1)*(2/3.0-hue)*6.0, m1)))
+
+
+def hls2rgb_array(h, l, s):
+    """Array version of hls2rgb. Returns an (n, 3) int array."""
+    h, l, s = numpy.broadcast_arrays(*(numpy.asarray(x, dtype=numpy.float64)
+                                       for x in (h, l, s)))
+    m2 = numpy.where(l <= 0.5, l * (1.0+s), l+s-(l*s))
+    m1 = 2.0*l - m2
+    rgb = numpy.column_stack((_hls_channel(m1, m2, h+1/3.0),
+                              _hls_channel(m1, m2, h),
+                              _hls_channel(m1, m2, h-1/3.0)))
+    grey = s == 0.0
+    rgb[grey] = l[grey,None]
+    return (rgb*255).astype(int)
+
+
+def hsv2rgb_array(h, s, v):
+    """Array version of hsv2rgb. Returns an (n, 3) int array."""
+    h, s, v = numpy.broadcast_arrays(*(numpy.asarray(x, dtype=numpy.float64)
+                                       for x in (h, s, v)))
+    i = numpy.trunc(h*6.0)
+    f = (h*6.0) - i
+    p = v*(1.0 - s)
+    q = v*(1.0 - s*f)
+    t = v*(1.0 - s*(1.0-f))
+    # Rows of (r, g, b) for each of the six hue sectors.
+    sectors = numpy.array([(v, t, p), (q, v, p), (p, v, t),
+                           (p, q, v), (t, p, v), (v, p, q)])
+    i = (i % 6).astype(int)
+    rgb = sectors[i, :, numpy.arange(len(i))]
+    grey = s == 0.0
+    rgb[grey] = v[grey,None]
+    return (rgb*255).astype(int)
+
+
 def pblend(s, e, i, curve='linear'):
     """
     s = starting value
@@ -344,7 +344,7 @@ John Miller""" % fr0stlib.VERSION,
         if self.tree.CheckForChanges() == wx.ID_CANCEL:
             return
         
-        self.renderer.exitflag = True
+        self.renderer.shutdown()
 
         self.fh.SaveToConfig()
         self.editor.fh.SaveToConfig()
@@ -638,11 +638,12 @@ John Miller""" % fr0stlib.VERSION,
 
         data = self.tree.itemdata
 
-        # Check if flame has changed. to_string is needed to detect identical
-        # flames saved in different apps. This comparison takes about 5ms.
-        string = self.flame.to_string()
-        if Flame(data[-1]).to_string() != string:
-            data.append(string)
+        # Check if flame has changed. Fingerprints also detect identical
+        # flames saved in different apps, without generating any XML.
+        fingerprint = self.flame.fingerprint(include_name=True)
+        if data.GetFingerprints()[0] != fingerprint:
+            data.append(self.flame.to_string(),
+                        (fingerprint, self.flame.fingerprint()))
             self.tree.SetItemText(self.tree.item, data.name)
 
             self.DumpChanges()
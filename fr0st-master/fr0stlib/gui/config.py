@@ -68,6 +68,7 @@ def init_config(path):
                                      "estimator": 0,
                                      "filter_radius": 0.25,
                                      "spatial_oversample": 2},
+          "Progressive-Preview": True,
           "Render-Settings": {"quality": 500,
                               "filter_radius": 0.5,
                               "spatial_oversample": 2,
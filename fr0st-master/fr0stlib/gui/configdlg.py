@@ -70,7 +70,7 @@ class RenderPanel(wx.Panel):
         self.parent = parent.Parent
         wx.Panel.__init__(self, parent, -1)
 
-        choices = ["flam3", "flam4"]
+        choices = ["flam3", "flam4", "numpy"]
         
         self.rb = wx.RadioBox(self, -1, label="Renderer", choices=choices,
                               style=wx.RA_VERTICAL)
@@ -148,8 +148,16 @@ class PreviewPanel(wx.Panel):
         number_text(self, parent, gbs, 3, 'Oversample', 
                 'Large-Preview-Settings', 'spatial_oversample', 1, 4, is_int=True)
 
+        progressive = wx.CheckBox(self, -1, "Progressive")
+        progressive.SetValue(parent.local_config["Progressive-Preview"])
+        progressive.Bind(wx.EVT_CHECKBOX, self.OnProgressive)
+        gbs.Add(progressive, (4, 0), span=(1, 2))
+
         return Box(self, 'Large Preview', (gbs, 0, wx.EXPAND))
 
+    def OnProgressive(self, e):
+        self.parent.local_config["Progressive-Preview"] = e.IsChecked()
+
 
 class MiscPanel(wx.Panel):
     def __init__(self, parent):
@@ -178,7 +178,7 @@ class FlameTree(treemixin.DragAndDrop, treemixin.VirtualTree, wx.TreeCtrl):
         self.Expand(self.itemparent)
 
         # cancel all outstanding thumbnails.
-        del self.parent.parent.renderer.thumbqueue[:]
+        self.parent.parent.renderer.CancelThumbnails()
 
         if len(flamestrings) > 1000:
             self._render_thumbnails = False
@@ -206,12 +206,19 @@ class FlameTree(treemixin.DragAndDrop, treemixin.VirtualTree, wx.TreeCtrl):
         if child is None:
             child = self.item
             data = self.GetFlameData(child)
+        string = data[-1]
+        if (data.imgindex != -1 and data.thumbnail is not None
+            and data.GetFingerprints(data.thumbnail)[1]
+                == data.GetFingerprints(string)[1]):
+            # Thumbnail is up to date, e.g. only the name changed.
+            return
         req = self.parent.parent.renderer.ThumbnailRequest
-        req(partial(self.UpdateThumbnail, child=child, data=data, flag=flag),
-            data[-1], self.isz, quality=10, estimator=1, filter_radius=0)
+        req(partial(self.UpdateThumbnail, child=child, data=data, flag=flag,
+                    string=string),
+            string, self.isz, quality=10, estimator=1, filter_radius=0)
 
 
-    def UpdateThumbnail(self, bmp, child, data, flag):
+    def UpdateThumbnail(self, bmp, child, data, flag, string=None):
         """Callback function to process rendered thumbnails."""
         if flag and flag != self.flag:
             # This means the current thumbnail was for a file that is no longer
@@ -222,6 +229,7 @@ class FlameTree(treemixin.DragAndDrop, treemixin.VirtualTree, wx.TreeCtrl):
             data.imgindex = self.il.Add(bmp)
         else:
             self.il.Replace(data.imgindex, bmp)
+        data.thumbnail = string
         
         self.SetItemImage(child, data.imgindex)
 
@@ -21,6 +21,8 @@
 ##############################################################################
 import os, re
 
+from fr0stlib import Flame
+
 
 class ParentData(object):
     def __init__(self, path):
@@ -31,15 +33,48 @@ class ParentData(object):
 
 class ItemData(list):  
     def __init__(self, s):
+        # Fingerprints of strings of this item, see GetFingerprints.
+        self._fingerprints = {}
+        # String the current thumbnail was rendered from.
+        self.thumbnail = None
         self.append(s if isinstance(s, basestring) else s.to_string())
         self.redo = []
         self.UpdateName()
         self.imgindex = -1
         
 
-    def append(self,v):
+    def append(self, v, fingerprints=None):
         list.append(self,v)
         self.redo = []
+        if fingerprints is not None:
+            self._fingerprints[v] = fingerprints
+        self._PruneFingerprints()
+
+
+    def GetFingerprints(self, string=None):
+        """Returns the fingerprints of a string of this item (the current one
+        by default), with and without the name. They're cached, since
+        parsing the string takes a few ms."""
+        if string is None:
+            string = self[-1]
+        fingerprints = self._fingerprints.get(string)
+        if fingerprints is None:
+            flame = Flame(string)
+            fingerprints = (flame.fingerprint(include_name=True),
+                            flame.fingerprint())
+            self._fingerprints[string] = fingerprints
+        return fingerprints
+
+
+    def _PruneFingerprints(self):
+        """Forgets the fingerprints of strings that are no longer part of
+        the undo or redo lists (or the thumbnail)."""
+        live = set(self)
+        live.update(self.redo)
+        live.add(self.thumbnail)
+        for k in self._fingerprints.keys():
+            if k not in live:
+                del self._fingerprints[k]
 
 
     def HasChanged(self):
@@ -48,6 +83,7 @@ class ItemData(list):
 
     def Reset(self):
         del self[:-1], self.redo[:]
+        self._PruneFingerprints()
 
 
     def UpdateName(self):
@@ -23,6 +23,7 @@ import wx, sys, numpy as N, time
 from functools import partial
 
 from fr0stlib.decorators import *
+from fr0stlib.pyflam3 import Genome
 from config import config
 from _events import InMainFast
 
@@ -153,32 +154,55 @@ class PreviewFrame(wx.Frame):
         
 
     @InMainFast
-    def RenderPreview(self, flame=None):
+    def RenderPreview(self, flame=None, buffer_func=None, quality=None):
+        """Renders flame (a Flame or Genome) into the preview. If given,
+        buffer_func(output_buffer, size, channels) receives the raw image on
+        the render thread. quality overrides the Large-Preview-Settings
+        one."""
         if not self.IsShown():
             return
         flame = flame or self.parent.flame
         
         pw, ph = map(float, self.GetPanelSize())
-        fw, fh = map(float, flame.size)
+        if isinstance(flame, Genome):
+            fw, fh = map(float, (flame.width, flame.height))
+        else:
+            fw, fh = map(float, flame.size)
         ratio = min(pw/fw, ph/fh)
         size = int(fw * ratio), int(fh * ratio)
 
-        # Remove name so that cache will hit if that's the only difference.
-        oldname, flame.name = flame.name, ""
-        flamestr = flame.to_string()
-        flame.name = oldname
-
-        bmp = self.cache.get(flamestr, size)
-        if bmp is not None:
-            self.idlefunc = partial(self.RenderCallback,
-                                    flamestr, bmp, fromcache=True)
-            return
+        if isinstance(flame, Genome) or buffer_func is not None:
+            # Genomes come straight from flam3_interpolate and change on
+            # every frame, so they bypass the cache. So do frames whose
+            # buffer is needed, since the cache only holds bitmaps.
+            key = None
+        else:
+            # The fingerprint leaves out the name, so the cache will hit if
+            # that's the only difference.
+            key = flame.fingerprint()
+            if quality is not None:
+                key = key, quality
+
+            bmp = self.cache.get(key, size)
+            if bmp is not None:
+                self.idlefunc = partial(self.RenderCallback,
+                                        key, bmp, fromcache=True)
+                return
         
         self.rendering = True
-        req = self.parent.renderer.LargePreviewRequest
-        req(partial(self.RenderCallback, flamestr), flame, size,
-            progress_func=self.prog, cancel_func=self.CancelCallback,
-            **config["Large-Preview-Settings"])
+        callback = partial(self.RenderCallback, key)
+        kwds = dict(progress_func=self.prog, cancel_func=self.CancelCallback,
+                    buffer_func=buffer_func, **config["Large-Preview-Settings"])
+        if quality is not None:
+            kwds["quality"] = quality
+        if key is not None and config["Progressive-Preview"]:
+            # Edits show a coarse image at once, which is then refined up to
+            # the configured quality. Only the final image is cached.
+            self.parent.renderer.ProgressivePreviewRequest(
+                callback, self.UpdateCallback, flame, size, **kwds)
+        else:
+            self.parent.renderer.LargePreviewRequest(callback, flame, size,
+                                                     **kwds)
         self.SetTitle("Rendering - Flame Preview")
 
 
@@ -186,14 +210,20 @@ class PreviewFrame(wx.Frame):
         self.rendering = False
 
 
-    def RenderCallback(self, flamestr, bmp, fromcache=False):
+    def UpdateCallback(self, bmp):
+        """Shows an intermediate image of a progressive render."""
+        self.image.UpdateBitmap(bmp)
+
+
+    def RenderCallback(self, key, bmp, fromcache=False):
         self.image.UpdateBitmap(bmp)
         self.SetTitle("%s - Flame Preview" % self.parent.flame.name)
         if fromcache:
             self.SetStatusText("rendering: retrieved from cache")
         else:
             self.rendering = False
-            self.cache.put(flamestr, tuple(bmp.Size), bmp)
+            if key is not None:
+                self.cache.put(key, tuple(bmp.Size), bmp)
             self.SetStatusText("rendering: 100.00 %")
 
 
@@ -19,25 +19,53 @@
 #  the Free Software Foundation, Inc., 59 Temple Place - Suite 330,
 #  Boston, MA 02111-1307, USA.
 ##############################################################################
-import time, sys, traceback, wx
+import sys, time, traceback, itertools, multiprocessing, wx
+from Queue import Queue, PriorityQueue
+from threading import Lock
 
 from fr0stlib.decorators import Catches, Threaded
-from fr0stlib.render import render_funcs
+from fr0stlib.render import render_funcs, render_progressive, \
+     resolve_renderer, preview_renderer
+from fr0stlib.pyflam3 import RenderSession
 from fr0stlib.gui.config import config
 from fr0stlib.gui._events import InMainFast
 
+# Job priorities. Lower values are served first by the interactive workers.
+PREVIEW, LARGE_PREVIEW, THUMBNAIL = range(3)
+
+
+class RenderJob(object):
+    """A single render request. The flag is polled by the progress function
+    of the running render: 0 means keep going, 1 cancels it and 2 pauses
+    it."""
+    def __init__(self, kind, callback, args, kwds):
+        self.kind = kind
+        self.callback = callback
+        self.args = args
+        self.kwds = kwds
+        self.flag = 0
+
 
 class Renderer():
-    def __init__(self, parent):
+    def __init__(self, parent, workers=None):
         self.parent = parent
-        self.thumbqueue = []
-        self.previewqueue = []
-        self.largepreviewqueue = []
-        self.bgqueue = []
         self.exitflag = 0
-        self.previewflag = 0
         self.bgflag = 0
-        self.RenderLoop()
+        self._counter = itertools.count()
+        self._queue = PriorityQueue()
+        self._bgqueue = Queue()
+        self._lock = Lock()
+        self._running = set()
+        self._current = {}
+        self._thumbnails = []
+        # Progressive numpy previews accumulate here, so asking again for
+        # the same flame picks up where the last request stopped. A job
+        # holds the session lock for all of its passes.
+        self._session = RenderSession()
+        self._session_lock = Lock()
+        if workers is None:
+            workers = multiprocessing.cpu_count()
+        self.workers = [self.RenderLoop() for i in range(max(workers, 1))]
         self.bgRenderLoop()
 
 
@@ -47,99 +75,211 @@ class Renderer():
         # by the calling code.
         kwds["nthreads"] = 1
         kwds["fixed_seed"] = True
-        kwds["renderer"] = "flam3"
-        
-        self.thumbqueue.append((callback,args,kwds))
+        kwds["renderer"] = preview_renderer
+
+        job = RenderJob(THUMBNAIL, callback, args, kwds)
+        with self._lock:
+            self._thumbnails = [j for j in self._thumbnails if not j.flag]
+            self._thumbnails.append(job)
+        self._put(job)
 
 
     def PreviewRequest(self, callback, *args, **kwds):
-        """Schedules a render immediately after the current render is done.
+        """Schedules a render ahead of all other interactive requests.
         Cancels previous requests (assuming they are obsolete)."""
         kwds["nthreads"] = -1
         kwds["fixed_seed"] = True
-        kwds["renderer"] = "flam3"
-        self.previewflag = 1
-        
-        self.previewqueue = [(callback,args,kwds)]
+        kwds["renderer"] = preview_renderer
+        self._supersede(PREVIEW, LARGE_PREVIEW)
+
+        self._put(RenderJob(PREVIEW, callback, args, kwds))
+
 
-        
     def LargePreviewRequest(self, callback, *args, **kwds):
         """Makes a preview request with a progress function."""
-        prog_func = kwds["progress_func"]
-        kwds["progress_func"] = self.prog_wrapper(prog_func, "previewflag")
         kwds["renderer"] = kwds.get("renderer", config["renderer"])
-        self.previewflag = 1
+        self._supersede(PREVIEW, LARGE_PREVIEW)
+
+        self._put(RenderJob(LARGE_PREVIEW, callback, args, kwds))
 
-        self.largepreviewqueue = [(callback,args,kwds)]
+
+    def ProgressivePreviewRequest(self, callback, update_func, *args, **kwds):
+        """Like LargePreviewRequest, but a coarse image is shown right away
+        and then refined. update_func gets the intermediate bitmaps, at most
+        one every update_interval seconds, and callback the final one."""
+        kwds["update_func"] = update_func
+        self.LargePreviewRequest(callback, *args, **kwds)
 
 
     def RenderRequest(self, callback, *args, **kwds):
         """Makes a render request run in a different thread than previews,
         so it can be paused."""
-        prog_func = kwds["progress_func"]
-        kwds["progress_func"] = self.prog_wrapper(prog_func, "bgflag")
         kwds["renderer"] = kwds.get("renderer", config["renderer"])
+        job = RenderJob(None, callback, args, kwds)
+        kwds["progress_func"] = self.prog_wrapper(kwds["progress_func"], job)
+
+        self._bgqueue.put(job)
+
+
+    def CancelThumbnails(self):
+        """Cancels all outstanding thumbnail requests."""
+        with self._lock:
+            for job in self._thumbnails:
+                job.flag = 1
+            self._thumbnails = []
+
+
+    def _supersede(self, *kinds):
+        """Flags the most recent jobs of the given kinds as obsolete. Jobs
+        still in the queue are dropped, running ones are aborted."""
+        with self._lock:
+            for kind in kinds:
+                job = self._current.pop(kind, None)
+                if job is not None:
+                    job.flag = 1
+
+
+    def _put(self, job):
+        if job.kind != THUMBNAIL:
+            with self._lock:
+                self._current[job.kind] = job
+        prog_func = job.kwds.get("progress_func")
+        job.kwds["progress_func"] = self.prog_wrapper(prog_func, job)
+        self._queue.put((job.kind, next(self._counter), job))
 
-        self.bgqueue.append((callback,args,kwds))
-        
 
     @Threaded
     def RenderLoop(self):
         while not self.exitflag:
-            queue = (self.previewqueue or self.thumbqueue 
-                     or self.largepreviewqueue)
-            if queue:
-                self.bgflag = 2 # Pauses the other thread
-                self.previewflag = 0
-                self.process(*queue.pop(0))
-                self.bgflag = 0
-            else:
-                time.sleep(.01)  # Ideal interval needs to be tested
+            kind, _, job = self._queue.get()
+            if job is None or self.exitflag:
+                break
+            if job.flag:
+                # Obsoleted while waiting in the queue. The requester still
+                # needs to know the job won't call back.
+                cancel_func = job.kwds.pop("cancel_func", None)
+                if cancel_func is not None:
+                    cancel_func()
+                continue
+            with self._lock:
+                self._running.add(job)
+                self.bgflag = 2 # Pauses the background render
+            try:
+                self.process(job)
+            finally:
+                with self._lock:
+                    self._running.discard(job)
+                    if not self._running:
+                        self.bgflag = 0
 
 
     @Threaded
     def bgRenderLoop(self):
         while not self.exitflag:
-            queue = self.bgqueue
-            if queue:
-                self.process(*queue.pop(0))
-            else:
-                time.sleep(.01)
+            job = self._bgqueue.get()
+            if job is None or self.exitflag:
+                break
+            self.process(job)
+
+
+    def shutdown(self):
+        """Stops all workers. Running renders are aborted through their
+        progress functions."""
+        self.exitflag = True
+        for i in self.workers:
+            self._queue.put((-1, -1, None))
+        self._bgqueue.put(None)
 
 
     @Catches(wx.PyDeadObjectError)
-    def process(self, callback, args, kwds):
+    def process(self, job):
+        kwds = dict(job.kwds)
         cancel_func = kwds.pop("cancel_func", None)
-        renderer = kwds.pop("renderer")
+        buffer_func = kwds.pop("buffer_func", None)
+        update_func = kwds.pop("update_func", None)
+        renderer = resolve_renderer(kwds.pop("renderer"))
         try:
             render = render_funcs[renderer]
         except KeyError as e:
             raise ValueError("Invalid renderer: %s" %e.args)
+        if renderer == 'flam4':
+            channels = 4
+        else:
+            channels = kwds.get('transparent', False) + 3
         try:
-            output_buffer = render(*args,**kwds)
+            if update_func is None:
+                output_buffer = render(*job.args,**kwds)
+            else:
+                output_buffer = self.refine(job, renderer, update_func,
+                                            channels, kwds)
         except Exception:
             # Make sure render thread never crashes due to malformed flames.
             traceback.print_exc()
+            if cancel_func is not None:
+                cancel_func()
             return
 
-        # HACK: If by the time the render finishes it has been obsoleted,
-        # don't return the buffer in case of a large preview.
-        if cancel_func is not None and self.previewflag:
-            cancel_func()
+        # If by the time the render finishes it has been obsoleted, don't
+        # return the (possibly incomplete) buffer.
+        if job.kind is not None and job.flag:
+            if cancel_func is not None:
+                cancel_func()
             return
 
-        if renderer == 'flam4':
-            channels = 4
-        else:
-            channels = kwds.get('transparent', False) + 3
+        if buffer_func is not None:
+            # Gets the raw buffer on the render thread, e.g. to record it.
+            buffer_func(output_buffer, job.args[1], channels)
         # args[1] is always size...
-        self.OnImageReady(callback, args[1], output_buffer, channels)
-        
+        self.OnImageReady(job.callback, job.args[1], output_buffer, channels)
+
+
+    def refine(self, job, renderer, update_func, channels, kwds):
+        """Runs a progressive render, sending intermediate images to
+        update_func. Returns the last buffer, which is only complete if the
+        job hasn't been obsoleted meanwhile."""
+        interval = kwds.pop("update_interval", 0.25)
+        quality = kwds["quality"]
+        if renderer == 'numpy':
+            # passes() is a generator, so jobs running at the same time on
+            # the session would interleave on the same histogram. An
+            # obsoleted job stops at its next progress call, so the wait
+            # is short.
+            with self._session_lock:
+                kwds["session"] = self._session
+                return self._refine(job, renderer, update_func, channels,
+                                    interval, quality, kwds)
+        return self._refine(job, renderer, update_func, channels, interval,
+                            quality, kwds)
 
-    def prog_wrapper(self, f, flag):
+
+    def _refine(self, job, renderer, update_func, channels, interval,
+                quality, kwds):
+        last = 0
+        output_buffer = None
+        for output_buffer, reached in render_progressive(renderer, *job.args,
+                                                         **kwds):
+            if job.flag or reached >= quality:
+                break
+            # Early passes are fast, so drop some to keep the gui
+            # responsive.
+            if time.time() - last >= interval:
+                last = time.time()
+                self.OnImageReady(update_func, job.args[1], output_buffer,
+                                  channels)
+        return output_buffer
+
+
+    def prog_wrapper(self, f, job):
+        """Wraps a progress function so the render can be cancelled or paused
+        through the job's flag. A background render also pauses while any
+        interactive job is running."""
+        if job.kind is None:
+            getflag = lambda: job.flag or self.bgflag
+        else:
+            getflag = lambda: job.flag
         @Catches(TypeError)
         def prog_func(*args):
-            return self.exitflag or f(*args) or getattr(self, flag)
+            return self.exitflag or (f and f(*args)) or getflag()
         return prog_func
 
 
@@ -0,0 +1,220 @@
+##############################################################################
+#  Fractal Fr0st - fr0st
+#  https://launchpad.net/fr0st
+#
+#  Copyright (C) 2009 by Vitor Bosshard <algorias@gmail.com>
+#
+#  Fractal Fr0st is free software; you can redistribute
+#  it and/or modify it under the terms of the GNU General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Library General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this library; see the file COPYING.LIB.  If not, write to
+#  the Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+#  Boston, MA 02111-1307, USA.
+##############################################################################
+"""Renders flame files from the command line, without wx.
+
+Each flame in the file is one frame (e.g. the output of morph_sequence.py).
+Frames are spread over a pool of processes, and frames whose output file
+already exists are skipped, so an interrupted run can simply be restarted.
+
+Usage: python fr0st_render.py [options] file.flame
+"""
+import os, sys, time, traceback, multiprocessing
+from optparse import OptionParser
+
+from fr0stlib import Flame, load_flame_index, load_flamestring
+from fr0stlib.render import render_funcs, save_buffer
+
+
+def parse_range(s, n):
+    """Parses a python-style 'start:stop' frame range (stop exclusive, either
+    end optional, negative values count from the end) or a single index.
+    Raises ValueError for a malformed range or an index outside the file."""
+    if ":" not in s:
+        i = int(s)
+        if not -n <= i < n:
+            raise ValueError("frame %s out of range, file has %s flames"
+                             %(i, n))
+        return [i if i >= 0 else n + i]
+    start, stop = s.split(":", 1)
+    return range(n)[slice(int(start) if start else None,
+                          int(stop) if stop else None)]
+
+
+def output_path(template, index, flame):
+    """Fills in %(index)d, %(name)s and %(time)d in the output template."""
+    return template % dict(index=index, name=flame.name,
+                           time=int(getattr(flame, "time", 0)))
+
+
+def make_jobs(flames, indices, template, size=None, quality=None,
+              force=False):
+    """Returns a list of (index, path, flamestring, size, quality) tuples for
+    all frames that still need to be rendered. Flames are passed on as
+    strings, which are cheap to send to worker processes."""
+    jobs = []
+    for i in indices:
+        flame = flames[i]
+        path = output_path(template, i, flame)
+        if not force and os.path.exists(path):
+            continue
+        q = quality or int(getattr(flame, "quality", 0)) or 500
+        jobs.append((i, path, flame.to_string(),
+                     size or tuple(map(int, flame.size)), q))
+    return jobs
+
+
+def render_job(job, renderer="flam3", jpg_quality=95, **kwds):
+    """Renders a single frame and saves it. Returns the index of the frame
+    and the elapsed time."""
+    index, path, string, size, quality = job
+    t = time.time()
+    output_buffer = render_funcs[renderer](string, size, quality, **kwds)
+    if renderer == "flam4":
+        channels = 4
+    else:
+        channels = kwds.get("transparent", False) + 3
+    save_buffer(path, output_buffer, size, channels, jpg_quality)
+    return index, time.time() - t
+
+
+def no_progress(*args):
+    return 0
+
+
+class _Worker(object):
+    """Picklable callable used by the process pool."""
+    def __init__(self, **kwds):
+        self.kwds = kwds
+
+    def __call__(self, job):
+        try:
+            return render_job(job, **self.kwds)
+        except Exception:
+            # Report the failure but keep the rest of the batch going.
+            traceback.print_exc()
+            return job[0], None
+
+
+def render_batch(jobs, processes=None, **kwds):
+    """Renders all jobs, yielding (index, elapsed) as frames complete.
+    elapsed is None for frames that failed."""
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    worker = _Worker(**kwds)
+    if processes <= 1 or len(jobs) <= 1:
+        for job in jobs:
+            yield worker(job)
+        return
+    pool = multiprocessing.Pool(processes)
+    try:
+        for result in pool.imap_unordered(worker, jobs):
+            yield result
+        pool.close()
+    except KeyboardInterrupt:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+
+def get_parser():
+    parser = OptionParser(usage="%prog [options] file.flame")
+    parser.add_option("-o", "--output", default="%(index)05d_%(name)s.png",
+        help="output path template. Can contain %(index)d, %(name)s and "
+             "%(time)d. The extension selects the format (png, jpg, bmp). "
+             "Flames often share a name, so keep %(index)d in it to give "
+             "each frame its own file. [default: %default]")
+    parser.add_option("-f", "--frames", default=":",
+        help="frame range to render, as start:stop (python slice "
+             "semantics) or a single index. [default: all]")
+    parser.add_option("-s", "--size", help="image size as WIDTHxHEIGHT. "
+                      "[default: size stored in each flame]")
+    parser.add_option("-q", "--quality", type="int",
+                      help="samples per pixel. [default: from the flame, "
+                      "or 500]")
+    parser.add_option("-j", "--processes", type="int",
+                      default=multiprocessing.cpu_count(),
+                      help="number of render processes. [default: %default]")
+    parser.add_option("-r", "--renderer", default="flam3",
+                      choices=sorted(render_funcs), help="[default: %default]")
+    parser.add_option("--oversample", type="int", default=2,
+                      dest="spatial_oversample", help="[default: %default]")
+    parser.add_option("--filter-radius", type="float", default=0.5,
+                      dest="filter_radius", help="[default: %default]")
+    parser.add_option("--estimator", type="float", default=9,
+                      help="density estimation radius. [default: %default]")
+    parser.add_option("--transparent", action="store_true", default=False,
+                      help="render with an alpha channel (png only).")
+    parser.add_option("--jpg-quality", type="int", default=95,
+                      dest="jpg_quality", help="[default: %default]")
+    parser.add_option("--force", action="store_true", default=False,
+                      help="re-render frames whose output already exists.")
+    parser.add_option("--write-index", action="store_true", default=False,
+                      dest="write_index", help="save the offsets of the "
+                      "flames in FILE.idx, so later runs don't need to scan "
+                      "the whole file.")
+    return parser
+
+
+def main(argv=None):
+    parser = get_parser()
+    opts, args = parser.parse_args(argv)
+    if len(args) != 1:
+        parser.error("need exactly one flame file")
+    size = None
+    if opts.size:
+        try:
+            size = tuple(map(int, opts.size.lower().split("x")))
+            assert len(size) == 2 and all(i > 0 for i in size)
+        except (ValueError, AssertionError):
+            parser.error("invalid size: %s" % opts.size)
+
+    # Only the flames in the frame range are read and parsed.
+    index = load_flame_index(args[0], opts.write_index)
+    try:
+        indices = parse_range(opts.frames, len(index))
+    except ValueError, e:
+        parser.error("invalid frame range %s: %s" %(opts.frames, e))
+    flames = dict((i, Flame(load_flamestring(args[0], i, index)))
+                  for i in indices)
+    jobs = make_jobs(flames, indices, opts.output, size, opts.quality,
+                     opts.force)
+    print "%s frames, %s already rendered." %(len(indices),
+                                              len(indices) - len(jobs))
+
+    # With several processes, each flam3 instance gets a single thread.
+    nthreads = 1 if opts.processes > 1 and len(jobs) > 1 else 0
+    kwds = dict(renderer=opts.renderer, jpg_quality=opts.jpg_quality,
+                spatial_oversample=opts.spatial_oversample,
+                filter_radius=opts.filter_radius, estimator=opts.estimator,
+                transparent=opts.transparent, fixed_seed=False,
+                nthreads=nthreads)
+    if opts.renderer == "flam4":
+        # flam4 always calls its progress function.
+        kwds["progress_func"] = no_progress
+
+    failed = 0
+    t = time.time()
+    for done, (index, elapsed) in enumerate(render_batch(jobs, opts.processes,
+                                                         **kwds)):
+        if elapsed is None:
+            failed += 1
+            status = "failed"
+        else:
+            status = "%.2fs" % elapsed
+        print "[%s/%s] frame %s: %s" %(done + 1, len(jobs), index, status)
+    print "Done in %.2fs." %(time.time() - t)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
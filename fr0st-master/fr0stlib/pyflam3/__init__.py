@@ -19,9 +19,11 @@
 #  the Free Software Foundation, Inc., 59 Temple Place - Suite 330,
 #  Boston, MA 02111-1307, USA.
 ##############################################################################
-import sys, os, marshal
+import sys, os, marshal, numpy
+from threading import RLock
 
 from _flam3 import *
+import _numpy
 
 filter_kernel_dict = {"gaussian": 0,
                       "hermite": 1,
@@ -42,36 +44,9 @@ filter_kernel_dict = {"gaussian": 0,
 
 class Genome(BaseGenome):
     @classmethod
-    def load(cls, flamestring, ntemporal_samples=1, temporal_filter=1.0,
-             estimator=9, estimator_curve=.4, estimator_minimum=0,
-             spatial_oversample=1, filter_radius=1, filter_kernel=0,
-             interpolation=0, interpolation_type=1, **kwargs):
-        if isinstance(filter_kernel, basestring):
-            # if an invalid string is passed, let the KeyError propagate.
-            filter_kernel = filter_kernel_dict[filter_kernel.lower()]
-
-        if filter_kernel in (6,7):
-            # HACK: force earlyclip for lanczos filters, which don't work
-            # properly without it, generating lots of noise.
-            kwargs["earlyclip"] = True
-        
-        frame = Frame(**kwargs)
-        frame.genomes, frame.ngenomes = cls.from_string(flamestring)
-        
-        for i, genome in enumerate(frame.iter_genomes()):
-            genome.interpolation = interpolation
-            genome.interpolation_type = interpolation_type
-            genome.ntemporal_samples = ntemporal_samples
-            genome.temporal_filter_width = temporal_filter
-            genome.estimator = estimator
-            genome.estimator_curve = estimator_curve
-            genome.estimator_minimum = estimator_minimum
-            genome.spatial_oversample = spatial_oversample
-            genome.spatial_filter_radius = filter_radius
-            genome.spatial_filter_select = filter_kernel
-            genome.time = i
-
-        return frame
+    def load(cls, flamestring, **kwds):
+        genomes, ngenomes = cls.from_string(flamestring)
+        return Frame.from_genomes(genomes, ngenomes, **kwds)
 
 
     @classmethod
@@ -113,7 +88,54 @@ class Genome(BaseGenome):
 class Frame(BaseFrame):
     def __del__(self):
         # TODO: what if self.genomes is not set?
-        flam3_free(self.genomes)
+        # Genomes wrapped by from_genome are owned by the caller.
+        if getattr(self, "_genome", None) is None:
+            flam3_free(self.genomes)
+
+
+    @classmethod
+    def from_genomes(cls, genomes, ngenomes, ntemporal_samples=1,
+                     temporal_filter=1.0, estimator=9, estimator_curve=.4,
+                     estimator_minimum=0, spatial_oversample=1,
+                     filter_radius=1, filter_kernel=0, interpolation=0,
+                     interpolation_type=1, **kwargs):
+        if isinstance(filter_kernel, basestring):
+            # if an invalid string is passed, let the KeyError propagate.
+            filter_kernel = filter_kernel_dict[filter_kernel.lower()]
+
+        if filter_kernel in (6,7):
+            # HACK: force earlyclip for lanczos filters, which don't work
+            # properly without it, generating lots of noise.
+            kwargs["earlyclip"] = True
+        
+        frame = cls(**kwargs)
+        frame.genomes, frame.ngenomes = genomes, ngenomes
+        
+        for i, genome in enumerate(frame.iter_genomes()):
+            genome.interpolation = interpolation
+            genome.interpolation_type = interpolation_type
+            genome.ntemporal_samples = ntemporal_samples
+            genome.temporal_filter_width = temporal_filter
+            genome.estimator = estimator
+            genome.estimator_curve = estimator_curve
+            genome.estimator_minimum = estimator_minimum
+            genome.spatial_oversample = spatial_oversample
+            genome.spatial_filter_radius = filter_radius
+            genome.spatial_filter_select = filter_kernel
+            genome.time = i
+
+        return frame
+
+
+    @classmethod
+    def from_genome(cls, genome, **kwds):
+        """Renders an existing genome (e.g. the result of flam3_interpolate)
+        without printing and parsing it again. The genome is not copied, and
+        render settings are written into it."""
+        frame = cls.from_genomes(pointer(genome), 1, **kwds)
+        frame._genome = genome
+        return frame
+
     
     def __init__(self, fixed_seed=False, aspect=1.0, buffer_depth=64,
                  bytes_per_channel=1, progress_func=None, nthreads=0,
@@ -163,3 +185,200 @@ class Frame(BaseFrame):
                      transparent+3, transparent, byref(stats))
 
         return output_buffer, stats
+
+
+
+class Transition(object):
+    """Interpolates between two genomes, parsing each endpoint only once.
+
+    Endpoints can be given as flame strings or as Genome instances (e.g. the
+    current state of a previous transition). They're kept alive as long as
+    the transition is, so calling interpolate on every frame of an animation
+    involves no xml at all."""
+    def __init__(self, origin, target):
+        self._endpoints = (BaseGenome * 2)()
+        self._keepalive = [None, None]
+        self.set_origin(origin)
+        self.set_target(target)
+
+
+    def __del__(self):
+        for parsed in self._keepalive:
+            if parsed is not None and not isinstance(parsed, BaseGenome):
+                flam3_free(parsed)
+
+
+    def _set_endpoint(self, index, endpoint):
+        if isinstance(endpoint, BaseGenome):
+            source = endpoint
+        else:
+            genomes, ngenomes = Genome.from_string(endpoint)
+            if ngenomes != 1:
+                flam3_free(genomes)
+                raise ValueError("Expected 1 flame, got %s" % ngenomes)
+            source, endpoint = genomes[0], genomes
+
+        old = self._keepalive[index]
+        memmove(byref(self._endpoints[index]), byref(source),
+                sizeof(BaseGenome))
+        self._endpoints[index].time = index
+        self._keepalive[index] = endpoint
+        if old is not None and not isinstance(old, BaseGenome):
+            flam3_free(old)
+
+
+    def set_origin(self, origin):
+        self._set_endpoint(0, origin)
+
+
+    def set_target(self, target):
+        """Replaces the target, e.g. because it's being animated while the
+        transition is running. The origin is left untouched."""
+        self._set_endpoint(1, target)
+
+
+    def interpolate(self, time):
+        """Returns a new Genome at the given time, between 0 (origin) and
+        1 (target)."""
+        result = Genome()
+        flam3_interpolate(self._endpoints, 2, time, 0, byref(result))
+        return result
+
+
+
+class RenderSession(object):
+    """Keeps rendering the same flame into one accumulation histogram, so
+    every snapshot is better than the last without starting over.
+
+    flam3 only offers complete renders through its api, so the chaos game is
+    run by the numpy renderer (see _numpy.ChaosGame) and snapshots use its
+    tonemapping and density estimation. The histogram is reset when the
+    fingerprint of the flame, the size or the oversampling change. Methods
+    hold a lock, but passes() is a generator and interleaves with anything
+    else done to the session meanwhile, so only one render at a time should
+    use it."""
+    def __init__(self, seed=None):
+        self._rng = numpy.random.RandomState(seed)
+        self._lock = RLock()
+        self._game = None
+        self._key = None
+        self.flame = None
+        self.transparent = 0
+        self.de = {}
+
+
+    def set_flame(self, flame, size=None, transparent=0,
+                  spatial_oversample=1, estimator=0, estimator_curve=.4,
+                  estimator_minimum=0):
+        """Sets the flame (a Flame, Genome or flame string) to render, at the
+        size stored in it unless size is given. The density estimation
+        settings only apply to snapshots, so changing them keeps the
+        samples. Returns True if the histogram was reset."""
+        from fr0stlib import Flame
+        if type(flame) is not Flame:
+            if isinstance(flame, BaseGenome):
+                flame = flame.to_string()
+            flame = Flame(flame)
+        size = tuple(map(int, size or flame.size))
+        if not all(size):
+            raise ZeroDivisionError("Size passed to render function is 0.")
+        oversample = max(1, int(spatial_oversample))
+        key = flame.fingerprint(), size, oversample
+        with self._lock:
+            # The name is left out of the fingerprint, so keep the new flame
+            # around even if it renders the same.
+            self.flame = flame
+            self.transparent = transparent
+            self.de = dict(estimator=estimator,
+                           estimator_curve=estimator_curve,
+                           estimator_minimum=estimator_minimum)
+            if key == self._key:
+                return False
+            self._key = key
+            self._game = _numpy.ChaosGame(
+                flame, size, self._rng, oversample,
+                batch=min(_numpy.BATCH_SIZE, size[0] * size[1]))
+            return True
+
+
+    def reset(self):
+        """Discards all samples of the current flame."""
+        with self._lock:
+            game = self._game
+            if game is not None:
+                self._key = None
+                self.set_flame(self.flame, game.size, self.transparent,
+                               game.oversample, **self.de)
+
+
+    @property
+    def samples(self):
+        return self._game.samples if self._game else 0
+
+
+    @property
+    def quality(self):
+        """Samples accumulated so far per output pixel."""
+        return self._game.quality if self._game else 0
+
+
+    def add_samples(self, nsamples, progress_func=None):
+        """Iterates about nsamples more points, rounded up to whole batches.
+        Returns False if progress_func stopped it early."""
+        with self._lock:
+            if self._game is None:
+                raise ValueError("No flame set.")
+            game = self._game
+            nsteps = -(-int(nsamples) // game.batch)
+            with numpy.errstate(all='ignore'):
+                return game.run(nsteps * game.batch,
+                                _numpy.pausing(progress_func))
+
+
+    def refine(self, quality, progress_func=None):
+        """Adds samples until the given quality is reached. Returns False if
+        progress_func stopped it early."""
+        with self._lock:
+            needed = (quality - self.quality) * self._pixels()
+            if needed <= 0:
+                return True
+            return self.add_samples(needed, progress_func)
+
+
+    def snapshot(self):
+        """Tonemaps the histogram as it is now, and returns the image in the
+        same format as the render functions."""
+        with self._lock:
+            if self._game is None:
+                raise ValueError("No flame set.")
+            return _numpy.to_buffer(self._game.image(self.flame, None,
+                                                     self.transparent,
+                                                     **self.de))
+
+
+    def passes(self, quality, start_quality=1, growth=2,
+               progress_func=None):
+        """Generator yielding (output_buffer, quality) while refining up to
+        quality, multiplying it by growth on each pass. The first pass
+        starts at start_quality, or where a previous call left off. Progress
+        is reported over the whole range."""
+        target = min(max(start_quality, self.quality), quality)
+        while True:
+            base = self.quality
+            def scaled(py_object, done, stage, eta, base=base, target=target):
+                reached = base + done / 100. * (target - base)
+                return progress_func(py_object, 100. * reached / quality,
+                                     stage, eta)
+            if not self.refine(target, scaled if progress_func else None):
+                return
+            yield self.snapshot(), self.quality
+            if self.quality >= quality:
+                return
+            # Whole batches are run, so skip passes that were overshot.
+            while target <= self.quality:
+                target = min(target * growth, quality)
+
+
+    def _pixels(self):
+        w, h = self._game.size
+        return w * h
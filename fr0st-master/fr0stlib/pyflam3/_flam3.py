@@ -23,10 +23,15 @@ import itertools, sys, os
 from ctypes import *
 from fr0stlib.pyflam3.constants import *
 from fr0stlib.pyflam3.variations import *
-from fr0stlib.pyflam3.find_dll import find_dll
+from fr0stlib.pyflam3.find_dll import find_dll, MissingDll
 
 
-libflam3 = find_dll('libflam3')
+try:
+    libflam3 = find_dll('libflam3')
+except OSError, e:
+    # Flames can still be edited without flam3, and rendered through the
+    # numpy backend in fr0stlib.render.
+    libflam3 = MissingDll('libflam3', e)
 
 
 IteratorFunction = CFUNCTYPE(None, c_void_p, c_double)
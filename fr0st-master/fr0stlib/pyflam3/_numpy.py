@@ -0,0 +1,660 @@
+##############################################################################
+#  Fractal Fr0st - fr0st
+#  https://launchpad.net/fr0st
+#
+#  Copyright (C) 2009 by Vitor Bosshard <algorias@gmail.com>
+#
+#  Fractal Fr0st is free software; you can redistribute
+#  it and/or modify it under the terms of the GNU General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Library General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this library; see the file COPYING.LIB.  If not, write to
+#  the Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+#  Boston, MA 02111-1307, USA.
+##############################################################################
+"""Pure numpy implementation of the flam3 chaos game.
+
+A batch of points is iterated in lockstep, so every step costs a handful of
+array operations per xform instead of a python loop per sample. The math of
+each variation follows flam3 (variations.c), and so does the log-density
+tonemapping, including density estimation. Spatial filters are not
+implemented; oversampled images are box-filtered instead."""
+import time, warnings
+import numpy as N
+from ctypes import c_ubyte
+
+EPS = 1e-10
+PREFILTER_WHITE = 255.
+WHITE_LEVEL = 255.
+FUSE = 20
+BATCH_SIZE = 2**15
+DE_LEVEL_STEP = .75 # ratio between the kernel radii of density estimation
+DE_EXACT_RADIUS = 4 # larger density estimation kernels are approximated
+
+
+# Each variation is called as f(p, weight, xform, rng), p being a Point that
+# holds the output of the affine transform. Precalculated values are computed
+# on demand by Point, since most flames only use a few variations.
+
+class Point(object):
+    def __init__(self, x, y):
+        self.x, self.y = x, y
+        self._cache = {}
+
+    def _get(self, name, f):
+        try:
+            return self._cache[name]
+        except KeyError:
+            val = self._cache[name] = f()
+            return val
+
+    @property
+    def sumsq(self):
+        return self._get("sumsq", lambda: self.x**2 + self.y**2)
+
+    @property
+    def sqrt(self):
+        return self._get("sqrt", lambda: N.sqrt(self.sumsq))
+
+    @property
+    def sina(self):
+        return self._get("sina", lambda: self.x / self.sqrt)
+
+    @property
+    def cosa(self):
+        return self._get("cosa", lambda: self.y / self.sqrt)
+
+    @property
+    def atan(self):
+        return self._get("atan", lambda: N.arctan2(self.x, self.y))
+
+    @property
+    def atanyx(self):
+        return self._get("atanyx", lambda: N.arctan2(self.y, self.x))
+
+
+def linear(p, w, xf, rng):
+    return w * p.x, w * p.y
+
+def sinusoidal(p, w, xf, rng):
+    return w * N.sin(p.x), w * N.sin(p.y)
+
+def spherical(p, w, xf, rng):
+    r2 = w / (p.sumsq + EPS)
+    return r2 * p.x, r2 * p.y
+
+def swirl(p, w, xf, rng):
+    c1, c2 = N.sin(p.sumsq), N.cos(p.sumsq)
+    return w * (c1*p.x - c2*p.y), w * (c2*p.x + c1*p.y)
+
+def horseshoe(p, w, xf, rng):
+    r = w / (p.sqrt + EPS)
+    return (p.x - p.y) * (p.x + p.y) * r, 2.0 * p.x * p.y * r
+
+def polar(p, w, xf, rng):
+    return w * p.atan / N.pi, w * (p.sqrt - 1.0)
+
+def handkerchief(p, w, xf, rng):
+    a, r = p.atan, p.sqrt
+    return w * r * N.sin(a + r), w * r * N.cos(a - r)
+
+def heart(p, w, xf, rng):
+    a = p.sqrt * p.atan
+    r = w * p.sqrt
+    return r * N.sin(a), -r * N.cos(a)
+
+def disc(p, w, xf, rng):
+    a = p.atan / N.pi
+    r = N.pi * p.sqrt
+    return w * N.sin(r) * a, w * N.cos(r) * a
+
+def spiral(p, w, xf, rng):
+    r = p.sqrt + EPS
+    r1 = w / r
+    return r1 * (p.cosa + N.sin(r)), r1 * (p.sina - N.cos(r))
+
+def hyperbolic(p, w, xf, rng):
+    r = p.sqrt + EPS
+    return w * p.sina / r, w * p.cosa * r
+
+def diamond(p, w, xf, rng):
+    r = p.sqrt
+    return w * p.sina * N.cos(r), w * p.cosa * N.sin(r)
+
+def ex(p, w, xf, rng):
+    a, r = p.atan, p.sqrt
+    m0 = N.sin(a + r)**3 * r
+    m1 = N.cos(a - r)**3 * r
+    return w * (m0 + m1), w * (m0 - m1)
+
+def julia(p, w, xf, rng):
+    r = w * N.sqrt(p.sqrt)
+    a = 0.5 * p.atan + N.pi * rng.randint(0, 2, len(p.x))
+    return r * N.cos(a), r * N.sin(a)
+
+def bent(p, w, xf, rng):
+    nx = N.where(p.x < 0, p.x * 2.0, p.x)
+    ny = N.where(p.y < 0, p.y / 2.0, p.y)
+    return w * nx, w * ny
+
+def waves(p, w, xf, rng):
+    c10, c11, c20, c21 = xf.coefs[2], xf.coefs[3], xf.coefs[4], xf.coefs[5]
+    nx = p.x + c10 * N.sin(p.y / (c20*c20 + EPS))
+    ny = p.y + c11 * N.sin(p.x / (c21*c21 + EPS))
+    return w * nx, w * ny
+
+def fisheye(p, w, xf, rng):
+    r = 2 * w / (p.sqrt + 1)
+    return r * p.y, r * p.x
+
+def exponential(p, w, xf, rng):
+    dx = w * N.exp(p.x - 1.0)
+    dy = N.pi * p.y
+    return dx * N.cos(dy), dx * N.sin(dy)
+
+def power(p, w, xf, rng):
+    r = w * p.sqrt**p.sina
+    return r * p.cosa, r * p.sina
+
+def cosine(p, w, xf, rng):
+    a = p.x * N.pi
+    return w * N.cos(a) * N.cosh(p.y), -w * N.sin(a) * N.sinh(p.y)
+
+def rings(p, w, xf, rng):
+    dx = xf.coefs[4]**2 + EPS
+    r = p.sqrt
+    r = w * (N.fmod(r + dx, 2*dx) - dx + r * (1 - dx))
+    return r * p.cosa, r * p.sina
+
+def fan(p, w, xf, rng):
+    dx = N.pi * (xf.coefs[4]**2 + EPS)
+    dy = xf.coefs[5]
+    dx2 = 0.5 * dx
+    a = p.atan
+    a = a + N.where(N.fmod(a + dy, dx) > dx2, -dx2, dx2)
+    r = w * p.sqrt
+    return r * N.cos(a), r * N.sin(a)
+
+def blob(p, w, xf, rng):
+    low, high = xf.param("blob_low", 0.0), xf.param("blob_high", 1.0)
+    r = p.sqrt * (low + (high - low) * (0.5 + 0.5 * N.sin(
+                  xf.param("blob_waves", 1.0) * p.atan)))
+    return w * p.sina * r, w * p.cosa * r
+
+def pdj(p, w, xf, rng):
+    a, b, c, d = (xf.param("pdj_" + i, 0.0) for i in "abcd")
+    nx1, nx2 = N.cos(b * p.x), N.sin(c * p.x)
+    ny1, ny2 = N.sin(a * p.y), N.cos(d * p.y)
+    return w * (ny1 - nx1), w * (nx2 - ny2)
+
+def fan2(p, w, xf, rng):
+    dy = xf.param("fan2_y", 0.0)
+    dx = N.pi * (xf.param("fan2_x", 0.0)**2 + EPS)
+    dx2 = 0.5 * dx
+    a = p.atan
+    t = a + dy - dx * N.trunc((a + dy) / dx)
+    a = a + N.where(t > dx2, -dx2, dx2)
+    r = w * p.sqrt
+    return r * N.sin(a), r * N.cos(a)
+
+def rings2(p, w, xf, rng):
+    r = p.sqrt
+    dx = xf.param("rings2_val", 0.0)**2 + EPS
+    r = r - 2.0 * dx * N.trunc((r + dx) / (2.0 * dx)) + r * (1.0 - dx)
+    return w * p.sina * r, w * p.cosa * r
+
+def eyefish(p, w, xf, rng):
+    r = 2.0 * w / (p.sqrt + 1.0)
+    return r * p.x, r * p.y
+
+def bubble(p, w, xf, rng):
+    r = w / (0.25 * p.sumsq + 1)
+    return r * p.x, r * p.y
+
+def cylinder(p, w, xf, rng):
+    return w * N.sin(p.x), w * p.y
+
+def perspective(p, w, xf, rng):
+    ang = xf.param("perspective_angle", 0.0) * N.pi / 2.0
+    dist = xf.param("perspective_dist", 0.0)
+    t = 1.0 / (dist - p.y * N.sin(ang))
+    return w * dist * p.x * t, w * dist * N.cos(ang) * p.y * t
+
+def noise(p, w, xf, rng):
+    tmpr = rng.random_sample(len(p.x)) * 2 * N.pi
+    r = w * rng.random_sample(len(p.x))
+    return p.x * r * N.cos(tmpr), p.y * r * N.sin(tmpr)
+
+def julian(p, w, xf, rng):
+    pw = xf.param("julian_power", 1.0)
+    cn = xf.param("julian_dist", 1.0) / pw / 2.0
+    t_rnd = N.trunc(abs(pw) * rng.random_sample(len(p.x)))
+    tmpr = (p.atanyx + 2 * N.pi * t_rnd) / pw
+    r = w * p.sumsq**cn
+    return r * N.cos(tmpr), r * N.sin(tmpr)
+
+def juliascope(p, w, xf, rng):
+    pw = xf.param("juliascope_power", 1.0)
+    cn = xf.param("juliascope_dist", 1.0) / pw / 2.0
+    t_rnd = N.trunc(abs(pw) * rng.random_sample(len(p.x)))
+    sign = N.where(t_rnd % 2, -1.0, 1.0)
+    tmpr = (2 * N.pi * t_rnd + sign * p.atanyx) / pw
+    r = w * p.sumsq**cn
+    return r * N.cos(tmpr), r * N.sin(tmpr)
+
+def blur(p, w, xf, rng):
+    tmpr = rng.random_sample(len(p.x)) * 2 * N.pi
+    r = w * rng.random_sample(len(p.x))
+    return r * N.cos(tmpr), r * N.sin(tmpr)
+
+def gaussian_blur(p, w, xf, rng):
+    ang = rng.random_sample(len(p.x)) * 2 * N.pi
+    r = w * (rng.random_sample((4, len(p.x))).sum(axis=0) - 2.0)
+    return r * N.cos(ang), r * N.sin(ang)
+
+def curl(p, w, xf, rng):
+    c1, c2 = xf.param("curl_c1", 0.0), xf.param("curl_c2", 0.0)
+    re = 1.0 + c1 * p.x + c2 * (p.x**2 - p.y**2)
+    im = c1 * p.y + 2.0 * c2 * p.x * p.y
+    r = w / (re**2 + im**2)
+    return (p.x * re + p.y * im) * r, (p.y * re - p.x * im) * r
+
+def rectangles(p, w, xf, rng):
+    rx, ry = xf.param("rectangles_x", 1.0), xf.param("rectangles_y", 1.0)
+    nx = p.x if rx == 0 else (2 * N.floor(p.x / rx) + 1) * rx - p.x
+    ny = p.y if ry == 0 else (2 * N.floor(p.y / ry) + 1) * ry - p.y
+    return w * nx, w * ny
+
+def tangent(p, w, xf, rng):
+    return w * N.sin(p.x) / N.cos(p.y), w * N.tan(p.y)
+
+def square(p, w, xf, rng):
+    n = len(p.x)
+    return (w * (rng.random_sample(n) - 0.5),
+            w * (rng.random_sample(n) - 0.5))
+
+
+supported = dict((f.__name__, f) for f in (
+    linear, sinusoidal, spherical, swirl, horseshoe, polar, handkerchief,
+    heart, disc, spiral, hyperbolic, diamond, ex, julia, bent, waves,
+    fisheye, exponential, power, cosine, rings, fan, blob, pdj, fan2, rings2,
+    eyefish, bubble, cylinder, perspective, noise, julian, juliascope, blur,
+    gaussian_blur, curl, rectangles, tangent, square))
+
+
+
+class CompiledXform(object):
+    """Snapshot of the parameters of an xform needed by the chaos game."""
+    def __init__(self, xform):
+        self.coefs = tuple(xform.screen_coefs)
+        post = xform.post
+        self.post = tuple(post.screen_coefs) if post.isactive() else None
+        self.color = xform.color
+        self.color_speed = xform.color_speed
+        self.opacity = xform.opacity
+        self.weight = xform.weight
+        self._xform = xform
+
+        names = xform.list_variations()
+        missing = [i for i in names if i not in supported]
+        if missing:
+            # This renderer stands in for flam3 when it's missing, so an
+            # approximate image beats none at all.
+            warnings.warn("Variation(s) not supported by the numpy renderer, "
+                          "rendered as linear: %s" % ", ".join(missing),
+                          RuntimeWarning)
+        self.variations = [(supported.get(i, linear), getattr(xform, i))
+                           for i in names if getattr(xform, i)]
+
+
+    def param(self, name, default):
+        return getattr(self._xform, name, default)
+
+
+    def apply(self, x, y, rng):
+        c = self.coefs
+        p = Point(c[0]*x + c[2]*y + c[4], c[1]*x + c[3]*y + c[5])
+        nx, ny = N.zeros_like(x), N.zeros_like(y)
+        for f, w in self.variations:
+            dx, dy = f(p, w, self, rng)
+            nx += dx
+            ny += dy
+        if self.post is not None:
+            c = self.post
+            nx, ny = c[0]*nx + c[2]*ny + c[4], c[1]*nx + c[3]*ny + c[5]
+        return nx, ny
+
+
+    def apply_color(self, color):
+        s = self.color_speed
+        return s * self.color + (1.0 - s) * color
+
+
+
+class ChaosGame(object):
+    """A chaos game in progress: the batch of points being iterated and the
+    accumulation buffer they are plotted into. Each call to run() keeps
+    adding samples to the same buffer, so an image can be refined without
+    starting over."""
+
+    def __init__(self, flame, size, rng, oversample=1, batch=BATCH_SIZE):
+        self.size = size
+        self.oversample = oversample
+        self.rng = rng
+        self.samples = 0
+        w, h = self.w, self.h = size[0] * oversample, size[1] * oversample
+        self.xforms = [CompiledXform(xf) for xf in flame.xform]
+        self.final = CompiledXform(flame.final) if flame.final else None
+        if not self.xforms:
+            raise ValueError("Flame has no xforms")
+
+        # Probability of jumping from xform i to xform j: weight_j * chaos_ij.
+        weights = N.array([xf.weight for xf in self.xforms], dtype=N.float64)
+        chaos = N.array([list(xf.chaos) for xf in flame.xform],
+                        dtype=N.float64)
+        cumulative = N.cumsum(chaos * weights, axis=1)
+        totals = cumulative[:, -1:]
+        totals[totals == 0] = 1.0
+        cumulative /= totals
+        self.cumulative = cumulative
+
+        # Camera: same transformation as flam3, relative to the output size.
+        self.ppu = flame.scale * w / 100.
+        self.angle = N.radians(flame.rotate)
+        self.cx, self.cy = flame.center
+        self.corner = (self.cx - w / self.ppu / 2.,
+                       self.cy - h / self.ppu / 2.)
+
+        palette = self.palette = N.empty((256, 4), dtype=N.float64)
+        palette[:, :3] = flame.gradient.data * (WHITE_LEVEL / 255.)
+        palette[:, 3] = WHITE_LEVEL
+        self.opacities = N.array(
+            [xf.opacity for xf in self.xforms] +
+            [self.final.opacity if self.final else 1.0])
+
+        self.accum = N.zeros((h * w, 4), dtype=N.float64)
+        self.batch = batch
+        self.x = rng.uniform(-1, 1, batch)
+        self.y = rng.uniform(-1, 1, batch)
+        self.color = rng.random_sample(batch)
+        self.last = rng.randint(0, len(self.xforms), batch)
+        self.fused = False
+
+    @property
+    def quality(self):
+        """Samples plotted so far per output pixel."""
+        return self.samples / float(self.size[0] * self.size[1])
+
+    def run(self, nsamples, progress=None):
+        """Iterates about nsamples more points (rounded to whole batches)
+        into the buffer. The first call also runs the fuse. Returns False
+        if progress asked to stop early."""
+        xforms, final, rng = self.xforms, self.final, self.rng
+        x, y, color, last = self.x, self.y, self.color, self.last
+        w, h, ppu, angle = self.w, self.h, self.ppu, self.angle
+        cx, cy = self.cx, self.cy
+        corner_x, corner_y = self.corner
+        cosr, sinr = N.cos(angle), N.sin(angle)
+        cumulative, opacities = self.cumulative, self.opacities
+        palette, accum, batch = self.palette, self.accum, self.batch
+
+        nsteps = max(1, int(round(nsamples / float(batch))))
+        start = time.time()
+
+        for step in xrange(0 if self.fused else -FUSE, nsteps):
+            u = rng.random_sample(batch)
+            index = (u[:, None] > cumulative[last]).sum(axis=1)
+            index = N.minimum(index, len(xforms) - 1)
+            for i, xf in enumerate(xforms):
+                mask = index == i
+                if not mask.any():
+                    continue
+                x[mask], y[mask] = xf.apply(x[mask], y[mask], rng)
+                color[mask] = xf.apply_color(color[mask])
+
+            # Points that blow up are restarted, as flam3 does with badvals.
+            bad = (~(N.isfinite(x) & N.isfinite(y)) | (abs(x) > 1e10) |
+                   (abs(y) > 1e10))
+            if bad.any():
+                nbad = bad.sum()
+                x[bad] = rng.uniform(-1, 1, nbad)
+                y[bad] = rng.uniform(-1, 1, nbad)
+            last = self.last = index
+
+            if step < 0:
+                continue
+            self.fused = True
+
+            px, py, pcolor = x, y, color
+            opacity = opacities[index]
+            if final is not None:
+                px, py = final.apply(x, y, rng)
+                pcolor = final.apply_color(color)
+                opacity = opacity * opacities[-1]
+            if angle:
+                dx, dy = px - cx, py - cy
+                px, py = cosr*dx - sinr*dy + cx, sinr*dx + cosr*dy + cy
+
+            ix = N.floor((px - corner_x) * ppu)
+            iy = N.floor((py - corner_y) * ppu)
+            visible = ((ix >= 0) & (ix < w) & (iy >= 0) & (iy < h) &
+                       (opacity > 0) & N.isfinite(pcolor))
+            pixel = (iy[visible] * w + ix[visible]).astype(N.intp)
+            cindex = N.clip((pcolor[visible] * 256).astype(N.intp), 0, 255)
+            op = opacity[visible]
+            for channel in range(4):
+                accum[:, channel] += N.bincount(
+                    pixel, weights=palette[cindex, channel] * op,
+                    minlength=h * w)
+            self.samples += batch
+
+            if progress is not None:
+                done = 100.0 * (step + 1) / nsteps
+                elapsed = time.time() - start
+                eta = elapsed * (100 - done) / done if done else 0
+                if progress(None, done, 0, eta):
+                    return False
+        return True
+
+    def image(self, flame, quality=None, transparent=0, **de):
+        """Tonemaps the buffer as it is now. quality defaults to the one
+        reached so far, which keeps the brightness stable while refining.
+        de holds the density estimation settings taken by tonemap."""
+        if quality is None:
+            quality = self.quality or 1
+        return tonemap(flame, self.accum.reshape(self.h, self.w, 4),
+                       self.size, quality, self.oversample, transparent, **de)
+
+
+def iterate(flame, size, nsamples, rng, oversample=1, progress=None):
+    """Runs the chaos game and returns the (h, w, 4) accumulation buffer,
+    holding the summed rgb of the plotted points plus their density."""
+    game = ChaosGame(flame, size, rng, oversample,
+                     batch=min(BATCH_SIZE, max(1, nsamples)))
+    game.run(nsamples, progress)
+    return game.accum.reshape(game.h, game.w, 4)
+
+
+def tonemap(flame, accum, size, quality, oversample=1, transparent=0,
+            estimator=0, estimator_curve=.4, estimator_minimum=0):
+    """Log-density scaling, density estimation, gamma and background,
+    modelled on flam3's rect.c. estimator is the maximum kernel radius in
+    output pixels, 0 turns density estimation off. Returns an
+    (h, w, 3 + transparent) uint8 array."""
+    w, h = size
+    ppu = flame.scale * w / 100.
+    area = w * h / (ppu * ppu)
+    k1 = flame.brightness * PREFILTER_WHITE * 268.0 / 256
+    k2 = oversample**2 / (area * WHITE_LEVEL * quality)
+
+    density = accum[..., 3]
+    with N.errstate(divide='ignore', invalid='ignore'):
+        ls = N.where(density > 0, k1 * N.log1p(density * k2) / density, 0)
+    accum = accum * ls[..., None]
+    if estimator > 0:
+        accum = density_estimate(accum, density / WHITE_LEVEL,
+                                 estimator * oversample,
+                                 estimator_minimum * oversample,
+                                 estimator_curve)
+
+    if oversample > 1:
+        accum = accum.reshape(h, oversample, w, oversample, 4).mean(axis=(1, 3))
+
+    g = 1.0 / flame.gamma
+    vib = flame.vibrancy
+    thresh = flame.gamma_threshold
+    tmp = accum[..., 3] / PREFILTER_WHITE
+    with N.errstate(divide='ignore', invalid='ignore'):
+        alpha = tmp**g
+        if thresh > 0:
+            frac = tmp / thresh
+            lin = (1 - frac) * tmp * thresh**g / thresh + frac * tmp**g
+            alpha = N.where(tmp < thresh, lin, alpha)
+        ls = N.where(tmp > 0, vib * 256.0 * alpha / tmp, 0)
+    alpha = N.clip(alpha, 0, 1)
+
+    rgb = ls[..., None] * accum[..., :3] / PREFILTER_WHITE
+    if vib < 1:
+        rgb += (1 - vib) * 256.0 * (accum[..., :3] / PREFILTER_WHITE)**g
+    if not transparent:
+        background = N.array(flame.background[:3], dtype=N.float64) * 255.
+        rgb += (1.0 - alpha[..., None]) * background
+    rgb = N.nan_to_num(rgb)
+
+    out = N.empty((h, w, 3 + bool(transparent)), dtype=N.uint8)
+    out[..., :3] = N.clip(rgb, 0, 255)
+    if transparent:
+        out[..., 3] = alpha * 255
+    return out
+
+
+def density_estimate(accum, hits, max_radius, min_radius=0, curve=.4):
+    """Spreads each bucket of the (log scaled) accumulation buffer over a
+    kernel whose radius shrinks with the number of hits the bucket got,
+    max_radius / hits**curve but at least min_radius. Sparse areas are
+    smoothed, dense ones stay sharp. The kernel is flam3's,
+    exp(-2 (d / radius)**2) up to the radius.
+
+    Radii are rounded to a few levels DE_LEVEL_STEP apart, and each level is
+    done in one separable blur. Above DE_EXACT_RADIUS the kernel is
+    approximated by three box blurs, which cost the same at any radius."""
+    radius = N.maximum(max_radius / N.maximum(hits, 1)**curve, min_radius)
+    spread = (hits > 0) & (radius >= 1)
+    if not spread.any():
+        return accum
+    level = N.zeros(radius.shape, dtype=N.intp)
+    level[spread] = N.round(N.log(radius[spread] / max_radius) /
+                            N.log(DE_LEVEL_STEP))
+
+    out = N.where(spread[..., None], 0, accum)
+    h, w = hits.shape
+    for n in N.unique(level[spread]):
+        mask = spread & (level == n)
+        r = max_radius * DE_LEVEL_STEP**n
+        reach = int(N.ceil(r))
+        # Only blur the region the kernels of this level can reach.
+        ys, xs = N.nonzero(mask)
+        y0, y1 = max(ys.min() - reach, 0), min(ys.max() + reach + 1, h)
+        x0, x1 = max(xs.min() - reach, 0), min(xs.max() + reach + 1, w)
+        layer = N.where(mask[y0:y1, x0:x1, None], accum[y0:y1, x0:x1], 0)
+        if r <= DE_EXACT_RADIUS:
+            d = N.arange(-reach, reach + 1) / float(r)
+            kernel = N.exp(-2 * d * d)
+            kernel /= kernel.sum()
+            blur = lambda image, axis: _blur(image, kernel, axis)
+        else:
+            # The kernel's standard deviation is r/2. Three boxes of width
+            # 2b+1 add up to a variance of ((2b+1)**2 - 1) / 4.
+            b = int(round((N.sqrt(r * r + 1) - 1) / 2))
+            blur = lambda image, axis: _box_blur(
+                _box_blur(_box_blur(image, b, axis), b, axis), b, axis)
+        out[y0:y1, x0:x1] += blur(blur(layer, 0), 1)
+    return out
+
+
+def _blur(image, kernel, axis):
+    """Convolves image with kernel along axis, treating the outside as 0."""
+    r = len(kernel) // 2
+    n = image.shape[axis]
+    shape = list(image.shape)
+    shape[axis] += 2 * r
+    padded = N.zeros(shape)
+    index = [slice(None)] * image.ndim
+    index[axis] = slice(r, r + n)
+    padded[tuple(index)] = image
+    out = N.zeros(image.shape)
+    tmp = N.empty(image.shape)
+    for i, k in enumerate(kernel):
+        index[axis] = slice(i, i + n)
+        out += N.multiply(padded[tuple(index)], k, tmp)
+    return out
+
+
+def _box_blur(image, b, axis):
+    """Mean of the 2b+1 values around each one along axis, treating the
+    outside as 0."""
+    n = image.shape[axis]
+    shape = list(image.shape)
+    shape[axis] += 2 * b + 1
+    padded = N.zeros(shape)
+    index = [slice(None)] * image.ndim
+    index[axis] = slice(b + 1, b + 1 + n)
+    padded[tuple(index)] = image
+    total = N.cumsum(padded, axis=axis)
+    index[axis] = slice(2 * b + 1, 2 * b + 1 + n)
+    out = total[tuple(index)]
+    index[axis] = slice(0, n)
+    out -= total[tuple(index)]
+    return out / (2 * b + 1.)
+
+
+def render(flame, size, quality, transparent=0, spatial_oversample=1,
+           progress_func=None, fixed_seed=False, seed=None, estimator=0,
+           estimator_curve=.4, estimator_minimum=0, **kwds):
+    """Renders the flame and returns a ctypes buffer with the same layout as
+    the one returned by flam3. With fixed_seed (or an explicit seed), output
+    is identical between runs."""
+    if not all(size):
+        raise ZeroDivisionError("Size passed to render function is 0.")
+    if seed is None and fixed_seed:
+        seed = 0
+    rng = N.random.RandomState(seed)
+    oversample = max(1, int(spatial_oversample))
+
+    nsamples = int(quality * size[0] * size[1])
+    # Diverging points are expected, they get reset inside the loop.
+    with N.errstate(all='ignore'):
+        accum = iterate(flame, size, nsamples, rng, oversample,
+                        pausing(progress_func))
+    image = tonemap(flame, accum, size, quality, oversample, transparent,
+                    estimator, estimator_curve, estimator_minimum)
+    return to_buffer(image)
+
+
+def pausing(progress_func):
+    """Wraps a progress function so a return value of 2 pauses the render,
+    same as in flam3. Returns None if progress_func isn't callable."""
+    if not callable(progress_func):
+        return None
+    def progress(*args):
+        flag = progress_func(*args)
+        while flag == 2:
+            time.sleep(.1)
+            flag = progress_func(*args)
+        return flag
+    return progress
+
+
+def to_buffer(image):
+    """Copies an image array into a ctypes buffer, the format returned by
+    all render functions."""
+    output_buffer = (c_ubyte * image.size)()
+    N.frombuffer(output_buffer, dtype=N.uint8)[:] = image.ravel()
+    return output_buffer
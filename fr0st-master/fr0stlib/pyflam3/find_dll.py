@@ -31,3 +31,20 @@ def find_dll(name, omit_lib_in_windows=False, windows_uses_stdcall=False):
             print >>sys.stderr, 'ERROR: Unable to load "%s" from "%s"' % (name, dll_dir)
             raise
 
+
+class MissingDll(object):
+    """Stands in for a library that failed to load. Functions can still be
+    declared (argtypes, restype), but calling any of them raises the error
+    that was caught while loading."""
+    def __init__(self, name, error):
+        self._name = name
+        self._error = error
+
+    def __getattr__(self, attr):
+        if attr.startswith('__'):
+            raise AttributeError(attr)
+        def missing(*args):
+            raise OSError('%s is not available (%s), %s() can\'t be called'
+                          % (self._name, self._error, attr))
+        missing.__name__ = attr
+        return missing
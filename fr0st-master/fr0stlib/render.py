@@ -19,20 +19,21 @@
 #  the Free Software Foundation, Inc., 59 Temple Place - Suite 330,
 #  Boston, MA 02111-1307, USA.
 ##############################################################################
-import wx, os
+import os, zlib, struct
 import xml.etree.cElementTree as etree
 
 import fr0stlib
 from fr0stlib import Flame
-from fr0stlib.pyflam3 import Genome
-
-
-types = {".bmp": wx.BITMAP_TYPE_BMP,
-         ".png": wx.BITMAP_TYPE_PNG,
-         ".jpg": wx.BITMAP_TYPE_JPEG}
+from fr0stlib.pyflam3 import Genome, Frame, RenderSession, libflam3, \
+     MissingDll
 
 
 def save_image(path, img, jpg_quality=95):
+    # wx is imported here so rendering doesn't depend on it (see save_buffer).
+    import wx
+    types = {".bmp": wx.BITMAP_TYPE_BMP,
+             ".png": wx.BITMAP_TYPE_PNG,
+             ".jpg": wx.BITMAP_TYPE_JPEG}
     if isinstance(img, wx.Bitmap):
         img = wx.ImageFromBitmap(img)
     ty = types[os.path.splitext(path)[1]]
@@ -44,12 +45,69 @@ def save_image(path, img, jpg_quality=95):
     img.SaveFile(path, ty)
 
 
+def encode_png(output_buffer, (w,h), channels=3):
+    """Encodes a raw 8 bit RGB or RGBA buffer as returned by the render
+    functions into a png file string. Only needs zlib."""
+    if channels not in (3, 4):
+        raise ValueError("need 3 or 4 channels, not %s" % channels)
+    data = buffer(output_buffer)
+    stride = w * channels
+    if len(data) < stride * h:
+        raise ValueError("Buffer too small for a %sx%s image." %(w,h))
+    # Each scanline is prefixed with filter type 0 (None).
+    raw = "".join("\0" + data[i:i+stride] for i in xrange(0, stride*h, stride))
+    def chunk(tag, payload):
+        return (struct.pack("!I", len(payload)) + tag + payload
+                + struct.pack("!I", zlib.crc32(tag + payload) & 0xffffffff))
+    header = struct.pack("!2I5B", w, h, 8, 2 if channels == 3 else 6, 0, 0, 0)
+    return "".join(("\x89PNG\r\n\x1a\n",
+                    chunk("IHDR", header),
+                    chunk("IDAT", zlib.compress(raw, 6)),
+                    chunk("IEND", "")))
+
+
+def save_buffer(path, output_buffer, size, channels=3, jpg_quality=95):
+    """Saves a raw render buffer without going through wx. Png is written
+    directly, jpg and bmp need PIL to be installed.
+
+    The file is written under a temporary name and renamed when complete, so
+    a crashed render never leaves a truncated image behind."""
+    ext = os.path.splitext(path)[1].lower()
+    dirname = os.path.abspath(os.path.dirname(path))
+    if not os.path.exists(dirname):
+        os.makedirs(dirname)
+    tmp = path + ".part"
+    if ext == ".png":
+        with open(tmp, "wb") as f:
+            f.write(encode_png(output_buffer, size, channels))
+    elif ext in (".jpg", ".jpeg", ".bmp"):
+        try:
+            from PIL import Image
+        except ImportError:
+            raise ImportError("Saving %s files without wx requires PIL." %ext)
+        mode = "RGB" if channels == 3 else "RGBA"
+        img = Image.frombuffer(mode, size, buffer(output_buffer),
+                               "raw", mode, 0, 1)
+        if ext == ".bmp":
+            img.save(tmp, "BMP")
+        else:
+            img.convert("RGB").save(tmp, "JPEG", quality=jpg_quality)
+    else:
+        raise ValueError("Unsupported image type: %s" %ext)
+    if os.path.exists(path):
+        # os.rename doesn't overwrite on windows.
+        os.remove(path)
+    os.rename(tmp, path)
+
+
 def needs_conversion(string):
     root = etree.fromstring(string)
     return root.get('version', None) != fr0stlib.VERSION
 
 
 def to_string(flame):
+    if isinstance(flame, Genome):
+        return flame.to_string()
     if isinstance(flame, basestring):
         if needs_conversion(flame):
             return Flame(flame).to_string()
@@ -58,8 +116,12 @@ def to_string(flame):
 
 
 def flam3_render(flame, size, quality, transparent=0, **kwds):
-    """Passes render requests on to flam3."""
-    frame = Genome.load(to_string(flame), **kwds)
+    """Passes render requests on to flam3. Genomes are rendered directly,
+    anything else is converted to string first."""
+    if isinstance(flame, Genome):
+        frame = Frame.from_genome(flame, **kwds)
+    else:
+        frame = Genome.load(to_string(flame), **kwds)
     output_buffer, stats = frame.render(size, quality, transparent)
     return output_buffer
     
@@ -67,11 +129,92 @@ def flam3_render(flame, size, quality, transparent=0, **kwds):
 def flam4_render(flame, size, quality, **kwds):
     """Passes requests on to flam4. Works on windows only for now."""
     from fr0stlib.pyflam3 import _flam4
-    flame = flame if type(flame) is Flame else Flame(flame)
+    flame = flame if type(flame) is Flame else Flame(to_string(flame))
     flam4Flame = _flam4.loadFlam4(flame)
     output_buffer = _flam4.renderFlam4(flam4Flame, size, quality, **kwds)
     return output_buffer
 
 
+def numpy_render(flame, size, quality, transparent=0, **kwds):
+    """Renders with the pure numpy chaos game. Much slower than flam3, but
+    works anywhere numpy does and gives reproducible output when a seed is
+    given (or fixed_seed is set)."""
+    from fr0stlib.pyflam3 import _numpy
+    flame = flame if type(flame) is Flame else Flame(to_string(flame))
+    return _numpy.render(flame, size, quality, transparent, **kwds)
+
+
+def numpy_progressive(flame, size, quality, transparent=0, session=None,
+                      spatial_oversample=1, fixed_seed=False, seed=None,
+                      start_quality=1, growth=2, progress_func=None,
+                      estimator=0, estimator_curve=.4, estimator_minimum=0,
+                      **kwds):
+    """Yields (output_buffer, quality) for ever finer renders of the flame,
+    ending at the requested quality. All passes accumulate into the same
+    histogram, so the total cost is that of a single render. If a
+    RenderSession is given and it already holds samples of the same flame,
+    rendering continues from there."""
+    if session is None:
+        if seed is None and fixed_seed:
+            seed = 0
+        session = RenderSession(seed)
+    session.set_flame(flame, size, transparent, spatial_oversample,
+                      estimator, estimator_curve, estimator_minimum)
+    return session.passes(quality, start_quality, growth, progress_func)
+
+
+def flam3_progressive(flame, size, quality, transparent=0, start_quality=1,
+                      progress_func=None, **kwds):
+    """Same interface as numpy_progressive. flam3 doesn't expose its
+    histogram, so there are only two passes: a coarse render at
+    start_quality, then one at full quality. The coarse one adds about
+    start_quality/quality to the cost of a single render."""
+    kwds.pop("growth", None)
+    kwds.pop("session", None)
+    if not isinstance(flame, Genome):
+        flame = to_string(flame)
+    if start_quality < quality:
+        coarse = dict(kwds)
+        if callable(progress_func):
+            def scaled(py_object, fraction, stage, eta):
+                return progress_func(py_object,
+                                     fraction * start_quality / quality,
+                                     stage, eta)
+            coarse["progress_func"] = scaled
+        yield (flam3_render(flame, size, start_quality, transparent,
+                            **coarse), start_quality)
+    yield (flam3_render(flame, size, quality, transparent,
+                        progress_func=progress_func, **kwds), quality)
+
+
 render_funcs = {'flam3': flam3_render,
-                'flam4': flam4_render}
+                'flam4': flam4_render,
+                'numpy': numpy_render}
+
+# Renderers that can refine an image in several passes. The others can be
+# used through render_progressive, which just yields a single pass.
+progressive_funcs = {'flam3': flam3_progressive,
+                     'numpy': numpy_progressive}
+
+
+def render_progressive(renderer, flame, size, quality, **kwds):
+    """Yields (output_buffer, quality) for increasingly refined images of
+    the flame with the given renderer. The last one is at full quality."""
+    if renderer in progressive_funcs:
+        return progressive_funcs[renderer](flame, size, quality, **kwds)
+    kwds.pop("start_quality", None)
+    kwds.pop("growth", None)
+    return iter([(render_funcs[renderer](flame, size, quality, **kwds),
+                  quality)])
+
+def resolve_renderer(renderer):
+    """Returns the renderer to actually use for a configured one: flam3
+    falls back to numpy when libflam3 couldn't be loaded. The setting itself
+    is left alone, so flam3 is used again once it loads."""
+    if renderer == 'flam3' and isinstance(libflam3, MissingDll):
+        return 'numpy'
+    return renderer
+
+
+# Renderer used for thumbnails and small previews.
+preview_renderer = resolve_renderer('flam3')
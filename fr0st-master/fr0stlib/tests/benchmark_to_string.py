@@ -0,0 +1,95 @@
+##############################################################################
+#  Fractal Fr0st - fr0st
+#  https://launchpad.net/fr0st
+#
+#  Copyright (C) 2009 by Vitor Bosshard <algorias@gmail.com>
+#
+#  Fractal Fr0st is free software; you can redistribute
+#  it and/or modify it under the terms of the GNU General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Library General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this library; see the file COPYING.LIB.  If not, write to
+#  the Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+#  Boston, MA 02111-1307, USA.
+##############################################################################
+"""Times Flame.to_string against the previous implementation.
+
+Usage (from the fr0st directory):
+    PYTHONPATH=. python fr0stlib/tests/benchmark_to_string.py [file.flame]
+"""
+import os, sys, timeit
+
+import fr0stlib
+from fr0stlib import load_flames
+
+SAMPLES = os.path.join(os.path.dirname(fr0stlib.__file__), "..", "fr0st",
+                       "parameters", "samples.flame")
+
+
+def legacy_palette_to_string(palette):
+    return ''.join(['   <color index="%s" rgb="%s %s %s"/>\n' %
+                    (idx,
+                     int(palette.data[idx, 0]),
+                     int(palette.data[idx, 1]),
+                     int(palette.data[idx, 2])) for idx in xrange(256)])
+
+
+def legacy_xform_to_string(xform):
+    lst = ['   <%sxform '%("final" if xform.isfinal() else "")]
+    lst.extend('%s="%s" ' %i for i in xform._iter_attributes())
+    lst.append('coefs="%s %s %s %s %s %s" ' % tuple(xform.screen_coefs))
+    post = xform.post
+    if post.coefs != (1,0,0,1,0,0):
+        lst.append('post="%s %s %s %s %s %s" ' % tuple(post.screen_coefs))
+    lst.append(xform.chaos.to_string())
+    lst.append('/>\n')
+    return "".join(lst)
+
+
+def legacy_to_string(flame):
+    """Flame.to_string as it was before the palette string cache."""
+    lst =  ['<flame ']
+    for name,val in flame._iter_attributes():
+        if isinstance(val, basestring):
+            pass
+        elif hasattr(val, "__iter__"):
+            val = " ".join(str(i if i%1 else int(i)) for i in val)
+        else:
+            val = val if val%1 else int(val)
+        lst.append('%s="%s" ' %(name, val))
+    lst.append('>\n')
+    lst.extend(legacy_xform_to_string(xform) for xform in flame.iter_xforms())
+    lst.append(legacy_palette_to_string(flame.gradient))
+    lst.append('</flame>')
+    return "".join(lst)
+
+
+def uncached_to_string(flame):
+    """to_string when the palette changed since the last call."""
+    flame.gradient._string_cache = None
+    return flame.to_string()
+
+
+def benchmark(path=SAMPLES, number=500):
+    flames = load_flames(path)
+    funcs = [("legacy", legacy_to_string),
+             ("to_string", lambda f: f.to_string()),
+             ("uncached", uncached_to_string),
+             ("hex palette", lambda f: f.to_string(hex_palette=True))]
+    for flame in flames:
+        assert flame.to_string() == legacy_to_string(flame), flame.name
+    for name, func in funcs:
+        t = min(timeit.repeat(lambda: map(func, flames), number=number,
+                              repeat=3))
+        print "%-12s %.3f ms per flame" %(name, t / number / len(flames) * 1e3)
+
+
+if __name__ == "__main__":
+    benchmark(*sys.argv[1:])
@@ -0,0 +1,73 @@
+##############################################################################
+#  Fractal Fr0st - fr0st
+#  https://launchpad.net/fr0st
+#
+#  Copyright (C) 2009 by Vitor Bosshard <algorias@gmail.com>
+#
+#  Fractal Fr0st is free software; you can redistribute
+#  it and/or modify it under the terms of the GNU General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Library General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this library; see the file COPYING.LIB.  If not, write to
+#  the Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+#  Boston, MA 02111-1307, USA.
+##############################################################################
+"""Times the per-frame xform animation done by the MMEngine and scripts like
+sheep_live_preview: rotate, move and scale every xform of a flame, one
+at a time and with Flame.transform_xforms.
+
+Usage (from the fr0st directory):
+    PYTHONPATH=. python fr0stlib/tests/benchmark_xforms.py [file.flame]
+"""
+import os, sys, timeit
+
+import fr0stlib
+from fr0stlib import load_flames
+
+SAMPLES = os.path.join(os.path.dirname(fr0stlib.__file__), "..", "fr0st",
+                       "parameters", "samples.flame")
+
+
+def animate_frame(flame):
+    """What MMEngine.animate does to one xform, done to all of them."""
+    for xform in flame.xform:
+        xform.rotate(0.5)
+        xform.move(0.001)
+        xform.scale(1.0001)
+
+
+def animate_batch(flame):
+    """animate_frame done with Flame.transform_xforms. move is left out, it
+    changes the distance of the origin rather than offsetting it."""
+    flame.transform_xforms(rotate=0.5, scale=1.0001)
+
+
+def read_frame(flame):
+    """Attribute reads typical of building a frame: coefs, post and
+    variation weights of every xform."""
+    for xform in flame.iter_xforms():
+        xform.coefs
+        xform.post.isactive()
+        [getattr(xform, name) for name in xform.list_variations()]
+
+
+def benchmark(path=SAMPLES, number=200):
+    flames = load_flames(path)
+    nxforms = sum(len(f.xform) for f in flames)
+    for name, func in [("animate", animate_frame), ("batch", animate_batch),
+                       ("read", read_frame),
+                       ("to_string", lambda f: f.to_string())]:
+        t = min(timeit.repeat(lambda: map(func, flames), number=number,
+                              repeat=3))
+        print "%-10s %.2f us per xform" %(name, t / number / nxforms * 1e6)
+
+
+if __name__ == "__main__":
+    benchmark(*sys.argv[1:])
@@ -0,0 +1,59 @@
+##############################################################################
+#  Fractal Fr0st - fr0st
+#  https://launchpad.net/fr0st
+#
+#  Copyright (C) 2009 by Vitor Bosshard <algorias@gmail.com>
+#
+#  Fractal Fr0st is free software; you can redistribute
+#  it and/or modify it under the terms of the GNU General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Library General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this library; see the file COPYING.LIB.  If not, write to
+#  the Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+#  Boston, MA 02111-1307, USA.
+##############################################################################
+"""Flames and setup shared by the tests."""
+from unittest import TestCase
+import shutil, tempfile
+
+from fr0stlib import Flame
+
+
+def sierpinski():
+    """Sierpinski triangle with a white palette, covering the center of the
+    image and leaving the corners empty."""
+    flame = Flame()
+    flame.add_xform(coefs=(.5, 0, 0, .5, -.5, -.5), color=0)
+    flame.add_xform(coefs=(.5, 0, 0, .5, .5, -.5), color=.5)
+    flame.add_xform(coefs=(.5, 0, 0, .5, 0, .5), color=1)
+    flame.gradient.data[:] = 255
+    flame.scale = 50
+    return flame
+
+
+def numbered_flames(n, name="flame%s"):
+    """n single xform flames, each one shifted a bit from the previous and
+    named after its index."""
+    flames = []
+    for i in range(n):
+        flame = Flame()
+        flame.add_xform(coefs=(.5, 0, 0, .5, i * .1, 0))
+        flame.name = name % i
+        flames.append(flame)
+    return flames
+
+
+class TempDirTestCase(TestCase):
+    """Gives each test an empty directory in self.dir, removed afterwards."""
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
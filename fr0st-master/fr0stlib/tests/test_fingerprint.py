@@ -0,0 +1,55 @@
+##############################################################################
+#  Fractal Fr0st - fr0st
+#  https://launchpad.net/fr0st
+#
+#  Copyright (C) 2009 by Vitor Bosshard <algorias@gmail.com>
+#
+#  Fractal Fr0st is free software; you can redistribute
+#  it and/or modify it under the terms of the GNU General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Library General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this library; see the file COPYING.LIB.  If not, write to
+#  the Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+#  Boston, MA 02111-1307, USA.
+##############################################################################
+from unittest import TestCase
+
+from fr0stlib import Flame, load_flames
+from benchmark_to_string import SAMPLES
+
+
+class TestFingerprint(TestCase):
+    def setUp(self):
+        self.flames = load_flames(SAMPLES)
+
+    def test_reloaded_string(self):
+        for flame in self.flames:
+            flame.scale *= 1.0000001234567
+            flame.xform[0].c += 1e-3
+            flame.xform[0].post.coefs = (.5, .1, 0, 1, .25, 0)
+            copy = Flame(flame.to_string())
+            self.assertEqual(copy.fingerprint(), flame.fingerprint())
+            self.assertEqual(copy.fingerprint(True), flame.fingerprint(True))
+
+    def test_changes(self):
+        flame = self.flames[1]
+        fingerprint = flame.fingerprint()
+        flame.name = "renamed"
+        self.assertEqual(flame.fingerprint(), fingerprint)
+        self.assertNotEqual(flame.fingerprint(True), fingerprint)
+        flame.xform[0].c += 1e-6
+        self.assertNotEqual(flame.fingerprint(), fingerprint)
+        flame.xform[0].c -= 1e-6
+        flame.xform[0].chaos[1] = 0.5
+        self.assertNotEqual(flame.fingerprint(), fingerprint)
+        flame.xform[0].chaos[1] = 1
+        self.assertEqual(flame.fingerprint(), fingerprint)
+        flame.gradient[0] = 9, 9, 9
+        self.assertNotEqual(flame.fingerprint(), fingerprint)
@@ -0,0 +1,69 @@
+##############################################################################
+#  Fractal Fr0st - fr0st
+#  https://launchpad.net/fr0st
+#
+#  Copyright (C) 2009 by Vitor Bosshard <algorias@gmail.com>
+#
+#  Fractal Fr0st is free software; you can redistribute
+#  it and/or modify it under the terms of the GNU General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Library General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this library; see the file COPYING.LIB.  If not, write to
+#  the Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+#  Boston, MA 02111-1307, USA.
+##############################################################################
+import os
+
+import fr0stlib
+from fr0stlib import save_flames
+from fixtures import TempDirTestCase, numbered_flames
+
+
+class TestFlameFile(TempDirTestCase):
+    def setUp(self):
+        TempDirTestCase.setUp(self)
+        self.path = os.path.join(self.dir, "test.flame")
+        save_flames(self.path, *numbered_flames(5))
+        self.expected = fr0stlib.split_flamestrings(open(self.path).read())
+
+    def test_iter_flamestrings(self):
+        data = open(self.path, "rb").read()
+        # Tiny chunks make tags straddle chunk boundaries.
+        for chunksize in (1, 7, 100, 1<<20):
+            result = list(fr0stlib.iter_flamestrings(self.path, chunksize))
+            self.assertEqual([s for _, s in result], self.expected)
+            for offset, s in result:
+                self.assertEqual(data[offset:offset + len(s)], s)
+
+    def test_iter_flames(self):
+        names = [f.name for f in fr0stlib.iter_flames(self.path)]
+        self.assertEqual(names, ["flame%s" % i for i in range(5)])
+
+    def test_index(self):
+        index = fr0stlib.load_flame_index(self.path)
+        self.assertEqual(len(index), 5)
+        # Nothing is written next to the flame file unless asked to.
+        self.assertFalse(os.path.exists(fr0stlib.flame_index_path(self.path)))
+        self.assertEqual(fr0stlib.load_flame_index(self.path, write=True
+                                                   ).tolist(), index.tolist())
+        self.assert_(os.path.exists(fr0stlib.flame_index_path(self.path)))
+        # Read back from the sidecar file.
+        self.assertEqual(fr0stlib.load_flame_index(self.path).tolist(),
+                         index.tolist())
+        self.assertEqual(fr0stlib.load_flamestring(self.path, 3),
+                         self.expected[3])
+
+    def test_stale_index(self):
+        fr0stlib.load_flame_index(self.path, write=True)
+        save_flames(self.path, *self.expected[:2])
+        st = os.stat(self.path)
+        # Make sure the mtime changes even on coarse filesystems.
+        os.utime(self.path, (st.st_atime, st.st_mtime + 10))
+        self.assertEqual(len(fr0stlib.load_flame_index(self.path)), 2)
@@ -0,0 +1,110 @@
+##############################################################################
+#  Fractal Fr0st - fr0st
+#  https://launchpad.net/fr0st
+#
+#  Copyright (C) 2009 by Vitor Bosshard <algorias@gmail.com>
+#
+#  Fractal Fr0st is free software; you can redistribute
+#  it and/or modify it under the terms of the GNU General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Library General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this library; see the file COPYING.LIB.  If not, write to
+#  the Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+#  Boston, MA 02111-1307, USA.
+##############################################################################
+import os, struct, threading
+from ctypes import c_ubyte
+
+from fr0st.scripts.mindmurmer.frame_sinks import FrameSink, ImageFileSink, \
+     SharedMemoryRingSink, SharedMemoryRingReader
+from fixtures import TempDirTestCase
+
+
+def frame(w, h, channels=3, value=0):
+    return (c_ubyte * (w * h * channels))(*[(value + i) % 256 for i in
+                                            range(w * h * channels)])
+
+
+class BlockingSink(FrameSink):
+    """Holds on to the first frame until released."""
+    def __init__(self, maxqueue):
+        self.started = threading.Event()
+        self.release = threading.Event()
+        FrameSink.__init__(self, maxqueue)
+
+    def write(self, output_buffer, size, channels):
+        self.started.set()
+        self.release.wait()
+
+
+class TestFrameSink(TempDirTestCase):
+    def test_drops_when_full(self):
+        sink = BlockingSink(maxqueue=2)
+        sink.push(frame(2, 2), (2, 2), 3)
+        sink.started.wait(5)
+        # The first frame is being written, two more fit in the queue.
+        for i in range(5):
+            sink.push(frame(2, 2), (2, 2), 3)
+        self.assertEqual(sink.dropped, 3)
+        sink.release.set()
+        sink.close()
+        self.assertEqual(sink.frames, 3)
+
+    def test_image_files(self):
+        template = os.path.join(self.dir, "frames", "%03d.png")
+        sink = ImageFileSink(template, start=5)
+        for i in range(3):
+            sink.push(frame(4, 3, value=i), (4, 3), 3)
+        sink.close()
+        self.assertEqual(sink.frames, 3)
+        self.assertEqual(sorted(os.listdir(os.path.join(self.dir, "frames"))),
+                         ["005.png", "006.png", "007.png"])
+        data = open(template % 6, "rb").read()
+        self.assertEqual(data[:8], "\x89PNG\r\n\x1a\n")
+        self.assertEqual(struct.unpack("!2I", data[16:24]), (4, 3))
+
+    def test_ring_roundtrip(self):
+        path = os.path.join(self.dir, "ring")
+        sink = SharedMemoryRingSink(path, nslots=2, maxqueue=4)
+        frames = [frame(4, 3, 4, value=i) for i in range(3)]
+        for f in frames:
+            sink.push(f, (4, 3), 4)
+        sink.close()
+        self.assertEqual(sink.frames, 3)
+
+        reader = SharedMemoryRingReader(path)
+        try:
+            self.assertEqual(reader.size, (4, 3))
+            self.assertEqual(reader.channels, 4)
+            self.assertEqual(reader.nslots, 2)
+            counter, data = reader.latest()
+            self.assertEqual(counter, 3)
+            self.assertEqual(data, str(bytearray(frames[-1])))
+        finally:
+            reader.close()
+
+    def test_ring_shape_mismatch(self):
+        path = os.path.join(self.dir, "ring")
+        sink = SharedMemoryRingSink(path)
+        # Called directly, so the error isn't swallowed by the sink thread.
+        sink.write(frame(4, 3), (4, 3), 3)
+        self.assertRaises(ValueError, sink.write, frame(2, 2), (2, 2), 3)
+        self.assertRaises(ValueError, sink.write, frame(4, 3, 4), (4, 3), 4)
+        sink.close()
+
+        reader = SharedMemoryRingReader(path)
+        self.assertEqual(reader.latest()[0], 1)
+        reader.close()
+
+    def test_not_a_ring(self):
+        path = os.path.join(self.dir, "other")
+        with open(path, "wb") as f:
+            f.write("x" * 100)
+        self.assertRaises(ValueError, SharedMemoryRingReader, path)
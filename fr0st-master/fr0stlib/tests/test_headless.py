@@ -0,0 +1,108 @@
+##############################################################################
+#  Fractal Fr0st - fr0st
+#  https://launchpad.net/fr0st
+#
+#  Copyright (C) 2009 by Vitor Bosshard <algorias@gmail.com>
+#
+#  Fractal Fr0st is free software; you can redistribute
+#  it and/or modify it under the terms of the GNU General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Library General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this library; see the file COPYING.LIB.  If not, write to
+#  the Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+#  Boston, MA 02111-1307, USA.
+##############################################################################
+from unittest import TestCase
+import os, sys, struct, zlib
+from StringIO import StringIO
+from ctypes import c_ubyte
+
+from fr0stlib.render import encode_png, save_buffer
+from fr0stlib import headless
+from fixtures import TempDirTestCase, numbered_flames
+
+
+class TestEncodePng(TestCase):
+    def test_roundtrip(self):
+        w, h = 3, 2
+        buf = (c_ubyte * (w*h*3))(*range(w*h*3))
+        s = encode_png(buf, (w, h))
+        self.assertEqual(s[:8], "\x89PNG\r\n\x1a\n")
+        self.assertEqual(struct.unpack("!2I", s[16:24]), (w, h))
+        # Single IDAT chunk right after the 25 byte IHDR chunk.
+        length, = struct.unpack("!I", s[33:37])
+        self.assertEqual(s[37:41], "IDAT")
+        raw = zlib.decompress(s[41:41+length])
+        self.assertEqual(raw, "\0" + str(bytearray(range(9)))
+                              + "\0" + str(bytearray(range(9, 18))))
+
+    def test_bad_input(self):
+        buf = (c_ubyte * 10)()
+        self.assertRaises(ValueError, encode_png, buf, (3, 2))
+        self.assertRaises(ValueError, encode_png, buf, (1, 1), 2)
+
+
+class TestHeadless(TempDirTestCase):
+    def setUp(self):
+        TempDirTestCase.setUp(self)
+        self.flames = numbered_flames(4, "frame%s")
+
+    def test_parse_range(self):
+        self.assertEqual(headless.parse_range(":", 4), [0, 1, 2, 3])
+        self.assertEqual(headless.parse_range("1:3", 4), [1, 2])
+        self.assertEqual(headless.parse_range("-2:", 4), [2, 3])
+        self.assertEqual(headless.parse_range("-1", 4), [3])
+        self.assertEqual(headless.parse_range("-4", 4), [0])
+        self.assertRaises(ValueError, headless.parse_range, "4", 4)
+        self.assertRaises(ValueError, headless.parse_range, "-5", 4)
+        self.assertRaises(ValueError, headless.parse_range, "x", 4)
+
+    def test_default_output(self):
+        # Flames sharing a name must still get one file each.
+        template = headless.get_parser().get_default_values().output
+        paths = [headless.output_path(template, i, self.flames[0])
+                 for i in range(4)]
+        self.assertEqual(len(set(paths)), 4)
+
+    def test_bad_frame_range(self):
+        path = os.path.join(self.dir, "x.flame")
+        with open(path, "w") as f:
+            f.write("<flames>%s</flames>" % "".join(
+                flame.to_string() for flame in self.flames))
+        stderr, sys.stderr = sys.stderr, StringIO()
+        try:
+            self.assertRaises(SystemExit, headless.main,
+                              ["-f", "7", "-j", "1", path])
+            self.assert_("out of range" in sys.stderr.getvalue())
+        finally:
+            sys.stderr = stderr
+
+    def test_resume(self):
+        template = os.path.join(self.dir, "%(index)02d_%(name)s.png")
+        jobs = headless.make_jobs(self.flames, range(4), template, (8, 6), 1)
+        self.assertEqual([j[0] for j in jobs], range(4))
+
+        results = list(headless.render_batch(jobs[:2], processes=1,
+                                             renderer="numpy"))
+        self.assertEqual([i for i, t in results], [0, 1])
+        self.assert_(os.path.exists(os.path.join(self.dir, "01_frame1.png")))
+        self.assertEqual(sorted(os.listdir(self.dir)),
+                         ["00_frame0.png", "01_frame1.png"])
+
+        jobs = headless.make_jobs(self.flames, range(4), template, (8, 6), 1)
+        self.assertEqual([j[0] for j in jobs], [2, 3])
+        jobs = headless.make_jobs(self.flames, range(4), template, (8, 6), 1,
+                                  force=True)
+        self.assertEqual(len(jobs), 4)
+
+    def test_save_buffer_unsupported(self):
+        buf = (c_ubyte * 3)()
+        path = os.path.join(self.dir, "x.tga")
+        self.assertRaises(ValueError, save_buffer, path, buf, (1, 1))
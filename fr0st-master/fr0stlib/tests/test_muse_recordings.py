@@ -0,0 +1,78 @@
+##############################################################################
+#  Fractal Fr0st - fr0st
+#  https://launchpad.net/fr0st
+#
+#  Copyright (C) 2009 by Vitor Bosshard <algorias@gmail.com>
+#
+#  Fractal Fr0st is free software; you can redistribute
+#  it and/or modify it under the terms of the GNU General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Library General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this library; see the file COPYING.LIB.  If not, write to
+#  the Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+#  Boston, MA 02111-1307, USA.
+##############################################################################
+import os, json
+import numpy
+
+from fr0st.scripts.mindmurmer.muse_recordings import convert_muse_json, \
+     load_recording, BANDS
+from fixtures import TempDirTestCase
+
+SAMPLE = os.path.join(os.path.dirname(__file__), "..", "..", "fr0st",
+                      "scripts", "mindmurmer", "data",
+                      "Muse-B1C1_2018-06-11--07-48-41_1528717729867.json")
+
+
+def series(times, samples):
+    return {"timestamps": times, "samples": samples}
+
+
+class TestConvert(TempDirTestCase):
+    def test_sample(self):
+        path = convert_muse_json(SAMPLE, os.path.join(self.dir, "sample.npy"))
+        records = load_recording(path)
+        with open(SAMPLE) as f:
+            timeseries = json.load(f)["timeseries"]
+        alpha = timeseries["alpha_absolute"]
+        self.assertEquals(len(records), len(alpha["timestamps"]))
+        self.assertEquals(records["values"].shape[1], 4 * 5 + 2)
+        numpy.testing.assert_array_equal(records["t"], alpha["timestamps"])
+        for i, band in enumerate(BANDS):
+            numpy.testing.assert_array_equal(
+                records["values"][:, i*4:(i+1)*4],
+                numpy.asarray(timeseries[band]["samples"], numpy.float32))
+        self.assertFalse(records["values"][:, -1].any())
+
+    def test_align(self):
+        times = [0.0, 1.0, 2.0, 3.0]
+        timeseries = dict((band, series(times, [[i, i]] * 4))
+                          for i, band in enumerate(BANDS))
+        # Fewer blink samples than band samples.
+        timeseries["blink"] = series([0.1, 2.1], [[0], [1]])
+        # A band sampled at a higher rate, and one with a sample missing and
+        # timestamps a bit off.
+        timeseries["beta_absolute"] = series([0, .5, 1, 1.5, 2, 2.5, 3],
+                                             [[j, j] for j in range(7)])
+        timeseries["theta_absolute"] = series([1.01, 2.01, 3.01],
+                                              [[5, 5], [6, 6], [7, 7]])
+        path = os.path.join(self.dir, "aligned.json")
+        with open(path, "w") as f:
+            json.dump({"timeseries": timeseries}, f)
+        values = load_recording(convert_muse_json(path))["values"]
+        self.assertEquals(values.shape, (4, 2 * 5 + 2))
+        self.assertEquals(list(values[:, -2]), [0, 0, 1, 1])
+        self.assertEquals(list(values[:, 2]), [0, 2, 4, 6])
+        self.assertEquals(list(values[:, 8]), [5, 5, 6, 7])
+        del timeseries["blink"]
+        with open(path, "w") as f:
+            json.dump({"timeseries": timeseries}, f)
+        self.assertFalse(load_recording(convert_muse_json(path))
+                         ["values"][:, -2].any())
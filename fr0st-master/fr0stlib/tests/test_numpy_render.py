@@ -0,0 +1,152 @@
+##############################################################################
+#  Fractal Fr0st - fr0st
+#  https://launchpad.net/fr0st
+#
+#  Copyright (C) 2009 by Vitor Bosshard <algorias@gmail.com>
+#
+#  Fractal Fr0st is free software; you can redistribute
+#  it and/or modify it under the terms of the GNU General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Library General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this library; see the file COPYING.LIB.  If not, write to
+#  the Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+#  Boston, MA 02111-1307, USA.
+##############################################################################
+from unittest import TestCase
+import numpy, warnings
+
+from fr0stlib.pyflam3 import _numpy, libflam3, MissingDll, RenderSession
+from fr0stlib.render import resolve_renderer
+from fixtures import sierpinski
+
+
+class TestNumpyRender(TestCase):
+    def setUp(self):
+        self.flame = sierpinski()
+        self.size = 64, 48
+
+    def render(self, **kwds):
+        kwds.setdefault("seed", 1)
+        return _numpy.render(self.flame, self.size, 5, **kwds)
+
+    def test_buffer_layout(self):
+        w, h = self.size
+        self.assertEquals(len(self.render()), w * h * 3)
+        self.assertEquals(len(self.render(transparent=1)), w * h * 4)
+        self.assertEquals(len(self.render(spatial_oversample=2)), w * h * 3)
+
+    def test_deterministic(self):
+        self.assertEquals(bytearray(self.render()), bytearray(self.render()))
+        self.assertEquals(bytearray(self.render(seed=None, fixed_seed=True)),
+                          bytearray(self.render(seed=None, fixed_seed=True)))
+        self.assertNotEquals(bytearray(self.render()),
+                             bytearray(self.render(seed=2)))
+
+    def test_image(self):
+        w, h = self.size
+        img = numpy.frombuffer(self.render(), dtype=numpy.uint8
+                               ).reshape(h, w, 3)
+        # The triangle covers the center, but leaves the corners black.
+        self.assert_(img[h/2-3:h/2+3, w/2-3:w/2+3].any())
+        self.assertFalse(img[:3, :3].any())
+        self.assertFalse(img[-3:, -3:].any())
+
+    def test_background(self):
+        self.flame.background = 1, 0, 0
+        img = numpy.frombuffer(self.render(), dtype=numpy.uint8
+                               ).reshape(self.size[1], self.size[0], 3)
+        self.assertEquals(list(img[0, 0]), [255, 0, 0])
+
+    def test_variations(self):
+        xf = self.flame.xform[0]
+        for name in _numpy.supported:
+            xf.linear = 0
+            setattr(xf, name, 1.0)
+            self.render()
+            delattr(xf, name)
+
+    def test_unsupported_variation(self):
+        xf = self.flame.xform[0]
+        xf.linear = 0
+        xf.mobius = 1.0
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            image = self.render()
+        self.assertEquals(len(caught), 1)
+        self.assert_("mobius" in str(caught[0].message))
+        # Rendered as if it was linear.
+        del xf.mobius
+        xf.linear = 1.0
+        self.assertEquals(bytearray(image), bytearray(self.render()))
+
+    def test_progress(self):
+        calls = []
+        def prog(py_object, fraction, stage, eta):
+            calls.append(fraction)
+        self.render(progress_func=prog)
+        self.assert_(calls)
+        self.assertAlmostEquals(calls[-1], 100.0)
+
+    def test_resume(self):
+        # Running a game twice adds up to a single run of the same length.
+        games = [_numpy.ChaosGame(self.flame, self.size,
+                                  numpy.random.RandomState(1), batch=1000)
+                 for i in range(2)]
+        games[0].run(5000)
+        games[0].run(5000)
+        games[1].run(10000)
+        self.assertEquals(games[0].samples, 10000)
+        self.assert_((games[0].accum == games[1].accum).all())
+
+
+class TestDensityEstimation(TestCase):
+    def test_spread(self):
+        accum = numpy.zeros((21, 21, 4))
+        hits = numpy.zeros((21, 21))
+        accum[10, 10] = hits[10, 10] = 1
+        accum[3, 3] = 1
+        hits[3, 3] = 1000
+        out = _numpy.density_estimate(accum, hits, 4, curve=.4)
+        # A single hit gets the widest kernel, keeping its energy.
+        self.assertAlmostEqual(out[..., 0].sum(), 2, 9)
+        self.assert_((out[8:13, 8:13, 0] > 0).all())
+        self.assert_(out[10, 10, 0] < 1)
+        self.assertAlmostEqual(out[10, 9, 0], out[9, 10, 0], 12)
+        # 1000 hits shrink the radius below a pixel, so it isn't spread.
+        self.assertEquals(out[3, 3, 0], 1)
+        self.assertFalse(out[2:5, 2:5, 0].sum() - 1)
+
+    def test_render(self):
+        w, h = 64, 48
+        flame = sierpinski()
+        plain, smooth = [numpy.frombuffer(
+            _numpy.render(flame, (w, h), 1, seed=1, estimator=estimator),
+            dtype=numpy.uint8).reshape(h, w, 3) for estimator in (0, 9)]
+        # At low quality the estimator fills in the gaps between samples.
+        self.assert_((smooth.any(axis=2)).sum() > (plain.any(axis=2)).sum())
+
+    def test_session(self):
+        session = RenderSession(seed=1)
+        session.set_flame(sierpinski(), (64, 48))
+        session.refine(1)
+        plain = bytearray(session.snapshot())
+        self.assertFalse(session.set_flame(sierpinski(), (64, 48),
+                                           estimator=9))
+        self.assertEquals(session.quality, 1)
+        self.assertNotEquals(bytearray(session.snapshot()), plain)
+
+
+class TestResolveRenderer(TestCase):
+    def test_fallback(self):
+        missing = isinstance(libflam3, MissingDll)
+        self.assertEquals(resolve_renderer('flam3'),
+                          'numpy' if missing else 'flam3')
+        self.assertEquals(resolve_renderer('numpy'), 'numpy')
+        self.assertEquals(resolve_renderer('flam4'), 'flam4')
@@ -28,7 +28,7 @@ import colorsys
 
 
 from fr0stlib import Palette
-from fr0stlib import functions
+import fr0stlib as functions
 
 
 
@@ -114,13 +114,13 @@ class TestPalette(TestCase):
         self.check_index(palette, 2, c3)
 
     def testFromFlameElement(self):
-        palette = Palette.from_flame_element(self.hex_flame_element)
+        palette = Palette(self.hex_flame_element)
 
         for idx in range(256):
             self.check_index(palette, idx, self.data[idx])
 
     def testRotate(self):
-        palette = Palette.from_flame_element(self.hex_flame_element)
+        palette = Palette(self.hex_flame_element)
         palette.rotate(128)
 
         rotated = self.data[-128:] + self.data[:-128]
@@ -129,7 +129,7 @@ class TestPalette(TestCase):
             self.check_index(palette, idx, rotated[idx])
 
     def testReverse(self):
-        palette = Palette.from_flame_element(self.hex_flame_element)
+        palette = Palette(self.hex_flame_element)
         palette.reverse()
 
         reversed = self.data[::-1]
@@ -138,12 +138,12 @@ class TestPalette(TestCase):
             self.check_index(palette, idx, reversed[idx])
 
     def testSaturation(self):
-        palette = Palette.from_flame_element(self.hex_flame_element)
+        palette = Palette(self.hex_flame_element)
         palette.saturation(5)
 
         def adjust_saturation(c, v):
             h, l, s = functions.rgb2hls(c)
-            return functions.hls2rgb((h, l, s+v))
+            return functions.hls2rgb((h, l, min(1, s+v)))
 
         adjusted = self.data[:]
         
@@ -153,6 +153,42 @@ class TestPalette(TestCase):
         for idx in range(256):
             self.check_index(palette, idx, adjusted[idx])
 
+    def testHue(self):
+        palette = Palette(self.hex_flame_element)
+        palette.hue(100)
+
+        for idx, c in enumerate(self.data):
+            h, l, s = functions.rgb2hls(c)
+            self.check_index(palette, idx,
+                             functions.hls2rgb(((h + 100/360.0) % 1, l, s)))
+
+    def testBrightness(self):
+        palette = Palette(self.hex_flame_element)
+        palette.brightness(-20)
+
+        for idx, c in enumerate(self.data):
+            h, l, s = functions.rgb2hls(c)
+            self.check_index(palette, idx,
+                             functions.hls2rgb((h, max(0, l - 0.2), s)))
+
+    def testFromSeeds(self):
+        seeds = [(0.1, 0.5, 0.9), (0.9, 1.0, 0.4), (0.9, 1.0, 0.4),
+                 (0.5, 0.2, 0.7), (1.3, 0.8, 0.6)]
+        for curve in ('linear', 'cos', 'cubic'):
+            palette = Palette()
+            palette.from_seeds(seeds, curve)
+
+            expected = []
+            for i in range(5):
+                ds = 256/5 + (i < 256%5)
+                for j in range(ds):
+                    hsv = functions.pblend_color(seeds[i-1], seeds[i],
+                                                 j/float(ds), curve)
+                    expected.append(functions.hsv2rgb(hsv))
+
+            for idx in range(256):
+                self.check_index(palette, idx, expected[idx])
+
     def testFromImage(self):
         palette = Palette()
         palette.from_image(map(ord, image_data), (14, 14))
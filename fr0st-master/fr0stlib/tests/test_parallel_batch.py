@@ -0,0 +1,98 @@
+##############################################################################
+#  Fractal Fr0st - fr0st
+#  https://launchpad.net/fr0st
+#
+#  Copyright (C) 2009 by Vitor Bosshard <algorias@gmail.com>
+#
+#  Fractal Fr0st is free software; you can redistribute
+#  it and/or modify it under the terms of the GNU General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Library General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this library; see the file COPYING.LIB.  If not, write to
+#  the Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+#  Boston, MA 02111-1307, USA.
+##############################################################################
+from unittest import TestCase
+import random
+
+import fr0stlib
+from fr0stlib import Flame
+from fr0st.scripts import utils
+from fr0st.scripts.utils import parallel_batch
+
+
+def random_flame(nxforms=2):
+    flame = Flame()
+    for i in range(nxforms):
+        flame.add_xform(coefs=[random.uniform(-1, 1) for j in range(6)],
+                        color=random.random())
+    flame.scale = 50
+    return flame
+
+
+class TestParallelBatch(TestCase):
+    def strings(self, **kwds):
+        return [(flame.to_string(), image) for flame, image
+                in parallel_batch(random_flame, 6, seed=7, **kwds)]
+
+    def test_serial_equals_parallel(self):
+        serial = self.strings(processes=1)
+        self.assertEqual(serial, self.strings(processes=3))
+        self.assertNotEqual(serial, [(flame.to_string(), image)
+                                     for flame, image in parallel_batch(
+                                         random_flame, 6, seed=8)])
+
+    def test_names_and_args(self):
+        flames = [flame for flame, _ in parallel_batch(
+                  random_flame, 3, kwds=dict(nxforms=3), seed=1)]
+        self.assertEqual([f.name for f in flames],
+                         ["random_flame000", "random_flame001",
+                          "random_flame002"])
+        self.assertEqual([len(f.xform) for f in flames], [3, 3, 3])
+
+    def test_interleaved(self):
+        # Each generator keeps its own job, even when run serially.
+        a = parallel_batch(random_flame, 3, processes=1, seed=7)
+        b = parallel_batch(random_flame, 3, processes=1, seed=8,
+                           kwds=dict(nxforms=3))
+        mixed = [next(gen)[0] for i in range(3) for gen in (a, b)]
+        self.assertEqual([f.to_string() for f in mixed[::2]],
+                         [f for f, _ in self.strings(processes=1)][:3])
+        self.assertEqual([len(f.xform) for f in mixed[1::2]], [3, 3, 3])
+
+    def test_serial_in_gui(self):
+        def no_pool(*a, **k):
+            raise AssertionError("forked from the gui")
+        pool, utils.multiprocessing.Pool = utils.multiprocessing.Pool, no_pool
+        fr0stlib.GUI = True
+        try:
+            self.assertEqual(self.strings(processes=3),
+                             self.strings(processes=1))
+        finally:
+            fr0stlib.GUI = False
+            utils.multiprocessing.Pool = pool
+
+    def test_rng_state_restored(self):
+        state = random.getstate()
+        list(parallel_batch(random_flame, 2, processes=1, seed=1))
+        self.assertEqual(random.getstate(), state)
+
+    def test_thumbnails(self):
+        w, h = 16, 12
+        results = self.strings(processes=2, thumbnail_size=(w, h),
+                               thumbnail_quality=2)
+        self.assertEqual(len(results), 6)
+        for string, image in results:
+            self.assertEqual(len(image), w * h * 3)
+        # Thumbnails use a fixed seed, so they're reproducible too.
+        self.assertEqual(results, self.strings(processes=1,
+                                               thumbnail_size=(w, h),
+                                               thumbnail_quality=2))
+        self.assertEqual([image for _, image in self.strings()], [None] * 6)
@@ -0,0 +1,104 @@
+##############################################################################
+#  Fractal Fr0st - fr0st
+#  https://launchpad.net/fr0st
+#
+#  Copyright (C) 2009 by Vitor Bosshard <algorias@gmail.com>
+#
+#  Fractal Fr0st is free software; you can redistribute
+#  it and/or modify it under the terms of the GNU General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Library General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this library; see the file COPYING.LIB.  If not, write to
+#  the Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+#  Boston, MA 02111-1307, USA.
+##############################################################################
+from unittest import TestCase, skipIf
+
+from fr0stlib import Flame
+from fr0stlib.pyflam3 import RenderSession, libflam3, MissingDll
+from fr0stlib.render import numpy_progressive, flam3_progressive
+from fixtures import sierpinski
+
+
+class TestRenderSession(TestCase):
+    def setUp(self):
+        # Loaded the way flames usually are, as in a flame file.
+        self.flame = Flame(sierpinski().to_string())
+        self.size = 64, 48
+        self.session = RenderSession(seed=1)
+        self.session.set_flame(self.flame, self.size)
+
+    def test_add_samples(self):
+        w, h = self.size
+        self.assertEquals(self.session.quality, 0)
+        self.assert_(self.session.add_samples(w * h))
+        self.assertEquals(self.session.quality, 1)
+        self.session.refine(3)
+        self.assertEquals(self.session.quality, 3)
+        self.assertEquals(len(self.session.snapshot()), w * h * 3)
+
+    def test_reset(self):
+        self.session.refine(2)
+        # Same flame (the name doesn't count): samples are kept.
+        self.flame.name = "renamed"
+        self.assertFalse(self.session.set_flame(self.flame, self.size))
+        self.assertEquals(self.session.quality, 2)
+        self.assertFalse(self.session.set_flame(self.flame.to_string(),
+                                                self.size))
+        self.assertEquals(self.session.quality, 2)
+        # Changing the flame or the size starts over.
+        self.flame.xform[0].color = .25
+        self.assert_(self.session.set_flame(self.flame, self.size))
+        self.assertEquals(self.session.quality, 0)
+        self.session.refine(1)
+        self.assert_(self.session.set_flame(self.flame, (32, 24)))
+        self.assertEquals(self.session.quality, 0)
+        self.session.refine(1)
+        self.session.reset()
+        self.assertEquals(self.session.quality, 0)
+
+    def test_passes(self):
+        qualities = [q for _, q in self.session.passes(5)]
+        self.assertEquals(qualities, [1, 2, 4, 5])
+        # Further passes start with the samples already there.
+        self.assertEquals([q for _, q in self.session.passes(5)], [5])
+        self.assertEquals([q for _, q in self.session.passes(20)],
+                          [5, 10, 20])
+
+    def test_cancel(self):
+        passes = self.session.passes(5, progress_func=lambda *a: 1)
+        self.assertEquals(list(passes), [])
+
+    def test_progress(self):
+        calls = []
+        def prog(py_object, fraction, stage, eta):
+            calls.append(fraction)
+        list(self.session.passes(5, progress_func=prog))
+        self.assertEquals(calls, sorted(calls))
+        self.assertAlmostEquals(calls[-1], 100.0)
+
+    def test_numpy_progressive(self):
+        passes = list(numpy_progressive(self.flame, self.size, 5, seed=1))
+        self.assertEquals([q for _, q in passes], [1, 2, 4, 5])
+        final = list(self.session.passes(5))[-1][0]
+        self.assertEquals(bytearray(passes[-1][0]), bytearray(final))
+
+
+@skipIf(isinstance(libflam3, MissingDll), "needs libflam3")
+class TestFlam3Progressive(TestCase):
+    def test_passes(self):
+        flame = sierpinski()
+        passes = list(flam3_progressive(flame, (64, 48), 5, fixed_seed=True))
+        # A coarse pass, then straight to full quality.
+        self.assertEquals([q for _, q in passes], [1, 5])
+        for output_buffer, q in passes:
+            self.assertEquals(len(output_buffer), 64 * 48 * 3)
+        passes = list(flam3_progressive(flame, (64, 48), 1, fixed_seed=True))
+        self.assertEquals([q for _, q in passes], [1])
@@ -0,0 +1,133 @@
+##############################################################################
+#  Fractal Fr0st - fr0st
+#  https://launchpad.net/fr0st
+#
+#  Copyright (C) 2009 by Vitor Bosshard <algorias@gmail.com>
+#
+#  Fractal Fr0st is free software; you can redistribute
+#  it and/or modify it under the terms of the GNU General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Library General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this library; see the file COPYING.LIB.  If not, write to
+#  the Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+#  Boston, MA 02111-1307, USA.
+##############################################################################
+from unittest import TestCase, skipIf
+import os, zlib
+
+from fr0stlib import timeline
+from fr0stlib.timeline import keyframe_time, get_easing, EASINGS, \
+     write_genome_cache, GenomeCache, Timeline
+from fr0stlib.pyflam3 import Genome, libflam3, MissingDll
+from fixtures import TempDirTestCase, numbered_flames
+
+
+def keyframes():
+    flames = numbered_flames(3, "key %s")
+    for i, flame in enumerate(flames):
+        flame.time = i * 10
+    return flames
+
+
+class TestEasing(TestCase):
+    def test_endpoints(self):
+        for name, func in EASINGS.items():
+            self.assertAlmostEqual(func(0.0), 0.0, 12, name)
+            self.assertAlmostEqual(func(0.5), 0.5, 12, name)
+            self.assertAlmostEqual(func(1.0), 1.0, 12, name)
+
+    def test_get_easing(self):
+        self.assertTrue(get_easing("cubic") is timeline.ease_cubic)
+        f = lambda t: t
+        self.assertTrue(get_easing(f) is f)
+        self.assertRaises(ValueError, get_easing, "bouncy")
+
+    def test_keyframe_time(self):
+        times = [0.0, 10.0, 30.0]
+        easings = [timeline.ease_linear, timeline.ease_cubic]
+        self.assertEquals(keyframe_time(times, easings, -5), 0.0)
+        self.assertEquals(keyframe_time(times, easings, 40), 30.0)
+        self.assertEquals(keyframe_time(times, easings, 2.5), 2.5)
+        self.assertEquals(keyframe_time(times, easings, 10), 10.0)
+        self.assertEquals(keyframe_time(times, easings, 20), 20.0)
+        # Cubic easing is slow at the start of the segment.
+        self.assertAlmostEqual(keyframe_time(times, easings, 15),
+                               10 + 20 * 0.0625, 12)
+
+
+class TestGenomeCache(TempDirTestCase):
+    def setUp(self):
+        TempDirTestCase.setUp(self)
+        self.path = os.path.join(self.dir, "test.cache")
+
+    def test_roundtrip(self):
+        strings = [f.to_string() for f in numbered_flames(5, "frame %s")]
+        times = [0.0, 0.5, 1.0, 1.5, 2.0]
+        write_genome_cache(self.path, [(t, zlib.compress(s))
+                                       for t, s in zip(times, strings)])
+        cache = GenomeCache(self.path)
+        self.assertEquals(len(cache), 5)
+        self.assertEquals(cache.times, times)
+        self.assertTrue(1.5 in cache)
+        self.assertFalse(1.25 in cache)
+        self.assertEquals(cache.string(1.5), strings[3])
+        self.assertEquals(cache.flame(2.0).name, "frame 4")
+
+    def test_not_a_cache(self):
+        with open(self.path, "wb") as f:
+            f.write("<flames></flames>" * 4)
+        self.assertRaises(ValueError, GenomeCache, self.path)
+
+
+@skipIf(isinstance(libflam3, MissingDll), "needs libflam3")
+class TestTimeline(TempDirTestCase):
+    def test_keyframes(self):
+        tl = Timeline(keyframes())
+        self.assertEquals((tl.start, tl.end), (0.0, 20.0))
+        for i, t in enumerate(tl.times):
+            self.assertAlmostEqual(tl.flame(t).xform[0].c, i * .1, 6)
+
+    def test_flame(self):
+        flame = Timeline(keyframes()).flame(5, name="between")
+        self.assertEquals(flame.name, "between")
+        self.assertAlmostEqual(flame.xform[0].c, .05, 6)
+
+    def test_lru(self):
+        tl = Timeline(keyframes(), cache_size=2)
+        genome = tl.genome(5)
+        self.assertTrue(isinstance(genome, Genome))
+        self.assertTrue(tl.genome(5) is genome)
+        tl.genome(6)
+        tl.genome(7)
+        self.assertEquals(list(tl._cache), [6, 7])
+        self.assertFalse(tl.genome(5) is genome)
+
+    def test_precompute(self):
+        tl = Timeline(keyframes())
+        times = tl.frame_times(nframes=5)
+        path = os.path.join(self.dir, "test.cache")
+        for processes in (1, 2):
+            cache = tl.precompute(path, times, processes=processes)
+            self.assertTrue(tl.precomputed is cache)
+            self.assertEquals(cache.times, times)
+            for t in times:
+                self.assertEquals(cache.string(t),
+                                  Timeline(keyframes()).string(t))
+
+    def test_precomputed_genome(self):
+        tl = Timeline(keyframes())
+        times = tl.frame_times(step=5)
+        cache = tl.precompute(os.path.join(self.dir, "test.cache"), times, 1)
+        genome = cache.genome(15)
+        self.assertEquals(genome.to_string(), cache.string(15))
+        # Read through the cache file, not interpolated.
+        tl = Timeline(keyframes(), precomputed=cache)
+        self.assertEquals(tl.string(15), cache.string(15))
+        self.assertTrue(tl.genome(15)._parsed is not None)
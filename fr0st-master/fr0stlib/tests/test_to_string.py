@@ -0,0 +1,55 @@
+##############################################################################
+#  Fractal Fr0st - fr0st
+#  https://launchpad.net/fr0st
+#
+#  Copyright (C) 2009 by Vitor Bosshard <algorias@gmail.com>
+#
+#  Fractal Fr0st is free software; you can redistribute
+#  it and/or modify it under the terms of the GNU General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Library General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this library; see the file COPYING.LIB.  If not, write to
+#  the Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+#  Boston, MA 02111-1307, USA.
+##############################################################################
+from unittest import TestCase
+
+from fr0stlib import Flame, Palette, load_flames
+from benchmark_to_string import SAMPLES, legacy_to_string
+
+
+class TestToString(TestCase):
+    def setUp(self):
+        self.flames = load_flames(SAMPLES)
+
+    def test_same_as_legacy(self):
+        for flame in self.flames:
+            flame.xform[0].post.coefs = (.5, .1, 0, 1, .25, 0)
+            self.assertEqual(flame.to_string(), legacy_to_string(flame))
+
+    def test_hex_palette_roundtrip(self):
+        for flame in self.flames:
+            string = flame.to_string(hex_palette=True)
+            self.assert_('<color ' not in string)
+            copy = Flame(string)
+            self.assertEqual(copy.gradient.data.tolist(),
+                             flame.gradient.data.tolist())
+            self.assertEqual(copy.to_string(), flame.to_string())
+
+    def test_palette_cache(self):
+        palette = Palette()
+        before = palette.to_string()
+        palette[3] = 1, 2, 3
+        after = palette.to_string()
+        self.assertNotEqual(before, after)
+        self.assert_('<color index="3" rgb="1 2 3"/>' in after)
+        palette.reverse()
+        self.assert_('<color index="252" rgb="1 2 3"/>' in palette.to_string())
+        self.assertNotEqual(palette.to_string(True), after)
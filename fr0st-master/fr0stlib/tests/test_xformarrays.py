@@ -0,0 +1,142 @@
+##############################################################################
+#  Fractal Fr0st - fr0st
+#  https://launchpad.net/fr0st
+#
+#  Copyright (C) 2009 by Vitor Bosshard <algorias@gmail.com>
+#
+#  Fractal Fr0st is free software; you can redistribute
+#  it and/or modify it under the terms of the GNU General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Library General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this library; see the file COPYING.LIB.  If not, write to
+#  the Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+#  Boston, MA 02111-1307, USA.
+##############################################################################
+from unittest import TestCase
+import gc
+
+from fr0stlib import Flame
+from fr0stlib.pyflam3.variations import variation_list
+
+
+class TestXformArrays(TestCase):
+    def setUp(self):
+        self.flame = Flame()
+        self.arrays = self.flame._xform_arrays
+
+    def test_views(self):
+        x = self.flame.add_xform(coefs=(1, 2, 3, 4, 5, 6), spherical=0.5)
+        x.post.coefs = (6, 5, 4, 3, 2, 1)
+        self.assertEquals(list(self.arrays.coefs[x._row, 0]), [1, 2, 3, 4, 5, 6])
+        self.assertEquals(list(self.arrays.coefs[x._row, 1]), [6, 5, 4, 3, 2, 1])
+        self.assertEquals((x.a, x.d, x.b, x.e, x.c, x.f), (1, 2, 3, 4, 5, 6))
+
+        x.scale(2)
+        self.assertEquals(list(self.arrays.coefs[x._row, 0]), [2, 4, 6, 8, 5, 6])
+        self.arrays.coefs[x._row, 0, 4] = 7
+        self.assertEquals(x.c, 7)
+
+        i = variation_list.index("spherical")
+        self.assertEquals(self.arrays.weights[x._row, i], 0.5)
+        self.assertEquals(x.list_variations(), ["linear", "spherical"])
+        del x.spherical
+        self.assertEquals(x.spherical, 0.0)
+        self.assertEquals(x.list_variations(), ["linear"])
+        self.assertRaises(AttributeError, delattr, x, "spherical")
+
+    def test_snapshots(self):
+        # Getters still return copies, so old values can be kept around.
+        x = self.flame.add_xform()
+        coefs = x.coefs
+        x.a = 3
+        self.assertEquals(list(coefs), [1, 0, 0, 1, 0, 0])
+        self.assertEquals(list(x.coefs), [3, 0, 0, 1, 0, 0])
+
+    def test_grow(self):
+        xforms = [self.flame.add_xform(coefs=(i, 0, 0, 1, 0, 0))
+                  for i in range(20)]
+        final = self.flame.add_final(coefs=(-1, 0, 0, 1, 0, 0))
+        self.assertTrue(len(self.arrays.coefs) >= 21)
+        self.assertEquals([x.a for x in xforms], range(20))
+        self.assertEquals(final.a, -1)
+        xforms[-1].a = 42
+        self.assertEquals(self.arrays.coefs[xforms[-1]._row, 0, 0], 42)
+        xforms[-1].post.a = 43
+        self.assertEquals(self.arrays.coefs[xforms[-1]._row, 1, 0], 43)
+
+    def test_release(self):
+        x = self.flame.add_xform()
+        row = x._row
+        x.delete()
+        del x
+        gc.collect()
+        self.assertEquals(len(self.arrays), 0)
+        y = self.flame.add_xform(linear=0.5)
+        self.assertEquals(y._row, row)
+        self.assertEquals(y.list_variations(), ["linear"])
+        self.assertEquals(list(y.post.coefs), [1, 0, 0, 1, 0, 0])
+
+    def test_copy(self):
+        x = self.flame.add_xform(coefs=(1, 2, 3, 4, 5, 6), julia=0.25)
+        x.post.coefs = (6, 5, 4, 3, 2, 1)
+        y = x.copy()
+        self.assertNotEquals(x._row, y._row)
+        self.assertEquals(list(y.coefs), [1, 2, 3, 4, 5, 6])
+        self.assertEquals(list(y.post.coefs), [6, 5, 4, 3, 2, 1])
+        self.assertEquals(y.julia, 0.25)
+        y.a = 0
+        self.assertEquals(x.a, 1)
+
+
+class TestTransformXforms(TestCase):
+    def setUp(self):
+        self.flame = Flame()
+        for i in range(5):
+            self.flame.add_xform(coefs=(0.5 + i, 0.25, -0.3, 0.8, 0.1 * i, -0.2),
+                                 animate=i % 2)
+        self.flame.add_final(coefs=(1, 0.5, 0, 1, 0.2, 0.3))
+        self.flame.xform[1].post.coefs = (0.9, 0.1, -0.1, 0.9, 0.3, 0.4)
+        self.reference = Flame(self.flame.to_string())
+
+    def assertCoefsAlmostEqual(self, xforms, expected_xforms, post=False):
+        for x, y in zip(xforms, expected_xforms):
+            if post:
+                x, y = x.post, y.post
+            for a, b in zip(x.coefs, y.coefs):
+                self.assertAlmostEqual(a, b, 12)
+
+    def test_mask(self):
+        self.assertEquals(list(self.flame.xform_mask()), [1, 1, 1, 1, 1, 0])
+        self.assertEquals(list(self.flame.xform_mask(animate=True)),
+                          [0, 1, 0, 1, 0, 0])
+        self.assertEquals(list(self.flame.xform_mask(final=True)), [1] * 6)
+
+    def test_rotate(self):
+        self.flame.transform_xforms(rotate=33, scale=1.5, pivot=(0.3, -0.1))
+        for x in self.reference.xform:
+            x.rotate(33, pivot=(0.3, -0.1))
+            x.scale(1.5)
+        self.assertCoefsAlmostEqual(self.flame.iter_xforms(),
+                                    self.reference.iter_xforms())
+
+    def test_animate_final_post(self):
+        mask = self.flame.xform_mask(animate=True)
+        self.flame.transform_xforms(mask, rotate=-12, translate=(0.1, 0.2))
+        mask = self.flame.xform_mask(final=True)
+        self.flame.transform_xforms(mask, scale=0.5, post=True)
+        for x in self.reference.iter_xforms():
+            if x.animate:
+                x.rotate(-12)
+                x.move_pos(0.1, 0.2)
+            x.post.scale(0.5)
+        self.assertCoefsAlmostEqual(self.flame.iter_xforms(),
+                                    self.reference.iter_xforms())
+        self.assertCoefsAlmostEqual(self.flame.iter_xforms(),
+                                    self.reference.iter_xforms(), post=True)
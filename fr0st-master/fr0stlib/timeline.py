@@ -0,0 +1,301 @@
+##############################################################################
+#  Fractal Fr0st - fr0st
+#  https://launchpad.net/fr0st
+#
+#  Copyright (C) 2009 by Vitor Bosshard <algorias@gmail.com>
+#
+#  Fractal Fr0st is free software; you can redistribute
+#  it and/or modify it under the terms of the GNU General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Library General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this library; see the file COPYING.LIB.  If not, write to
+#  the Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+#  Boston, MA 02111-1307, USA.
+##############################################################################
+"""Keyframe timelines: flames evaluated at any (fractional) time by
+interpolating between keyframes with flam3.
+
+Keyframes are parsed once. Each segment between two keyframes can have its
+own easing curve, which remaps time within the segment before it's passed
+to flam3_interpolate. Recently evaluated times are kept in an LRU cache, and
+whole sequences can be precomputed in parallel into a genome cache file, so
+looping or scrubbing through an animation doesn't interpolate every pass.
+"""
+import os, struct, zlib, bisect, collections, multiprocessing
+from ctypes import cast, POINTER
+from math import cos, pi
+import xml.etree.cElementTree as etree
+
+from fr0stlib import Flame
+from fr0stlib.pyflam3 import Genome, byref, flam3_interpolate, flam3_free
+from fr0stlib.render import to_string
+
+
+def ease_linear(t):
+    return t
+
+def ease_sine(t):
+    return 0.5 * (1 - cos(pi * t))
+
+def ease_square(t):
+    t *= 2.
+    if t < 1:
+        return 0.5 * t * t
+    t -= 2
+    return 0.5 * (2 - t * t)
+
+def ease_cubic(t):
+    t *= 2.
+    if t < 1:
+        return 0.5 * t * t * t
+    t -= 2
+    return 0.5 * (t * t * t + 2)
+
+# Same curves as easing_sine, easing_square and easing_cubic in the script
+# utils, normalized to [0, 1].
+EASINGS = dict(linear=ease_linear, sine=ease_sine, square=ease_square,
+               cubic=ease_cubic)
+
+
+def get_easing(easing):
+    if callable(easing):
+        return easing
+    try:
+        return EASINGS[easing]
+    except KeyError:
+        raise ValueError("Unknown easing: %s (choose from %s)"
+                         % (easing, ", ".join(sorted(EASINGS))))
+
+
+def keyframe_time(times, easings, t):
+    """Maps a timeline time to the time passed to flam3_interpolate: t is
+    clamped to the keyframe range, and its position inside the segment is
+    remapped by the easing curve of that segment."""
+    if t <= times[0]:
+        return times[0]
+    if t >= times[-1]:
+        return times[-1]
+    i = bisect.bisect_right(times, t) - 1
+    t0, t1 = times[i], times[i+1]
+    return t0 + easings[i]((t - t0) / float(t1 - t0)) * (t1 - t0)
+
+
+class Timeline(object):
+    """Interpolates a sequence of keyframe flames, ordered by their time
+    attribute. easing is the name of a curve in EASINGS or a function
+    mapping [0, 1] to [0, 1], either for all segments or as a list with one
+    per segment. Keyframes can be flames, flame strings or Genomes."""
+
+    def __init__(self, keyframes, easing="linear", cache_size=64,
+                 precomputed=None):
+        if len(keyframes) < 2:
+            raise ValueError("Need at least 2 keyframes")
+        strings = map(to_string, keyframes)
+        self.times = [float(etree.fromstring(s).get("time", 0))
+                      for s in strings]
+        if any(t1 <= t0 for t0, t1 in zip(self.times, self.times[1:])):
+            raise ValueError("Keyframe times must be strictly increasing")
+        if isinstance(easing, (list, tuple)):
+            if len(easing) != len(self.times) - 1:
+                raise ValueError("Need one easing per segment")
+            self.easings = map(get_easing, easing)
+        else:
+            self.easings = [get_easing(easing)] * (len(self.times) - 1)
+
+        self._genomes, self._ngenomes = Genome.from_string(
+            "<flames>%s</flames>" % "".join(strings))
+        self.cache_size = cache_size
+        self._cache = collections.OrderedDict()
+        self.precomputed = precomputed
+
+
+    def __del__(self):
+        genomes = getattr(self, "_genomes", None)
+        if genomes is not None:
+            flam3_free(genomes)
+
+
+    @property
+    def start(self):
+        return self.times[0]
+
+    @property
+    def end(self):
+        return self.times[-1]
+
+
+    def genome(self, t):
+        """Returns the Genome at time t. Genomes are shared through the
+        cache, so they shouldn't be modified (rendering one at a single size
+        is fine, see Frame.from_genome)."""
+        cache = self._cache
+        genome = cache.pop(t, None)
+        if genome is None:
+            if self.precomputed is not None and t in self.precomputed:
+                genome = self.precomputed.genome(t)
+            else:
+                genome = Genome()
+                flam3_interpolate(self._genomes, self._ngenomes,
+                                  keyframe_time(self.times, self.easings, t),
+                                  0, byref(genome))
+            if len(cache) >= self.cache_size:
+                cache.popitem(last=False)
+        cache[t] = genome
+        return genome
+
+
+    def string(self, t):
+        return self.genome(t).to_string()
+
+
+    def flame(self, t, name=None):
+        """Returns a new Flame at time t."""
+        flame = Flame(self.string(t))
+        if name is not None:
+            flame.name = name
+        return flame
+
+
+    def frame_times(self, nframes=None, step=1):
+        """Times of an animation over the whole timeline: nframes evenly
+        spaced times from start to end, or every step time units."""
+        if nframes is not None:
+            if nframes < 2:
+                return [self.start]
+            return [self.start + (self.end - self.start) * i / (nframes - 1.)
+                    for i in range(nframes)]
+        n = int((self.end - self.start) / step + 1e-9) + 1
+        return [self.start + i * step for i in range(n)]
+
+
+    def precompute(self, path, times=None, processes=None):
+        """Interpolates all times (default: frame_times()) in a pool of
+        processes and writes them to a genome cache file. Returns the
+        GenomeCache, which is also attached to the timeline."""
+        if times is None:
+            times = self.frame_times()
+        write_genome_cache(path, zip(times, _parallel_strings(self, times,
+                                                              processes)))
+        self.precomputed = GenomeCache(path)
+        return self.precomputed
+
+
+_parallel_timeline = None
+
+def _parallel_worker(t):
+    return zlib.compress(_parallel_timeline.string(t))
+
+
+def _parallel_strings(timeline, times, processes=None):
+    """Yields the compressed flam3 string of each time, in order."""
+    global _parallel_timeline
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    _parallel_timeline = timeline
+    try:
+        if processes <= 1 or len(times) <= 1 or os.name != "posix":
+            # Workers find the timeline in the module global, which only
+            # works if the pool is forked.
+            for t in times:
+                yield _parallel_worker(t)
+            return
+        pool = multiprocessing.Pool(processes)
+        try:
+            for s in pool.imap(_parallel_worker, times, chunksize=4):
+                yield s
+            pool.close()
+        except BaseException:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+    finally:
+        _parallel_timeline = None
+
+
+# Genome cache file: a header, then a table with the time, offset and length
+# of each entry, then the zlib compressed flam3 strings.
+_CACHE_MAGIC = "FR0STTLC"
+_cache_header = struct.Struct("<8sq")
+_cache_entry = struct.Struct("<dqq")
+
+
+def write_genome_cache(path, items):
+    """Writes (time, compressed flam3 string) pairs to a genome cache."""
+    items = list(items)
+    offset = _cache_header.size + _cache_entry.size * len(items)
+    table = []
+    for t, data in items:
+        table.append(_cache_entry.pack(t, offset, len(data)))
+        offset += len(data)
+    tmp = path + ".part"
+    with open(tmp, "wb") as f:
+        f.write(_cache_header.pack(_CACHE_MAGIC, len(items)))
+        f.write("".join(table))
+        for t, data in items:
+            f.write(data)
+    if os.path.exists(path):
+        # os.rename doesn't overwrite on windows.
+        os.remove(path)
+    os.rename(tmp, path)
+
+
+class _ParsedGenomes(object):
+    """Owns an array returned by Genome.from_string."""
+
+    def __init__(self, genomes):
+        self.genomes = genomes
+
+    def __del__(self):
+        flam3_free(self.genomes)
+
+
+class GenomeCache(object):
+    """Reads a genome cache written by Timeline.precompute. Only the table
+    is read up front, entries are decompressed and parsed on demand."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            magic, n = _cache_header.unpack(f.read(_cache_header.size))
+            if magic != _CACHE_MAGIC:
+                raise ValueError("%s is not a genome cache" % path)
+            table = f.read(_cache_entry.size * n)
+        self.times = []
+        self._entries = {}
+        for i in range(n):
+            t, offset, length = _cache_entry.unpack_from(
+                table, i * _cache_entry.size)
+            self.times.append(t)
+            self._entries[t] = offset, length
+
+    def __len__(self):
+        return len(self.times)
+
+    def __contains__(self, t):
+        return t in self._entries
+
+    def string(self, t):
+        offset, length = self._entries[t]
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            return zlib.decompress(f.read(length))
+
+    def genome(self, t):
+        """Returns the Genome at time t. It points into the array parsed by
+        flam3, which is freed once the genome is no longer referenced (e.g.
+        when it's evicted from a timeline's LRU)."""
+        genomes, ngenomes = Genome.from_string(self.string(t))
+        genome = cast(genomes, POINTER(Genome))[0]
+        genome._parsed = _ParsedGenomes(genomes)
+        return genome
+
+    def flame(self, t):
+        return Flame(self.string(t))
@@ -0,0 +1,84 @@
+##############################################################################
+#  Fractal Fr0st - fr0st
+#  https://launchpad.net/fr0st
+#
+#  Copyright (C) 2009 by Vitor Bosshard <algorias@gmail.com>
+#
+#  Fractal Fr0st is free software; you can redistribute
+#  it and/or modify it under the terms of the GNU General Public
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or (at your option) any later version.
+#
+#  This library is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#  Library General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this library; see the file COPYING.LIB.  If not, write to
+#  the Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+#  Boston, MA 02111-1307, USA.
+##############################################################################
+import weakref, numpy
+from functools import partial
+
+from fr0stlib.pyflam3.constants import flam3_nvariations
+
+
+class XformArrays(object):
+    """Coefficients and variation weights of all the xforms of a flame.
+
+    coefs[row, 0] holds the affine and coefs[row, 1] the post affine
+    coefficients of one xform, in the same (a, d, b, e, c, f) order as
+    Xform.coefs. weights[row] holds its variation weights, indexed like
+    variation_list, and present[row] tells which variations were set at
+    all. Xforms keep views of their row, so these arrays always reflect the
+    current values.
+
+    A row is allocated for each xform created and goes back to the pool when
+    the xform is garbage collected. When the pool runs out, the arrays are
+    doubled in size and all xforms are pointed to their new row views."""
+
+    def __init__(self, capacity=8):
+        self.coefs = numpy.zeros((capacity, 2, 6))
+        self.weights = numpy.zeros((capacity, flam3_nvariations))
+        self.present = numpy.zeros((capacity, flam3_nvariations), dtype=bool)
+        self._free = range(capacity - 1, -1, -1)
+        self._owners = {}
+
+
+    def __len__(self):
+        return len(self._owners)
+
+
+    def allocate(self, xform):
+        """Binds the xform to a free row, which is cleared."""
+        if not self._free:
+            self._grow()
+        row = self._free.pop()
+        self.coefs[row] = 0.0
+        self.weights[row] = 0.0
+        self.present[row] = False
+        self._owners[row] = weakref.ref(xform, partial(self._release, row))
+        xform._bind(self, row)
+        return row
+
+
+    def _release(self, row, ref):
+        if self._owners.get(row) is ref:
+            del self._owners[row]
+            self._free.append(row)
+
+
+    def _grow(self):
+        n = len(self.coefs)
+        for name in ("coefs", "weights", "present"):
+            old = getattr(self, name)
+            new = numpy.zeros((2 * n,) + old.shape[1:], dtype=old.dtype)
+            new[:n] = old
+            setattr(self, name, new)
+        self._free.extend(range(2 * n - 1, n - 1, -1))
+        for row, ref in self._owners.items():
+            xform = ref()
+            if xform is not None:
+                xform._bind(self, row)
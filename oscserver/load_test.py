@@ -0,0 +1,176 @@
+"""Load test for the OSC ingest path of server.py.
+
+Replays Muse band power datagrams into a MuseOscServer (with a dummy
+RabbitMQ publisher) faster than real time, and reports how many datagrams
+were dropped and how long they took to be handled. Latency is measured with
+ping messages interleaved in the stream; the sender runs in the same process
+as the server, so both share the GIL like the real server's threads would.
+
+usage: python3 load_test.py [--speed 10] [--seconds 60] [recording]
+
+The recording is either a capture of raw datagrams (see osc_capture.py) or a
+Muse JSON recording. Without one, random band powers are sent at the Muse's
+10hz.
+"""
+import argparse
+import asyncio
+import json
+import socket
+import threading
+import time
+
+import numpy as np
+
+from osc_capture import read_capture
+from pythonosc.osc_message_builder import OscMessageBuilder
+from server import MuseOscServer, BAND_OFFSETS
+
+PING_ADDRESS = '/loadtest/ping'
+BANDS = ('alpha', 'beta', 'gamma', 'delta', 'theta')
+MUSE_RATE = 10  # band power messages per second and band
+
+
+class NullRabbit(object):
+    """Stands in for RabbitController, counting what would be published."""
+
+    def __init__(self):
+        self.published = 0
+
+    def publish_state(self, state):
+        self.published += 1
+
+    def publish_eegdata(self, values):
+        self.published += 1
+
+    def close(self):
+        pass
+
+
+def build_message(address, values):
+    builder = OscMessageBuilder(address=address)
+    for value in values:
+        builder.add_arg(value)
+    return builder.build().dgram
+
+
+def datagrams_from_muse_json(path):
+    """Returns (time, datagram) pairs for the band powers of a Muse JSON
+    recording, time being seconds since the start of the recording."""
+    with open(path) as f:
+        timeseries = json.load(f)['timeseries']
+    datagrams = []
+    for band in BANDS:
+        series = timeseries[band + '_absolute']
+        address = '/muse/elements/%s_absolute' % band
+        for t, values in zip(series['timestamps'], series['samples']):
+            datagrams.append((t, build_message(address, [float(v) for v in values])))
+    datagrams.sort(key=lambda item: item[0])
+    start = datagrams[0][0] if datagrams else 0
+    return [(t - start, dgram) for t, dgram in datagrams]
+
+
+def datagrams_from_capture(path):
+    """Returns (time, datagram) pairs of a capture file, time being seconds
+    since the first datagram."""
+    datagrams = list(read_capture(path))
+    start = datagrams[0][0] if datagrams else 0
+    return [(t - start, dgram) for t, dgram in datagrams]
+
+
+def synthetic_datagrams(seconds):
+    """Returns (time, datagram) pairs of random band powers."""
+    datagrams = []
+    for i in range(int(seconds * MUSE_RATE)):
+        for address in sorted(BAND_OFFSETS):
+            values = np.random.uniform(0, 1, 4)
+            datagrams.append((i / MUSE_RATE, build_message(address, [float(v) for v in values])))
+    return datagrams
+
+
+def start_server(stage_period):
+    """Starts a MuseOscServer on its own thread, on a free local port."""
+    server = MuseOscServer(('127.0.0.1', 0), loop=asyncio.new_event_loop(), rabbit=NullRabbit(),
+                           stage_period=stage_period)
+    received = []
+    pings = {}
+    server.dispatcher.map('/*', lambda address, *params: received.append(address))
+    server.dispatcher.map(PING_ADDRESS, lambda address, index: pings.setdefault(index, time.perf_counter()))
+    ready = threading.Event()
+
+    def run():
+        server.loop.run_until_complete(server.start())
+        ready.set()
+        try:
+            server.loop.run_forever()
+        finally:
+            server.close()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    ready.wait()
+    return server, thread, received, pings
+
+
+def run(datagrams, speed=10.0, ping_every=10, stage_period=1):
+    """Sends the datagrams to a fresh server at `speed` times their real rate
+    (0 for as fast as possible) and returns a dict of statistics."""
+    server, thread, received, pings = start_server(stage_period)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    address = server.server_address
+
+    sent = 0
+    ping_times = {}
+    start = time.perf_counter()
+    for i, (t, dgram) in enumerate(datagrams):
+        if speed:
+            delay = start + t / speed - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        sock.sendto(dgram, address)
+        sent += 1
+        if i % ping_every == 0:
+            index = len(ping_times)
+            ping_times[index] = time.perf_counter()
+            sock.sendto(build_message(PING_ADDRESS, [index]), address)
+            sent += 1
+    elapsed = time.perf_counter() - start
+    time.sleep(0.5)  # let the server catch up
+    server.stop()
+    thread.join()
+    sock.close()
+
+    latencies = np.array([pings[i] - ping_times[i] for i in pings]) * 1000
+    return {
+        'sent': sent,
+        'received': len(received),
+        'dropped': sent - len(received),
+        'rate': sent / elapsed if elapsed else float('inf'),
+        'latency_ms': np.percentile(latencies, [50, 95, 100]) if len(latencies) else None,
+        'published': server.rabbit.published,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('recording', nargs='?',
+                        help="OSC capture or Muse JSON recording (default: random data)")
+    parser.add_argument('--speed', type=float, default=10,
+                        help="Multiple of the real rate, 0 for as fast as possible")
+    parser.add_argument('--seconds', type=float, default=60, help="Length of the random data")
+    args = parser.parse_args()
+
+    if args.recording and args.recording.endswith('.json'):
+        datagrams = datagrams_from_muse_json(args.recording)
+    elif args.recording:
+        datagrams = datagrams_from_capture(args.recording)
+    else:
+        datagrams = synthetic_datagrams(args.seconds)
+    stats = run(datagrams, args.speed)
+    print("sent %(sent)d datagrams at %(rate).0f/s, received %(received)d, dropped %(dropped)d" % stats)
+    if stats['latency_ms'] is not None:
+        print("latency: %.2f ms median, %.2f ms 95th percentile, %.2f ms max" % tuple(stats['latency_ms']))
+    print("published %(published)d messages" % stats)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""Capture and replay of raw OSC datagrams.
+
+A capture file starts with an 8 byte magic string, followed by one record
+per datagram: the arrival time (float64, unix time) and the datagram length
+(uint32), little endian, then the datagram itself. Records are only ever
+appended and flushed as they're written, so a capture can be extended by
+another session, and a crash of the server loses at most the record being
+written (a truncated last record is skipped when reading).
+
+usage:
+    python3 server.py --capture session.osccap          (record)
+    python3 osc_capture.py info session.osccap
+    python3 osc_capture.py replay session.osccap [--speed 1] [--host] [--port]
+"""
+import argparse
+import mmap
+import os
+import struct
+import time
+
+from pythonosc.udp_client import UDPClient
+
+CAPTURE_MAGIC = b'MMOSCAP1'
+RECORD_HEADER = struct.Struct('<dI')
+
+
+class CaptureWriter(object):
+    """Appends datagrams to a capture file."""
+
+    def __init__(self, path):
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.file = open(path, 'ab')
+        if new:
+            self.file.write(CAPTURE_MAGIC)
+        self.count = 0
+
+    def write(self, dgram, arrival_time=None):
+        if arrival_time is None:
+            arrival_time = time.time()
+        # one write call per record, flushed so it survives a crash
+        self.file.write(RECORD_HEADER.pack(arrival_time, len(dgram)) + dgram)
+        self.file.flush()
+        self.count += 1
+
+    def close(self):
+        self.file.close()
+
+
+def read_capture(path):
+    """Yields (arrival time, datagram) for each record of a capture file.
+    A truncated last record is ignored."""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size <= len(CAPTURE_MAGIC):
+            return
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if data[:len(CAPTURE_MAGIC)] != CAPTURE_MAGIC:
+                raise ValueError("%s is not an OSC capture file" % path)
+            index = len(CAPTURE_MAGIC)
+            while index + RECORD_HEADER.size <= len(data):
+                arrival_time, length = RECORD_HEADER.unpack_from(data, index)
+                index += RECORD_HEADER.size
+                if index + length > len(data):
+                    break
+                yield arrival_time, data[index:index + length]
+                index += length
+        finally:
+            data.close()
+
+
+def replay(path, host='127.0.0.1', port=7000, speed=1.0):
+    """Sends the datagrams of a capture over UDP, keeping their original
+    spacing divided by speed (0 sends as fast as possible). Returns the
+    number of datagrams sent and the elapsed time."""
+    client = UDPClient(host, port)
+    sent = 0
+    start = first = None
+    for arrival_time, dgram in read_capture(path):
+        if start is None:
+            start, first = time.perf_counter(), arrival_time
+        elif speed:
+            delay = start + (arrival_time - first) / speed - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        try:
+            client.send_dgram(dgram)
+        except BlockingIOError:
+            # the client's socket is non blocking; wait for room in the send buffer
+            time.sleep(0.001)
+            client.send_dgram(dgram)
+        sent += 1
+    return sent, (time.perf_counter() - start if start is not None else 0.0)
+
+
+def info(path):
+    count = size = 0
+    first = last = None
+    addresses = {}
+    for arrival_time, dgram in read_capture(path):
+        if first is None:
+            first = arrival_time
+        last = arrival_time
+        count += 1
+        size += len(dgram)
+        address = dgram.split(b'\x00', 1)[0].decode('utf-8', 'replace')
+        addresses[address] = addresses.get(address, 0) + 1
+    duration = (last - first) if count else 0
+    print("%d datagrams, %d bytes, %.1f seconds" % (count, size, duration))
+    for address, n in sorted(addresses.items()):
+        print("  %-40s %d" % (address, n))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+    info_parser = subparsers.add_parser('info', help="Summarize a capture")
+    info_parser.add_argument('path')
+    replay_parser = subparsers.add_parser('replay', help="Send a capture over UDP")
+    replay_parser.add_argument('path')
+    replay_parser.add_argument('--host', default='127.0.0.1')
+    replay_parser.add_argument('--port', type=int, default=7000)
+    replay_parser.add_argument('--speed', type=float, default=1.0,
+                               help="Multiple of the recorded rate, 0 for as fast as possible")
+    args = parser.parse_args()
+
+    if args.command == 'info':
+        info(args.path)
+    else:
+        sent, elapsed = replay(args.path, args.host, args.port, args.speed)
+        print("sent %d datagrams in %.2f seconds" % (sent, elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,6 @@
 """Class that maps OSC addresses to handlers."""
 import collections
+import functools
 import logging
 import re
 
@@ -8,12 +9,40 @@ Handler = collections.namedtuple(
     field_names=('callback', 'args'))
 
 
+# Number of incoming addresses whose resolved handlers are remembered.
+_DEFAULT_CACHE_SIZE = 1024
+
+
+def _pattern_to_regexp(address_pattern):
+  """Compiles an OSC address pattern into a regexp matching mapped addresses."""
+  # '?' in the OSC Address Pattern matches any single character.
+  # Let's consider numbers and _ "characters" too here, it's not said
+  # explicitly in the specification but it sounds good.
+  escaped_address_pattern = re.escape(address_pattern)
+  pattern = escaped_address_pattern.replace('\\?', '\\w?')
+  # '*' in the OSC Address Pattern matches any sequence of zero or more
+  # characters.
+  pattern = pattern.replace('\\*', '[\w|\+]*')
+  # The rest of the syntax in the specification is like the re module so
+  # we're fine.
+  pattern = pattern + '$'
+  return re.compile(pattern)
+
+
 class Dispatcher(object):
-  """Register addresses to handlers and can match vice-versa."""
+  """Register addresses to handlers and can match vice-versa.
 
-  def __init__(self):
-    self._map = collections.defaultdict(list)
+  Exact addresses are looked up in a dict and wildcard mappings are compiled
+  once when mapped. The handlers resolved for an incoming address are kept in
+  a bounded LRU cache, which is cleared whenever the mappings change.
+  """
+
+  def __init__(self, cache_size=_DEFAULT_CACHE_SIZE):
+    self._map = collections.OrderedDict()
+    # Mapped addresses containing '*', with their compiled regexp.
+    self._wildcard_map = collections.OrderedDict()
     self._default_handler = None
+    self._resolve = functools.lru_cache(maxsize=cache_size)(self._resolve_address)
 
   def map(self, address, handler, *args):
     """Map a given address to a handler.
@@ -28,34 +57,40 @@ class Dispatcher(object):
     # TODO: Check the spec:
     # http://opensoundcontrol.org/spec-1_0
     # regarding multiple mappings
-    self._map[address].append(Handler(handler, list(args)))
+    self._map.setdefault(address, []).append(Handler(handler, list(args)))
+    if '*' in address and address not in self._wildcard_map:
+      self._wildcard_map[address] = re.compile(address.replace('*', '[^/]*?/*'))
+    self._resolve.cache_clear()
 
   def handlers_for_address(self, address_pattern):
     """yields Handler namedtuples matching the given OSC pattern."""
-    # First convert the address_pattern into a matchable regexp.
-    # '?' in the OSC Address Pattern matches any single character.
-    # Let's consider numbers and _ "characters" too here, it's not said
-    # explicitly in the specification but it sounds good.
-    escaped_address_pattern = re.escape(address_pattern)
-    pattern = escaped_address_pattern.replace('\\?', '\\w?')
-    # '*' in the OSC Address Pattern matches any sequence of zero or more
-    # characters.
-    pattern = pattern.replace('\\*', '[\w|\+]*')
-    # The rest of the syntax in the specification is like the re module so
-    # we're fine.
-    pattern = pattern + '$'
-    pattern = re.compile(pattern)
-    matched = False
-
-    for addr, handlers in self._map.items():
-      if (pattern.match(addr)
-        or (('*' in addr) and re.match(addr.replace('*','[^/]*?/*'), address_pattern))):
-        yield from handlers
-        matched = True
-
-    if not matched and self._default_handler:
+    yield from self._resolve(address_pattern)
+
+  def _resolve_address(self, address_pattern):
+    """Returns a tuple of the handlers matching the given OSC pattern."""
+    if '?' in address_pattern or '*' in address_pattern:
+      # The pattern has to be tried against every mapped address.
+      pattern = _pattern_to_regexp(address_pattern)
+      matched_addresses = [
+          addr for addr in self._map
+          if pattern.match(addr) or (
+              addr in self._wildcard_map
+              and self._wildcard_map[addr].match(address_pattern))]
+    else:
+      matched_addresses = [
+          addr for addr, regexp in self._wildcard_map.items()
+          if addr != address_pattern and regexp.match(address_pattern)]
+      if address_pattern in self._map:
+        matched_addresses.insert(0, address_pattern)
+
+    handlers = []
+    for addr in matched_addresses:
+      handlers.extend(self._map[addr])
+
+    if not handlers and self._default_handler:
       logging.debug('No handler matched but default handler present, added it.')
-      yield Handler(self._default_handler, [])
+      handlers.append(Handler(self._default_handler, []))
+    return tuple(handlers)
 
   def set_default_handler(self, handler):
     """Sets the default handler.
@@ -64,3 +99,4 @@ class Dispatcher(object):
     or None to unset the default handler.
     """
     self._default_handler = handler
+    self._resolve.cache_clear()
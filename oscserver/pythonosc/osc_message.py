@@ -1,14 +1,49 @@
 """Representation of an OSC message in a pythonesque way."""
 
 import logging
+import struct
 
 from pythonosc.parsing import osc_types
 
+# Struct formats of the parameter types that have a fixed size.
+_NUMERIC_FORMATS = {"i": "i", "f": "f", "d": "d"}
+# Parsing plans by type tag. Senders like the Muse use a handful of type tags
+# for hundreds of messages per second, so the plans are compiled only once.
+_PLANS = {}
+_MAX_PLANS = 256
+
 
 class ParseError(Exception):
   """Base exception raised when a datagram parsing error occurs."""
 
 
+def _compile_plan(type_tag):
+  """Splits a type tag into (types, struct) pairs, where struct unpacks a
+  run of numeric types at once and is None for any other type."""
+  plan = []
+  run = ""
+  for param in type_tag + " ":
+    if param in _NUMERIC_FORMATS:
+      run += param
+      continue
+    if run:
+      fmt = ">" + "".join(_NUMERIC_FORMATS[p] for p in run)
+      plan.append((run, struct.Struct(fmt)))
+      run = ""
+    if param != " ":
+      plan.append((param, None))
+  return tuple(plan)
+
+
+def _get_plan(type_tag):
+  plan = _PLANS.get(type_tag)
+  if plan is None:
+    plan = _compile_plan(type_tag)
+    if len(_PLANS) < _MAX_PLANS:
+      _PLANS[type_tag] = plan
+  return plan
+
+
 class OscMessage(object):
   """Representation of a parsed datagram representing an OSC message.
 
@@ -24,7 +59,7 @@ class OscMessage(object):
   def _parse_datagram(self):
     try:
       self._address_regexp, index = osc_types.get_string(self._dgram, 0)
-      if not self._dgram[index:]:
+      if index >= len(self._dgram):
         # No params is legit, just return now.
         return
 
@@ -35,48 +70,63 @@ class OscMessage(object):
 
       params = []
       param_stack = [params]
-      # Parse each parameter given its type.
-      for param in type_tag:
-        if param == "i":  # Integer.
-          val, index = osc_types.get_int(self._dgram, index)
-        elif param == "f":  # Float.
-          val, index = osc_types.get_float(self._dgram, index)
-        elif param == "d":  # Double.
-          val, index = osc_types.get_double(self._dgram, index)
-        elif param == "s":  # String.
-          val, index = osc_types.get_string(self._dgram, index)
-        elif param == "b":  # Blob.
-          val, index = osc_types.get_blob(self._dgram, index)
-        elif param == "r":  # RGBA.
-          val, index = osc_types.get_rgba(self._dgram, index)
-        elif param == "m":  # MIDI.
-          val, index = osc_types.get_midi(self._dgram, index)
-        elif param == "t":  # osc time tag:
-            val, index = osc_types.get_ttag(self._dgram, index)
-        elif param == "T":  # True.
-          val = True
-        elif param == "F":  # False.
-          val = False
-        elif param == "[":  # Array start.
-          array = []
-          param_stack[-1].append(array)
-          param_stack.append(array)
-        elif param == "]": # Array stop.
-          if len(param_stack) < 2:
-            raise ParseError('Unexpected closing bracket in type tag: {0}'.format(type_tag))
-          param_stack.pop()
-        # TODO: Support more exotic types as described in the specification.
-        else:
-          logging.warning('Unhandled parameter type: {0}'.format(param))
-          continue
-        if param not in "[]":
-          param_stack[-1].append(val)
+      for params_types, fmt in _get_plan(type_tag):
+        if fmt is not None:
+          # A run of numeric parameters, unpacked in place by a single call.
+          try:
+            param_stack[-1].extend(fmt.unpack_from(self._dgram, index))
+            index += fmt.size
+            continue
+          except struct.error:
+            # Too short, let the per type parsers pad or report it.
+            pass
+        for param in params_types:
+          index = self._parse_param(param, index, param_stack, type_tag)
       if len(param_stack) != 1:
         raise ParseError('Missing closing bracket in type tag: {0}'.format(type_tag))
       self._parameters = params
     except osc_types.ParseError as pe:
       raise ParseError('Found incorrect datagram, ignoring it', pe)
 
+  def _parse_param(self, param, index, param_stack, type_tag):
+    """Parses a single parameter given its type and returns the next index."""
+    if param == "i":  # Integer.
+      val, index = osc_types.get_int(self._dgram, index)
+    elif param == "f":  # Float.
+      val, index = osc_types.get_float(self._dgram, index)
+    elif param == "d":  # Double.
+      val, index = osc_types.get_double(self._dgram, index)
+    elif param == "s":  # String.
+      val, index = osc_types.get_string(self._dgram, index)
+    elif param == "b":  # Blob.
+      val, index = osc_types.get_blob(self._dgram, index)
+    elif param == "r":  # RGBA.
+      val, index = osc_types.get_rgba(self._dgram, index)
+    elif param == "m":  # MIDI.
+      val, index = osc_types.get_midi(self._dgram, index)
+    elif param == "t":  # osc time tag:
+        val, index = osc_types.get_ttag(self._dgram, index)
+    elif param == "T":  # True.
+      val = True
+    elif param == "F":  # False.
+      val = False
+    elif param == "[":  # Array start.
+      array = []
+      param_stack[-1].append(array)
+      param_stack.append(array)
+      return index
+    elif param == "]": # Array stop.
+      if len(param_stack) < 2:
+        raise ParseError('Unexpected closing bracket in type tag: {0}'.format(type_tag))
+      param_stack.pop()
+      return index
+    # TODO: Support more exotic types as described in the specification.
+    else:
+      logging.warning('Unhandled parameter type: {0}'.format(param))
+      return index
+    param_stack[-1].append(val)
+    return index
+
   @property
   def address(self):
     """Returns the OSC address regular expression."""
@@ -61,28 +61,25 @@ def get_string(dgram, start_index):
   Raises:
     ParseError if the datagram could not be parsed.
   """
-  offset = 0
+  if start_index < 0:
+    raise ParseError('Could not parse datagram: negative start index')
   try:
-    while dgram[start_index + offset] != 0:
-      offset += 1
-    if offset == 0:
-      raise ParseError(
-          'OSC string cannot begin with a null byte: %s' % dgram[start_index:])
-    # Align to a byte word.
-    if (offset) % _STRING_DGRAM_PAD == 0:
-      offset += _STRING_DGRAM_PAD
-    else:
-      offset += (-offset % _STRING_DGRAM_PAD)
-    # Python slices do not raise an IndexError past the last index,
-    # do it ourselves.
-    if offset > len(dgram[start_index:]):
-      raise ParseError('Datagram is too short')
-    data_str = dgram[start_index:start_index + offset]
-    return data_str.replace(b'\x00', b'').decode('utf-8'), start_index + offset
-  except IndexError as ie:
-    raise ParseError('Could not parse datagram %s' % ie)
-  except TypeError as te:
-    raise ParseError('Could not parse datagram %s' % te)
+    # bytes.index scans in C and doesn't copy the datagram.
+    end_index = dgram.index(b'\x00', start_index)
+  except ValueError:
+    raise ParseError('Could not parse datagram: string is not null terminated')
+  except (TypeError, AttributeError) as e:
+    raise ParseError('Could not parse datagram %s' % e)
+  offset = end_index - start_index
+  if offset == 0:
+    raise ParseError(
+        'OSC string cannot begin with a null byte: %s' % dgram[start_index:])
+  # Align to a byte word.
+  offset += _STRING_DGRAM_PAD - offset % _STRING_DGRAM_PAD
+  if start_index + offset > len(dgram):
+    raise ParseError('Datagram is too short')
+  data_str = dgram[start_index:start_index + offset]
+  return data_str.replace(b'\x00', b'').decode('utf-8'), start_index + offset
 
 
 def write_int(val):
@@ -111,7 +108,7 @@ def get_int(dgram, start_index):
     ParseError if the datagram could not be parsed.
   """
   try:
-    if len(dgram[start_index:]) < _INT_DGRAM_LEN:
+    if len(dgram) - start_index < _INT_DGRAM_LEN:
       raise ParseError('Datagram is too short')
     return (
         struct.unpack('>i',
@@ -139,7 +136,7 @@ def get_ttag(dgram, start_index):
   _TTAG_DGRAM_LEN = 8
 
   try:
-    if len(dgram[start_index:]) < _TTAG_DGRAM_LEN:
+    if len(dgram) - start_index < _TTAG_DGRAM_LEN:
       raise ParseError('Datagram is too short')
 
     seconds, idx = get_int(dgram, start_index)
@@ -187,11 +184,11 @@ def get_float(dgram, start_index):
     ParseError if the datagram could not be parsed.
   """
   try:
-    if len(dgram[start_index:]) < _FLOAT_DGRAM_LEN:
+    if len(dgram) - start_index < _FLOAT_DGRAM_LEN:
       # Noticed that Reaktor doesn't send the last bunch of \x00 needed to make
       # the float representation complete in some cases, thus we pad here to
       # account for that.
-      dgram = dgram + b'\x00' * (_FLOAT_DGRAM_LEN - len(dgram[start_index:]))
+      dgram = dgram + b'\x00' * (_FLOAT_DGRAM_LEN - (len(dgram) - start_index))
     return (
         struct.unpack('>f',
                       dgram[start_index:start_index + _FLOAT_DGRAM_LEN])[0],
@@ -226,7 +223,7 @@ def get_double(dgram, start_index):
     ParseError if the datagram could not be parsed.
   """
   try:
-    if len(dgram[start_index:]) < _DOUBLE_DGRAM_LEN:
+    if len(dgram) - start_index < _DOUBLE_DGRAM_LEN:
       raise ParseError('Datagram is too short')
     return (
         struct.unpack('>d',
@@ -258,7 +255,7 @@ def get_blob(dgram, start_index):
   # Make the size a multiple of 32 bits.
   total_size = size + (-size % _BLOB_DGRAM_PAD)
   end_index = int_offset + size
-  if end_index - start_index > len(dgram[start_index:]):
+  if end_index > len(dgram):
     raise ParseError('Datagram is too short.')
   return dgram[int_offset:int_offset + size], int_offset + total_size
 
@@ -300,7 +297,7 @@ def get_date(dgram, start_index):
   # Check for the special case first.
   if dgram[start_index:start_index + _DATE_DGRAM_LEN] == ntp.IMMEDIATELY:
     return IMMEDIATELY, start_index + _DATE_DGRAM_LEN
-  if len(dgram[start_index:]) < _DATE_DGRAM_LEN:
+  if len(dgram) - start_index < _DATE_DGRAM_LEN:
     raise ParseError('Datagram is too short')
   num_secs, start_index = get_int(dgram, start_index)
   fraction, start_index = get_int(dgram, start_index)
@@ -348,7 +345,7 @@ def get_rgba(dgram, start_index):
     ParseError if the datagram could not be parsed.
   """
   try:
-    if len(dgram[start_index:]) < _INT_DGRAM_LEN:
+    if len(dgram) - start_index < _INT_DGRAM_LEN:
       raise ParseError('Datagram is too short')
     return (
         struct.unpack('>I',
@@ -390,7 +387,7 @@ def get_midi(dgram, start_index):
     ParseError if the datagram could not be parsed.
   """
   try:
-    if len(dgram[start_index:]) < _INT_DGRAM_LEN:
+    if len(dgram) - start_index < _INT_DGRAM_LEN:
       raise ParseError('Datagram is too short')
     val = struct.unpack('>I',
                         dgram[start_index:start_index + _INT_DGRAM_LEN])[0]
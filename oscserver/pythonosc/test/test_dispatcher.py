@@ -119,5 +119,19 @@ class TestDispatcher(unittest.TestCase):
     self.sortAndAssertSequenceEqual(
         [dispatcher.Handler(1, []), dispatcher.Handler(2, [])], self.dispatcher.handlers_for_address("/foo/bar"))
 
+  def test_map_after_lookup_invalidates_cache(self):
+    self.dispatcher.map('/foo/bar', 1)
+    self.sortAndAssertSequenceEqual(
+        [(1, [])], self.dispatcher.handlers_for_address("/foo/bar"))
+    self.dispatcher.map('/foo/*', 2)
+    self.dispatcher.map('/foo/bar', 3)
+    self.sortAndAssertSequenceEqual(
+        [(1, []), (2, []), (3, [])], self.dispatcher.handlers_for_address("/foo/bar"))
+
+  def test_default_handler_change_invalidates_cache(self):
+    self.sortAndAssertSequenceEqual([], self.dispatcher.handlers_for_address('/test'))
+    self.dispatcher.set_default_handler(1)
+    self.sortAndAssertSequenceEqual([(1, [])], self.dispatcher.handlers_for_address('/test'))
+
 if __name__ == "__main__":
   unittest.main()
@@ -19,6 +19,15 @@ class TestUdpClient(unittest.TestCase):
     self.assertTrue(mock_socket.sendto.called)
     mock_socket.sendto.assert_called_once_with(msg.dgram, ('::1', 31337))
 
+  @mock.patch('socket.socket')
+  def test_send_dgram(self, mock_socket_ctor):
+    mock_socket = mock_socket_ctor.return_value
+    client = udp_client.UDPClient('::1', 31337)
+
+    client.send_dgram(b'/\x00\x00\x00')
+
+    mock_socket.sendto.assert_called_once_with(b'/\x00\x00\x00', ('::1', 31337))
+
 
 class TestSimpleUdpClient(unittest.TestCase):
 
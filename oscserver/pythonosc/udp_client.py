@@ -1,6 +1,6 @@
 """Client to send OSC datagrams to an OSC server via UDP."""
 
-from collections import Iterable
+from collections.abc import Iterable
 import socket
 
 from .osc_message_builder import OscMessageBuilder
@@ -24,7 +24,11 @@ class UDPClient(object):
 
   def send(self, content):
     """Sends an OscBundle or OscMessage to the server."""
-    self._sock.sendto(content.dgram, (self._address, self._port))
+    self.send_dgram(content.dgram)
+
+  def send_dgram(self, dgram):
+    """Sends an already built datagram to the server."""
+    self._sock.sendto(dgram, (self._address, self._port))
 
 
 class SimpleUDPClient(UDPClient):
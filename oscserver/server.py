@@ -1,116 +1,146 @@
 import argparse
+import asyncio
 import logging
 import numpy as np
-import socketserver
-import sys
 import signal
+from concurrent.futures import ThreadPoolExecutor
 
-from pythonosc.osc_bundle import OscBundle
-from pythonosc.osc_message import OscMessage
-from collections import deque
-from statsmodels.tsa import arima_model
-from threading import Thread, Lock, Event
+from pythonosc import osc_packet
+from pythonosc.dispatcher import Dispatcher
 
+from osc_capture import CaptureWriter
 from rabbit_controller import RabbitController
+from stage_estimators import get_estimator, DEFAULT_PERIODS
 
-QUEUE_SIZE = 300  # band powers are calculated at 10hz, storing a 30 seconds worth of data in dequeue
+QUEUE_SIZE = 300  # band powers are calculated at 10hz, estimating over 30 seconds worth of data
 
-EMIT_STAGE_PERIOD_SECONDS = 60  # evaluating stages every 3 minutes
+DEFAULT_ESTIMATOR = 'rls'  # online model, see stage_estimators.py
 EMIT_EEGDATA_PERIOD_SECONDS = 1  # evaluating eegdata every second
-ARIMA_PARAMS = (4, 0, 1)
+# offset of each band's 4 channel values in raw_values
+BAND_OFFSETS = {
+    '/muse/elements/alpha_absolute': 0,
+    '/muse/elements/beta_absolute': 4,
+    '/muse/elements/gamma_absolute': 8,
+    '/muse/elements/delta_absolute': 12,
+    '/muse/elements/theta_absolute': 16,
+}
 LOWER_THRESHOLD = -0.04
 UPPER_THRESHOLD = 0.01
 
 logger = logging.getLogger(__name__)
 
 
-class suppress_stdout:
-    def __enter__(self):
-        self.stdout = sys.stdout
-        sys.stdout = None
-
-    def __exit__(self, type, value, traceback):
-        sys.stdout = self.stdout
-
-
-class OscUDPHandler(socketserver.BaseRequestHandler):
-
-    def handle(self):
-        dgram = self.request[0]
-        with suppress_stdout():
-            message = OscBundle(dgram).content(0) \
-                if OscBundle.dgram_is_bundle(dgram) \
-                else OscMessage(dgram)
-        logger.info('{address} {params}'.format(address=message.address, 
-                                                params=message.params))
-        if message.address == '/muse/elements/alpha_absolute':
-            # print('got alpha ' + str(message.params))
-            self.server.queue.append(np.mean(message.params[1:3]))  # storing mean value of abs_alpha in
-            #  channels 2 and 3
-            self.server.raw_values[0:4] = message.params # set alpha
-        elif message.address == '/muse/elements/beta_absolute':
-            # print('got beta ' + str(message.params))
-            self.server.raw_values[4:8] = message.params # set beta
-        elif message.address == '/muse/elements/gamma_absolute':
-            # print('got gamma ' + str(message.params))
-            self.server.raw_values[8:12] = message.params # set gamma
-        elif message.address == '/muse/elements/delta_absolute':
-            # print('got delta ' + str(message.params))
-            self.server.raw_values[12:16] = message.params # set delta
-        elif message.address == '/muse/elements/theta_absolute':
-            # print('got theta ' + str(message.params))
-            self.server.raw_values[16:20] = message.params # set theta
-        elif message.address == '/muse/elements/blink':
-            self.server.increment_blink()
-            self.server.raw_values[20] = self.server.blink_events # set blink
-        elif message.address == '/muse/acc':
-            pass
-            # think how to store accelerometer data, we'll need it to detect if person moved too much
-
-
-class OscUDPServer(socketserver.UDPServer):
-    def __init__(self, server_address):
-        super().__init__(server_address, OscUDPHandler)
-
-
-class ThreadingOscUDPServer(socketserver.ThreadingMixIn, OscUDPServer):
-
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        signal.signal(signal.SIGINT, self._signal_handler)
-        self.rabbit = RabbitController('localhost', 5672, 'guest', 'guest', '/')
-        self.queue = deque(maxlen=QUEUE_SIZE)  # we only use append, therefore no need in queue.Queue
+def dispatch_packet(data, dispatcher):
+    """Calls the handlers of every message in an OSC packet right away.
+
+    pythonosc's servers sleep until a bundle's timetag is due, which on the
+    event loop would freeze the whole server whenever the sender's clock is
+    ahead. The Muse stream is live, so timetags are ignored."""
+    try:
+        packet = osc_packet.OscPacket(data)
+    except osc_packet.ParseError:
+        return
+    for timed_msg in packet.messages:
+        message = timed_msg.message
+        for handler in dispatcher.handlers_for_address(message.address):
+            if handler.args:
+                handler.callback(message.address, handler.args, *message)
+            else:
+                handler.callback(message.address, *message)
+
+
+class MuseProtocol(asyncio.DatagramProtocol):
+    """Dispatches datagrams on the loop thread, appending them to a capture
+    first if there is one."""
+
+    def __init__(self, dispatcher, capture=None):
+        self.dispatcher = dispatcher
+        self.capture = capture
+
+    def datagram_received(self, data, addr):
+        if self.capture is not None:
+            self.capture.write(data)
+        dispatch_packet(data, self.dispatcher)
+
+
+class MuseOscServer(object):
+    """Receives the Muse OSC stream on an asyncio event loop.
+
+    Datagrams are handled on the loop thread, so raw_values and the blink
+    counter need no locking. Stage prediction and EEG data publishing are
+    tasks on the same loop; estimator scoring (which can be slow, e.g. with
+    ARIMA) runs in an executor."""
+
+    def __init__(self, server_address, loop=None, binary_eegdata=False, estimator=DEFAULT_ESTIMATOR,
+                 stage_period=None, rabbit=None, capture=None):
+        self.loop = loop or asyncio.new_event_loop()
+        self.estimator = get_estimator(estimator, window=QUEUE_SIZE)
+        # seconds between stage evaluations
+        self.stage_period = stage_period or DEFAULT_PERIODS[estimator]
+        if rabbit is None:
+            rabbit = RabbitController('localhost', 5672, 'guest', 'guest', '/', threaded=True,
+                                      binary_eegdata=binary_eegdata)
+        self.rabbit = rabbit
         self.blink_events = 0  # counter of blink events
         self.state = None
         self.raw_values = [0] * 22
-        self.lock = Lock()
-        self._stop = Event()
-        self._timer_thread = None
+        self.dispatcher = self.build_dispatcher()
+        self.listen_address = server_address
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        # raw datagrams are appended to this file, see osc_capture.py
+        self.capture = CaptureWriter(capture) if capture else None
+        self.transport = None
+        self.tasks = []
+
+    def build_dispatcher(self):
+        dispatcher = Dispatcher()
+        for address, offset in BAND_OFFSETS.items():
+            dispatcher.map(address, self.set_band, offset)
+        dispatcher.map('/muse/elements/alpha_absolute', self.update_alpha)
+        dispatcher.map('/muse/elements/blink', self.on_blink)
+        # think how to store accelerometer data from /muse/acc, we'll need it to detect if person moved too much
+        return dispatcher
+
+    @property
+    def server_address(self):
+        return self.transport.get_extra_info('sockname')
+
+    def set_band(self, address, args, *params):
+        offset = args[0]
+        self.raw_values[offset:offset + 4] = params
+
+    def update_alpha(self, address, *params):
+        alpha = np.mean(params[1:3])  # mean value of abs_alpha in channels 2 and 3
+        self.estimator.update(alpha)
+
+    def on_blink(self, address, *params):
+        self.blink_events += 1
+        self.raw_values[20] = self.blink_events # set blink
+
+    async def start(self):
+        self.transport, _ = await self.loop.create_datagram_endpoint(
+            lambda: MuseProtocol(self.dispatcher, self.capture),
+            local_addr=self.listen_address)
         self.start_emitting_messages()
 
-    def increment_blink(self):
-        with self.lock:
-            self.blink_events += 1
-
-    def _signal_handler(self, _, unused_frame):
-        self._stop.set()
-
     def start_emitting_messages(self):
         self.state = 1
         self.rabbit.publish_state(self.state)
-        Thread(target=self.predict_next_level, daemon=True).start()
-        Thread(target=self.update_rawvalues, daemon=True).start()
-
-    def predict_next_level(self):
-        while not self._stop.is_set():
-            self._stop.wait(EMIT_STAGE_PERIOD_SECONDS)
-            data = np.array(self.queue, dtype=np.float64)
-            model = arima_model.ARIMA(data, order=ARIMA_PARAMS)
-            model = model.fit(disp=0)
-            forecast = model.predict(start=1, end=20)
-            data_filtered = data[np.where(np.logical_and(np.greater_equal(data, np.percentile(data, 5)),
-                                                         np.less_equal(data, np.percentile(data, 95))))]
-            mean_diff = np.mean(forecast) - np.mean(data_filtered)
+        self.tasks = [self.loop.create_task(self.predict_next_level()),
+                      self.loop.create_task(self.update_rawvalues())]
+
+    async def predict_next_level(self):
+        while True:
+            await asyncio.sleep(self.stage_period)
+            try:
+                mean_diff = await self.loop.run_in_executor(self.executor, self.estimator.score)
+            except Exception as e:
+                # e.g. an ARIMA fit that didn't converge
+                logger.warning("stage estimation failed: %s", e)
+                continue
+            if mean_diff is None:
+                # not enough data yet
+                continue
             # add more logic there considering movement and blinks
             if mean_diff > UPPER_THRESHOLD:
                 self.state = min(self.state + 1, 5)
@@ -120,19 +150,35 @@ class ThreadingOscUDPServer(socketserver.ThreadingMixIn, OscUDPServer):
             # send to the bus
             print("[ ] EMITTING STATE: %s" %(self.state))
             self.rabbit.publish_state(self.state)
+            self.blink_events = 0
 
-            with self.lock:
-                self.blink_events = 0
-
-    def update_rawvalues(self):
-        while not self._stop.is_set():
-            self._stop.wait(EMIT_EEGDATA_PERIOD_SECONDS)
-            # set state in raw_valceiceilues
+    async def update_rawvalues(self):
+        while True:
+            await asyncio.sleep(EMIT_EEGDATA_PERIOD_SECONDS)
+            # set state in raw_values
             self.raw_values[21] = int(self.state)
             # send to the bus
             print("[ ] EMITTING EEGDATA: %s" %(self.raw_values))
             self.rabbit.publish_eegdata(self.raw_values)
 
+    def stop(self):
+        """Stops the event loop. Can be called from any thread."""
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+    def close(self):
+        for task in self.tasks:
+            task.cancel()
+        if self.tasks:
+            self.loop.run_until_complete(asyncio.gather(*self.tasks, return_exceptions=True))
+        self.tasks = []
+        if self.transport is not None:
+            self.transport.close()
+        self.executor.shutdown()
+        if self.capture is not None:
+            self.capture.close()
+        self.rabbit.close()
+        self.loop.close()
+
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
@@ -140,13 +186,27 @@ if __name__ == '__main__':
                         default="0.0.0.0", help="The ip to listen on")
     parser.add_argument("--port",
                         type=int, default=7000, help="The port to listen on")
+    parser.add_argument("--binary-eegdata", action="store_true",
+                        help="Publish EEG data in the compact binary format instead of JSON "
+                             "(only understood by the python consumers)")
+    parser.add_argument("--estimator", default=DEFAULT_ESTIMATOR, choices=sorted(DEFAULT_PERIODS),
+                        help="Meditation stage estimator")
+    parser.add_argument("--stage-period", type=float,
+                        help="Seconds between stage evaluations (default depends on the estimator)")
+    parser.add_argument("--capture", metavar="PATH",
+                        help="Append the raw OSC datagrams to a capture file (see osc_capture.py)")
     args = parser.parse_args()
 
     logging.basicConfig(level=logging.WARNING,
                         format='%(asctime)s %(levelname)-8s %(message)s')
 
-    server = ThreadingOscUDPServer((args.ip, args.port))
+    server = MuseOscServer((args.ip, args.port), binary_eegdata=args.binary_eegdata,
+                           estimator=args.estimator, stage_period=args.stage_period,
+                           capture=args.capture)
+    server.loop.add_signal_handler(signal.SIGINT, server.stop)
+    server.loop.run_until_complete(server.start())
     print("Serving on {}".format(server.server_address))
-
-    server.serve_forever()
-    self._stop.set()
+    try:
+        server.loop.run_forever()
+    finally:
+        server.close()
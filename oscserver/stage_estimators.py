@@ -0,0 +1,216 @@
+"""Estimators deciding whether the meditation stage goes up or down.
+
+Each estimator is fed one alpha power value per OSC sample through update()
+and returns a trend score from score(): the mean of the forecast minus the
+mean of recent data. The server compares it with its thresholds.
+"""
+import logging
+import sys
+from collections import deque
+from threading import Lock
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FORECAST_STEPS = 20  # samples forecasted when scoring (2 seconds at 10hz)
+
+
+class StageEstimator(object):
+    """Base class. Subclasses implement _update, _snapshot and _score;
+    locking is done here. The server feeds samples from its event loop while
+    score() runs in an executor thread. Only copying the model state is
+    done under the lock, so a slow score never holds up updates."""
+
+    def __init__(self):
+        self._lock = Lock()
+
+    def update(self, value):
+        with self._lock:
+            self._update(float(value))
+
+    def score(self):
+        """Returns the trend score, or None if there's not enough data."""
+        with self._lock:
+            state = self._snapshot()
+        return self._score(state)
+
+    def _update(self, value):
+        raise NotImplementedError
+
+    def _snapshot(self):
+        """Returns a copy of whatever _score needs."""
+        raise NotImplementedError
+
+    def _score(self, state):
+        raise NotImplementedError
+
+
+class RLSEstimator(StageEstimator):
+    """Autoregressive model with intercept, fitted online by recursive least
+    squares with exponential forgetting. Each update is O(order^2), i.e.
+    constant per sample, so the stage can be evaluated every few seconds.
+
+    The reference level is a running mean over the last `window` samples,
+    comparable to the filtered data mean used with ARIMA."""
+
+    def __init__(self, order=4, forgetting=0.995, window=300, delta=100.0):
+        super(RLSEstimator, self).__init__()
+        self.order = order
+        self.forgetting = forgetting
+        n = order + 1
+        self.coefs = np.zeros(n)
+        self.P = np.eye(n) * delta  # inverse correlation matrix
+        self.regressor = np.zeros(n)
+        self.regressor[0] = 1.0  # intercept
+        self.count = 0
+        self.window = deque(maxlen=window)
+        self.window_sum = 0.0
+
+    def _update(self, value):
+        if not np.isfinite(value):
+            return
+        if self.count >= self.order:
+            x = self.regressor
+            Px = self.P.dot(x)
+            gain = Px / (self.forgetting + x.dot(Px))
+            self.coefs += gain * (value - x.dot(self.coefs))
+            self.P = (self.P - np.outer(gain, Px)) / self.forgetting
+        # shift the lagged values
+        self.regressor[2:] = self.regressor[1:-1]
+        self.regressor[1] = value
+        self.count += 1
+
+        if len(self.window) == self.window.maxlen:
+            self.window_sum -= self.window[0]
+        self.window.append(value)
+        self.window_sum += value
+
+    def forecast(self, steps=FORECAST_STEPS, coefs=None, lags=None):
+        """Iterates the model steps samples ahead, by default from its
+        current state."""
+        if coefs is None:
+            coefs = self.coefs
+        lags = (self.regressor[1:] if lags is None else lags).copy()
+        out = np.empty(steps)
+        for i in range(steps):
+            y = coefs[0] + coefs[1:].dot(lags)
+            lags[1:] = lags[:-1]
+            lags[0] = y
+            out[i] = y
+        return out
+
+    def _snapshot(self):
+        if self.count <= 2 * (self.order + 1):
+            return None
+        return (self.coefs.copy(), self.regressor[1:].copy(),
+                self.window_sum / len(self.window))
+
+    def _score(self, state):
+        if state is None:
+            return None
+        coefs, lags, mean = state
+        return float(np.mean(self.forecast(coefs=coefs, lags=lags)) - mean)
+
+
+class ARIMAEstimator(StageEstimator):
+    """Refits a statsmodels ARIMA model over the last `window` samples on
+    every score() call. Slow (and statsmodels is only needed for this one),
+    so use it with a long evaluation period."""
+
+    def __init__(self, order=(4, 0, 1), window=300):
+        super(ARIMAEstimator, self).__init__()
+        try:
+            from statsmodels.tsa.arima.model import ARIMA
+            self.fit = lambda data: ARIMA(data, order=self.order).fit()
+        except ImportError:
+            # statsmodels < 0.12 only has the old implementation, which was
+            # removed in 0.13
+            from statsmodels.tsa.arima_model import ARIMA
+            self.fit = lambda data: ARIMA(data, order=self.order).fit(disp=0)
+        self.order = order
+        self.data = deque(maxlen=window)
+
+    def _update(self, value):
+        self.data.append(value)
+
+    def _snapshot(self):
+        return np.array(self.data, dtype=np.float64)
+
+    def _score(self, data):
+        if len(data) <= sum(self.order) + 1:
+            return None
+        forecast = self.fit(data).predict(start=1, end=FORECAST_STEPS)
+        data_filtered = data[np.where(np.logical_and(np.greater_equal(data, np.percentile(data, 5)),
+                                                     np.less_equal(data, np.percentile(data, 95))))]
+        return float(np.mean(forecast) - np.mean(data_filtered))
+
+
+ESTIMATORS = {
+    'rls': RLSEstimator,
+    'arima': ARIMAEstimator,
+}
+
+# evaluation period that suits each estimator, in seconds
+DEFAULT_PERIODS = {
+    'rls': 5,
+    'arima': 60,
+}
+
+
+def get_estimator(name, **kwargs):
+    try:
+        cls = ESTIMATORS[name]
+    except KeyError:
+        raise ValueError("Unknown estimator: %s (choose from %s)" % (name, ", ".join(sorted(ESTIMATORS))))
+    return cls(**kwargs)
+
+
+def alpha_from_muse_json(path):
+    """Reads the alpha values the server would see from a Muse JSON
+    recording (mean absolute alpha of channels 2 and 3)."""
+    import json
+    with open(path) as f:
+        samples = json.load(f)['timeseries']['alpha_absolute']['samples']
+    return np.mean(np.asarray(samples, dtype=np.float64)[:, 1:3], axis=1)
+
+
+def benchmark(path, names=None, period_samples=50):
+    """Feeds a recording through each estimator, scoring every
+    period_samples samples. Prints the time spent per update and per score,
+    and returns the scores of each estimator."""
+    import time
+    values = alpha_from_muse_json(path)
+    results = {}
+    for name in names or sorted(ESTIMATORS):
+        try:
+            estimator = get_estimator(name)
+        except ImportError as e:
+            print("%s: skipped (%s)" % (name, e))
+            continue
+        update_time = score_time = 0.0
+        scores = []
+        for i, value in enumerate(values):
+            t = time.time()
+            estimator.update(value)
+            update_time += time.time() - t
+            if (i + 1) % period_samples == 0:
+                t = time.time()
+                try:
+                    scores.append(estimator.score())
+                except Exception as e:
+                    # ARIMA fits don't always converge
+                    scores.append(None)
+                    logger.warning("%s failed to score: %s", name, e)
+                score_time += time.time() - t
+        results[name] = scores
+        print("%s: %d samples, %.1f us/update, %.2f ms/score over %d scores"
+              % (name, len(values), update_time / max(len(values), 1) * 1e6,
+                 score_time / max(len(scores), 1) * 1e3, len(scores)))
+    return results
+
+
+if __name__ == '__main__':
+    for path in sys.argv[1:]:
+        print(path)
+        benchmark(path)
@@ -0,0 +1,80 @@
+import os
+import shutil
+import socket
+import tempfile
+import unittest
+
+import osc_capture
+from osc_capture import CaptureWriter, read_capture, replay
+
+DGRAMS = [b'/muse/elements/blink\x00\x00\x00\x00,i\x00\x00\x00\x00\x00\x01',
+          b'/ping\x00\x00\x00,i\x00\x00\x00\x00\x00\x02',
+          b'#bundle\x00' + b'\x00' * 8]
+
+
+class TestCapture(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'test.osccap')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, dgrams, start=0.0):
+        writer = CaptureWriter(self.path)
+        try:
+            for i, dgram in enumerate(dgrams):
+                writer.write(dgram, start + i * 0.1)
+        finally:
+            writer.close()
+
+    def test_roundtrip(self):
+        self.write(DGRAMS[:2])
+        # a later session appends without another header
+        self.write(DGRAMS[2:], start=10.0)
+        records = list(read_capture(self.path))
+        self.assertEqual([dgram for _, dgram in records], DGRAMS)
+        self.assertEqual([t for t, _ in records], [0.0, 0.1, 10.0])
+
+    def test_flushed(self):
+        writer = CaptureWriter(self.path)
+        try:
+            writer.write(DGRAMS[0], 1.0)
+            # readable while the writer is still open
+            self.assertEqual(list(read_capture(self.path)), [(1.0, DGRAMS[0])])
+        finally:
+            writer.close()
+
+    def test_truncated(self):
+        self.write(DGRAMS)
+        with open(self.path, 'r+b') as f:
+            f.truncate(os.path.getsize(self.path) - 3)
+        self.assertEqual([dgram for _, dgram in read_capture(self.path)], DGRAMS[:2])
+
+    def test_not_a_capture(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'garbage!' * 4)
+        self.assertRaises(ValueError, list, read_capture(self.path))
+
+    def test_replay(self):
+        self.write(DGRAMS)
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind(('127.0.0.1', 0))
+        sock.settimeout(2)
+        try:
+            sent, elapsed = replay(self.path, *sock.getsockname(), speed=0)
+            self.assertEqual(sent, len(DGRAMS))
+            self.assertEqual([sock.recv(1024) for dgram in DGRAMS], DGRAMS)
+        finally:
+            sock.close()
+
+    def test_magic(self):
+        self.write([])
+        with open(self.path, 'rb') as f:
+            self.assertEqual(f.read(), osc_capture.CAPTURE_MAGIC)
+        self.assertEqual(list(read_capture(self.path)), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
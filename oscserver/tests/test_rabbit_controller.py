@@ -0,0 +1,195 @@
+import json
+import time
+import unittest
+
+try:
+    import rabbit_controller
+    from rabbit_controller import RabbitController
+except ImportError:  # needs pika
+    rabbit_controller = None
+
+
+if rabbit_controller is not None:
+    class StubController(RabbitController):
+        """Records what would be published instead of talking to a broker."""
+
+        def __init__(self, *args, **kwargs):
+            self.published = []
+            self.failing = False
+            self.attempts = 0
+            super().__init__('localhost', 5672, 'guest', 'guest', '/', *args, **kwargs)
+
+        def _publish_once(self, queue_name, properties, body):
+            self.attempts += 1
+            if self.failing:
+                raise IOError("broker down")
+            self.published.append((time.time(), queue_name, body))
+
+
+@unittest.skipIf(rabbit_controller is None, "needs pika")
+class TestOutbox(unittest.TestCase):
+    """The outbox is filled as with threaded=True, but emptied by the test
+    instead of the publisher thread."""
+
+    def setUp(self):
+        self.controller = StubController(max_rate=20)
+        self.controller.threaded = True
+
+    def test_coalesce(self):
+        c = self.controller
+        for i in range(3):
+            c.publish_eegdata([i] * 4)
+            c.publish_heart(60 + i)
+        due = c._take_due()
+        self.assertEqual([queue for queue, _, _ in due], [c.EXCHANGE_EEGDATA, c.EXCHANGE_HEART])
+        self.assertEqual(due[0][2].Values, [2] * 4)
+        self.assertEqual(due[1][2].HeartRate, 62)
+        self.assertFalse(c.outbox)
+
+    def test_fifo(self):
+        c = self.controller
+        for state in (1, 2, 3):
+            c.publish_state(state)
+        c.publish_eegdata([0] * 4)
+        due = c._take_due()
+        states = [command.State for queue, _, command in due if queue == c.EXCHANGE_STATE]
+        self.assertEqual(states, [1, 2, 3])
+        self.assertEqual(len(due), 4)
+
+    def test_fifo_limit(self):
+        c = self.controller
+        for state in range(rabbit_controller.PUBLISH_QUEUE_SIZE + 2):
+            c.publish_state(state)
+        due = c._take_due()
+        self.assertEqual(len(due), rabbit_controller.PUBLISH_QUEUE_SIZE)
+        # the oldest ones are dropped
+        self.assertEqual(due[0][2].State, 2)
+
+    def test_max_rate(self):
+        c = self.controller
+        c.publish_eegdata([0] * 4)
+        c._take_due()
+        c.publish_eegdata([1] * 4)
+        start = time.time()
+        due = c._take_due()
+        # waits for the rest of the 1/20s interval of that queue
+        self.assertGreaterEqual(time.time() - start, 0.04)
+        self.assertEqual(due[0][2].Values, [1] * 4)
+        # other queues aren't held up
+        c.publish_eegdata([2] * 4)
+        c.publish_state(1)
+        due = c._take_due()
+        self.assertEqual([queue for queue, _, _ in due], [c.EXCHANGE_STATE])
+
+    def test_close_flushes(self):
+        c = self.controller
+        c.publish_eegdata([0] * 4)
+        c._take_due()
+        c.publish_eegdata([1] * 4)
+        c.closing = True
+        # pending coalesced messages go out at once when closing
+        self.assertEqual(len(c._take_due()), 1)
+        self.assertIsNone(c._take_due())
+
+
+@unittest.skipIf(rabbit_controller is None, "needs pika")
+class TestPublishing(unittest.TestCase):
+
+    def test_thread(self):
+        c = StubController(threaded=True, max_rate=10)
+        try:
+            for i in range(20):
+                c.publish_eegdata([i] * 4)
+                c.publish_state(i)
+                time.sleep(0.01)
+        finally:
+            c.close()
+        eegdata = [(t, json.loads(body)) for t, queue, body in c.published
+                   if queue == c.EXCHANGE_EEGDATA]
+        states = [json.loads(body)['State'] for _, queue, body in c.published
+                  if queue == c.EXCHANGE_STATE]
+        self.assertEqual(states, list(range(20)))
+        self.assertLess(len(eegdata), 20)
+        times = [t for t, _ in eegdata]
+        self.assertTrue(all(t1 - t0 >= 0.09 for t0, t1 in zip(times, times[1:])))
+        # the last value is never coalesced away
+        self.assertEqual(eegdata[-1][1]['Values'], [19] * 4)
+
+    def test_backoff(self):
+        c = StubController()
+        c.failing = True
+        self.assertRaises(IOError, c._send, c.EXCHANGE_STATE, c.state_props, '1')
+        # reconnected and retried once, then backed off
+        self.assertEqual(c.attempts, 2)
+        self.assertEqual(c.backoff, rabbit_controller.MIN_BACKOFF_SECONDS)
+        self.assertGreater(c.retry_at, time.time())
+        # no retry while backing off
+        self.assertRaises(IOError, c._send, c.EXCHANGE_STATE, c.state_props, '1')
+        self.assertEqual(c.attempts, 3)
+        # the delay doubles on every failed retry, up to the maximum
+        delays = []
+        for i in range(8):
+            c.retry_at = 0
+            self.assertRaises(IOError, c._send, c.EXCHANGE_STATE, c.state_props, '1')
+            delays.append(c.backoff)
+        self.assertEqual(delays, [2, 4, 8, 16, 30, 30, 30, 30])
+        c.failing = False
+        c._send(c.EXCHANGE_STATE, c.state_props, '2')
+        self.assertEqual([body for _, _, body in c.published], ['2'])
+
+
+
+class Properties(object):
+    def __init__(self, content_type=None):
+        self.content_type = content_type
+
+
+@unittest.skipIf(rabbit_controller is None, "needs pika")
+class TestEEGDataFormat(unittest.TestCase):
+
+    def setUp(self):
+        self.values = [0.5, -1.25, 3.0, 0.1] + [0] * 16 + [7, 2]
+        self.command = rabbit_controller.EEGDataCommand(self.values)
+
+    def test_binary_roundtrip(self):
+        body = self.command.to_binary(42)
+        self.assertEqual(len(body), rabbit_controller.EEGDATA_HEADER.size + 4 * len(self.values))
+        decoded = rabbit_controller.EEGDataCommand.from_binary(body)
+        self.assertEqual(decoded.sequence, 42)
+        self.assertEqual(decoded.timestamp, self.command.timestamp)
+        # float32: exact for these values, close for 0.1
+        self.assertEqual(list(decoded.Values[:3]), self.values[:3])
+        self.assertAlmostEqual(decoded.Values[3], 0.1, 6)
+        self.assertEqual(list(decoded.Values[4:]), self.values[4:])
+
+    def test_json(self):
+        body = self.command.to_json()
+        self.assertEqual(sorted(json.loads(body)), ['CommandId', 'Values'])
+        decoded = rabbit_controller.EEGDataCommand.from_string(body)
+        self.assertEqual(decoded.Values, self.values)
+        self.assertIsNone(decoded.sequence)
+
+    def test_from_message(self):
+        binary = Properties(rabbit_controller.EEGDATA_CONTENT_TYPE)
+        decoded = rabbit_controller.EEGDataCommand.from_message(binary, self.command.to_binary(1))
+        self.assertEqual(decoded.sequence, 1)
+        for properties in (Properties(rabbit_controller.JSON_CONTENT_TYPE), Properties(), None):
+            decoded = rabbit_controller.EEGDataCommand.from_message(properties, self.command.to_json())
+            self.assertEqual(decoded.Values, self.values)
+
+    def test_encode(self):
+        json_controller = StubController()
+        binary_controller = StubController(binary_eegdata=True)
+        for i in range(2):
+            json_controller.publish_eegdata(self.values)
+            binary_controller.publish_eegdata(self.values)
+        json_bodies = [body for _, _, body in json_controller.published]
+        self.assertEqual([json.loads(body)['Values'] for body in json_bodies], [self.values] * 2)
+        # binary messages are numbered as they're sent
+        binary_bodies = [body for _, _, body in binary_controller.published]
+        self.assertEqual([rabbit_controller.EEGDataCommand.from_binary(body).sequence
+                          for body in binary_bodies], [1, 2])
+
+
+if __name__ == '__main__':
+    unittest.main()
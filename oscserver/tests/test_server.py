@@ -0,0 +1,56 @@
+import time
+import unittest
+
+from pythonosc.dispatcher import Dispatcher
+from pythonosc.osc_bundle_builder import OscBundleBuilder
+from pythonosc.osc_message_builder import OscMessageBuilder
+
+try:
+    import server
+except ImportError:  # rabbit_controller needs pika
+    server = None
+
+
+def build_message(address, *values):
+    builder = OscMessageBuilder(address)
+    for value in values:
+        builder.add_arg(value)
+    return builder.build()
+
+
+@unittest.skipIf(server is None, "needs pika")
+class TestDispatchPacket(unittest.TestCase):
+
+    def setUp(self):
+        self.received = []
+        self.dispatcher = Dispatcher()
+        self.dispatcher.map('/muse/elements/blink', self.handler)
+        self.dispatcher.map('/muse/elements/alpha_absolute', self.handler, 'alpha')
+
+    def handler(self, address, *args):
+        self.received.append((address,) + args)
+
+    def test_message(self):
+        server.dispatch_packet(build_message('/muse/elements/blink', 1).dgram, self.dispatcher)
+        server.dispatch_packet(build_message('/muse/elements/alpha_absolute', 0.5).dgram,
+                               self.dispatcher)
+        self.assertEqual(self.received, [('/muse/elements/blink', 1),
+                                         ('/muse/elements/alpha_absolute', ['alpha'], 0.5)])
+
+    def test_future_bundle(self):
+        bundle = OscBundleBuilder(time.time() + 60)
+        bundle.add_content(build_message('/muse/elements/blink', 1))
+        bundle.add_content(build_message('/muse/elements/blink', 2))
+        start = time.perf_counter()
+        server.dispatch_packet(bundle.build().dgram, self.dispatcher)
+        self.assertLess(time.perf_counter() - start, 1)
+        self.assertEqual(self.received, [('/muse/elements/blink', 1),
+                                         ('/muse/elements/blink', 2)])
+
+    def test_not_osc(self):
+        server.dispatch_packet(b'garbage', self.dispatcher)
+        self.assertEqual(self.received, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import os
+import unittest
+import warnings
+
+import numpy as np
+
+from stage_estimators import RLSEstimator, ARIMAEstimator, get_estimator, benchmark
+
+try:
+    import statsmodels
+except ImportError:
+    statsmodels = None
+
+RECORDING = os.path.join(os.path.dirname(__file__), '..', '..', 'fr0st-master', 'fr0st', 'scripts',
+                         'mindmurmer', 'data', 'Muse-B1C1_2018-06-11--07-48-41_1528717729867.json')
+
+
+def ar_series(n, intercept, coefs, noise=0.01, seed=0):
+    """n samples of an AR process with the given intercept and lag coefficients."""
+    rng = np.random.RandomState(seed)
+    values = [intercept / (1 - sum(coefs))] * len(coefs)
+    for i in range(n):
+        lags = values[:-len(coefs) - 1:-1]
+        values.append(intercept + np.dot(coefs, lags) + rng.normal(0, noise))
+    return values[len(coefs):]
+
+
+class TestRLSEstimator(unittest.TestCase):
+
+    def test_coefficients(self):
+        estimator = RLSEstimator(order=2, forgetting=1.0)
+        for value in ar_series(2000, 0.2, [0.6, -0.3], noise=0.1):
+            estimator.update(value)
+        np.testing.assert_allclose(estimator.coefs, [0.2, 0.6, -0.3], atol=0.05)
+
+    def test_not_enough_data(self):
+        estimator = RLSEstimator(order=4)
+        for i in range(2 * 5):
+            estimator.update(i)
+            self.assertIsNone(estimator.score())
+        estimator.update(10)
+        self.assertIsNotNone(estimator.score())
+
+    def test_ignores_nan(self):
+        estimator = RLSEstimator(order=1)
+        estimator.update(float('nan'))
+        self.assertEqual(estimator.count, 0)
+
+    def test_trend(self):
+        rising, falling = RLSEstimator(), RLSEstimator()
+        for value in np.linspace(0, 1, 200):
+            rising.update(value)
+            falling.update(1 - value)
+        self.assertGreater(rising.score(), 0)
+        self.assertLess(falling.score(), 0)
+
+    def test_score_keeps_state(self):
+        estimator = RLSEstimator(order=2)
+        for value in ar_series(100, 0.2, [0.6, -0.3]):
+            estimator.update(value)
+        coefs, regressor = estimator.coefs.copy(), estimator.regressor.copy()
+        self.assertEqual(estimator.score(), estimator.score())
+        np.testing.assert_array_equal(estimator.coefs, coefs)
+        np.testing.assert_array_equal(estimator.regressor, regressor)
+
+
+@unittest.skipIf(statsmodels is None, "needs statsmodels")
+class TestARIMAEstimator(unittest.TestCase):
+
+    def test_not_enough_data(self):
+        estimator = ARIMAEstimator(order=(2, 0, 1))
+        for i in range(4):
+            estimator.update(i)
+            self.assertIsNone(estimator.score())
+
+    def test_score(self):
+        estimator = get_estimator('arima', window=100)
+        for value in ar_series(150, 0.2, [0.6, -0.3], noise=0.1):
+            estimator.update(value)
+        self.assertEqual(len(estimator.data), 100)
+        with warnings.catch_warnings():
+            # fits on short series don't always converge
+            warnings.simplefilter('ignore')
+            self.assertTrue(np.isfinite(estimator.score()))
+
+
+class TestBenchmark(unittest.TestCase):
+
+    def test_recording(self):
+        scores = benchmark(RECORDING, ['rls'], period_samples=10)['rls']
+        self.assertEqual(len(scores), 7)
+        self.assertIsNone(scores[0])
+        self.assertTrue(all(np.isfinite(score) for score in scores[1:]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,11 +3,31 @@ import pika
 import json
 import uuid
 import logging
+import threading
+import time
+import struct
+import itertools
+from collections import deque, OrderedDict
+
+PUBLISH_QUEUE_SIZE = 1000  # uncoalesced messages waiting for the publisher thread
+MAX_PUBLISH_RATE = 5  # messages per second and queue, for coalesced queues
+MIN_BACKOFF_SECONDS = 1  # reconnect delays double up to MAX_BACKOFF_SECONDS
+MAX_BACKOFF_SECONDS = 30
+
+# EEG data can be sent as JSON (the default, understood by the .NET
+# consumers) or in a compact binary form. consumers pick the decoder from
+# the AMQP content_type of each message.
+JSON_CONTENT_TYPE = 'application/json'
+EEGDATA_CONTENT_TYPE = 'application/x-mindmurmur-eegdata'
+# little endian: sequence number (uint32), timestamp (float64, unix time),
+# value count (uint16), followed by the values as float32.
+EEGDATA_HEADER = struct.Struct('<IdH')
 
 
 class RabbitController(object):
 
-    def __init__(self, host, port, user, password, virtualhost):
+    def __init__(self, host, port, user, password, virtualhost, threaded=False,
+                 max_rate=MAX_PUBLISH_RATE, coalesce=None, binary_eegdata=False):
 
         self.QUEUE_NAME_COLOR = 'MindMurmur.Domain.Messages.ColorControlCommand, MindMurmur.Domain_colorCommand'
         self.QUEUE_NAME_HEART = 'MindMurmur.Domain.Messages.HeartRateCommand, MindMurmur.Domain_heartRateCommand'
@@ -23,7 +43,40 @@ class RabbitController(object):
         self.color_props = pika.BasicProperties(type=self.EXCHANGE_COLOR, delivery_mode=2)
         self.heart_props = pika.BasicProperties(type=self.EXCHANGE_HEART, delivery_mode=2)
         self.state_props = pika.BasicProperties(type=self.EXCHANGE_STATE, delivery_mode=2)
-        self.eegdata_props = pika.BasicProperties(type=self.EXCHANGE_EEGDATA, delivery_mode=2)
+        self.eegdata_props = pika.BasicProperties(type=self.EXCHANGE_EEGDATA, delivery_mode=2,
+                                                  content_type=EEGDATA_CONTENT_TYPE if binary_eegdata
+                                                  else JSON_CONTENT_TYPE)
+        # numbers binary eegdata messages as they are sent, for loss detection
+        self.eegdata_sequence = itertools.count(1)
+
+        # publishing reuses one connection and channel. subscribers keep
+        # opening their own through open_channel, since a blocking
+        # connection can't be shared between threads.
+        self.publish_connection = None
+        self.publish_channel = None
+        self.declared_queues = set()
+        self.publish_lock = threading.Lock()
+        self.backoff = 0
+        self.retry_at = 0
+
+        # with threaded=True, publish_* only put the message in an outbox
+        # and return. telemetry queues are coalesced: only the latest
+        # message is kept, and it's sent at most max_rate times a second.
+        # other messages (e.g. meditation states) are all sent, in order.
+        self.threaded = threaded
+        self.min_interval = 1.0 / max_rate if max_rate else 0
+        if coalesce is None:
+            coalesce = (self.EXCHANGE_HEART, self.EXCHANGE_EEGDATA, self.EXCHANGE_COLOR)
+        self.coalesce = set(coalesce)
+        self.outbox = OrderedDict()  # queue_name -> (properties, command)
+        self.fifo = deque()
+        self.last_sent = {}
+        self.outbox_cond = threading.Condition()
+        self.closing = False
+        if threaded:
+            self.publish_thread = threading.Thread(target=self._publish_loop, name="RabbitPublisher")
+            self.publish_thread.daemon = True
+            self.publish_thread.start()
 
         return
 
@@ -43,19 +96,129 @@ class RabbitController(object):
                 self.open_connection.close()
 
     def _base_publish(self, queue_name, properties, command):
-        try:
-            self.open_channel()
-            self.active_channel.queue_declare(queue=queue_name, passive=True)
-            self.active_channel.basic_publish(exchange='',
-                                              properties=properties,
-                                              routing_key=queue_name,
-                                              body=command.to_json())
-        except Exception as e:
-            print(repr(e))
-            raise e
-        finally:
-            if self.open_connection:
-                self.open_connection.close()
+        if not self.threaded:
+            self._send(queue_name, properties, self._encode(properties, command))
+            return
+        with self.outbox_cond:
+            if queue_name in self.coalesce:
+                # replaces the pending message of that queue, if any
+                self.outbox[queue_name] = (properties, command)
+            else:
+                if len(self.fifo) >= PUBLISH_QUEUE_SIZE:
+                    self.fifo.popleft()
+                    logging.warning("rabbitMQ outbox full, dropping oldest message")
+                self.fifo.append((queue_name, properties, command))
+            self.outbox_cond.notify()
+
+    def _take_due(self):
+        """Removes and returns the messages that can be sent now, waiting
+        until there are any. Returns None once closed and empty."""
+        with self.outbox_cond:
+            while True:
+                now = time.time()
+                due = list(self.fifo)
+                self.fifo.clear()
+                wait = None
+                for queue_name in list(self.outbox):
+                    remaining = self.last_sent.get(queue_name, 0) + self.min_interval - now
+                    if remaining <= 0 or self.closing:
+                        properties, command = self.outbox.pop(queue_name)
+                        due.append((queue_name, properties, command))
+                        self.last_sent[queue_name] = now
+                    elif wait is None or remaining < wait:
+                        wait = remaining
+                if due:
+                    return due
+                if self.closing:
+                    return None
+                self.outbox_cond.wait(wait)
+
+    def _publish_loop(self):
+        while True:
+            due = self._take_due()
+            if due is None:
+                break
+            # encode the whole batch at once, outside the outbox lock.
+            # coalesced messages that were replaced are never encoded.
+            batch = [(queue_name, properties, self._encode(properties, command))
+                     for queue_name, properties, command in due]
+            for item in batch:
+                try:
+                    self._send(*item)
+                except Exception:
+                    # already reported by _send. the message is lost, but the
+                    # next one will try to reconnect once the backoff expired.
+                    pass
+
+    def _encode(self, properties, command):
+        if properties.content_type == EEGDATA_CONTENT_TYPE:
+            return command.to_binary(next(self.eegdata_sequence))
+        return command.to_json()
+
+    def _send(self, queue_name, properties, body):
+        with self.publish_lock:
+            try:
+                self._publish_once(queue_name, properties, body)
+            except Exception as e:
+                # the connection may simply have gone stale (broker restart,
+                # missed heartbeats): reconnect and retry once.
+                self._reset_publisher()
+                if time.time() < self.retry_at:
+                    print(repr(e))
+                    raise e
+                try:
+                    self._publish_once(queue_name, properties, body)
+                except Exception as e:
+                    print(repr(e))
+                    self._reset_publisher()
+                    self.backoff = min(max(self.backoff * 2, MIN_BACKOFF_SECONDS), MAX_BACKOFF_SECONDS)
+                    self.retry_at = time.time() + self.backoff
+                    raise e
+
+    def _publish_once(self, queue_name, properties, body):
+        channel = self._get_publish_channel()
+        if queue_name not in self.declared_queues:
+            channel.queue_declare(queue=queue_name, passive=True)
+            self.declared_queues.add(queue_name)
+        channel.basic_publish(exchange='',
+                              properties=properties,
+                              routing_key=queue_name,
+                              body=body)
+
+    def _get_publish_channel(self):
+        if self.publish_channel is not None and self.publish_channel.is_open:
+            return self.publish_channel
+        if time.time() < self.retry_at:
+            raise RuntimeError("rabbitMQ unavailable, retrying in {delay:.1f}s".format(
+                delay=self.retry_at - time.time()))
+        self._reset_publisher()
+        self.publish_connection = pika.BlockingConnection(self.parameters)
+        self.publish_channel = self.publish_connection.channel()
+        self.backoff = 0
+        self.retry_at = 0
+        return self.publish_channel
+
+    def _reset_publisher(self):
+        connection = self.publish_connection
+        self.publish_connection = None
+        self.publish_channel = None
+        self.declared_queues.clear()
+        if connection is not None:
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+    def close(self):
+        """Flushes queued messages and closes the publishing connection."""
+        if self.threaded:
+            with self.outbox_cond:
+                self.closing = True
+                self.outbox_cond.notify()
+            self.publish_thread.join()
+            self.threaded = False
+        with self.publish_lock:
+            self._reset_publisher()
 
     def open_channel(self):
         try:
@@ -200,13 +363,42 @@ class EEGDataCommand(BaseCommand):
 
     def __init__(self, eegdata_values):
         super(EEGDataCommand, self).__init__()
-        self.Values = eegdata_values
+        # copied, since the command may be encoded later by the publisher thread
+        self.Values = list(eegdata_values)
+        # only carried by the binary format
+        self.sequence = None
+        self.timestamp = time.time()
+
+    @staticmethod
+    def from_string(command_string):
+        return EEGDataCommand(json.loads(command_string)["Values"])
+
+    @staticmethod
+    def from_binary(body):
+        sequence, timestamp, count = EEGDATA_HEADER.unpack_from(body)
+        values = struct.unpack_from('<%df' % count, body, EEGDATA_HEADER.size)
+        command = EEGDataCommand(values)
+        command.sequence = sequence
+        command.timestamp = timestamp
+        return command
+
+    @staticmethod
+    def from_message(properties, body):
+        """Decodes a received message according to its content_type."""
+        if getattr(properties, 'content_type', None) == EEGDATA_CONTENT_TYPE:
+            return EEGDataCommand.from_binary(body)
+        return EEGDataCommand.from_string(body)
 
     def get_values(self):
         return self.Values
 
     def to_json(self):
-        return json.dumps(self, default=lambda o: o.__dict__,sort_keys=True, indent=4)
+        # the python-only attributes are left out, so the JSON stays as is
+        return json.dumps({'CommandId': self.CommandId, 'Values': self.Values}, sort_keys=True, indent=4)
+
+    def to_binary(self, sequence):
+        return EEGDATA_HEADER.pack(sequence, self.timestamp, len(self.Values)) \
+            + struct.pack('<%df' % len(self.Values), *self.Values)
 
     def to_string(self):
         return "({0}, {1})".format(self.CommandId, self.Values)